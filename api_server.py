@@ -1,15 +1,73 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, abort
 from flask_cors import CORS
 import sys
 import os
 import logging
+import queue
+import threading
 import time as time_module
+from concurrent.futures import Future
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from parsers import get_parser
+from parsers.errors import CaptchaDetectedError
+from parsers.images import ImageMirror, guess_mimetype, is_allowed_image_url
+from parsers.changes import ChangeFeed
+from parsers.job_queue import JobQueue, STATUS_DONE
+from parsers.record import dumps
+from parsers.selection import is_complete
+from parsers.strategies import strategy_stats
+from parsers.profiles import get_profile
+from parsers.static import escalation_stats
+from parsers.hedging import hedge_stats
+from parsers.retry import retry_stats
+from parsers.browsers import browser_watchdog
+from parsers.warmup import warmup, warmup_enabled
+from parsers.executor import BrowserExecutor, executor_threads, executor_timeout
+from parsers.process_pool import ProcessParsePool, pool_processes, pool_timeout
+from parsers.base import PROGRESS_GROUPS, PROGRESS_RESET
 
 app = Flask(__name__)
 CORS(app)  # Разрешаем CORS запросы от SurpriSet
+# За nginx/apache можно отдавать файлы через X-Sendfile вместо чтения в Python
+app.use_x_sendfile = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+
+# Локальное зеркало изображений товаров (файлы неизменяемы - ключ это хэш содержимого)
+image_mirror = ImageMirror()
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600
+
+# Лента изменений цен/наличия по повторно распарсенным товарам
+change_feed = ChangeFeed()
+
+# Режим очереди: парсинг выполняют воркеры (parse_worker.py) на этой же машине, API только ставит задачи
+job_queue = JobQueue() if os.environ.get('PARSE_QUEUE_DB') else None
+QUEUE_WAIT_TIMEOUT = float(os.environ.get('PARSE_QUEUE_WAIT', 90))
+
+# /api/parse/stream: общий таймаут парсинга в потоке запроса и период комментариев-пингов SSE
+STREAM_TIMEOUT = float(os.environ.get('PARSE_STREAM_TIMEOUT', 120))
+STREAM_PING_INTERVAL = 15.0
+
+# PARSE_PROCESSES>0: парсинг в процессах-воркерах (падение Chromium не задевает сервер)
+process_pool = ProcessParsePool() if pool_processes() > 0 else None
+# BROWSER_EXECUTOR_THREADS>0: парсинг на потоках-владельцах браузеров, обработчик запроса ждет future
+browser_executor = BrowserExecutor() if executor_threads() > 0 and not process_pool else None
+
+def start_background_services():
+    """
+    Сторож браузеров (память Chromium, пересоздание, уборка сирот - в т.ч. от прошлого запуска),
+    пул процессов или исполнитель и прогрев. PARSER_WARMUP=true: до конца прогрева /api/ready отвечает 503.
+    Только в основном процессе: воркеры пула (spawn) импортируют этот модуль заново
+    """
+    browser_watchdog.start()
+    runner = process_pool or browser_executor
+    if warmup_enabled():
+        warmup.start(executor=runner)
+    elif runner:
+        runner.start()
+
+def json_response(payload, status: int = 200) -> Response:
+    """JSON ответ через быстрый сериализатор (понимает ProductRecord)"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,6 +79,22 @@ logging.basicConfig(
     ]
 )
 
+def observe_result(url: str, product_data, mirror: bool = False, key: str = None) -> None:
+    """
+    Лента изменений и (mirror=True) зеркало изображений для результата парсинга.
+    key - ключ товара (parser.identity.key), чтобы не канонизировать ссылку повторно
+    """
+    # Неполный результат (DOM-fallback без цены) дал бы ложные price_changed -> 0 и обратно
+    if is_complete(product_data):
+        try:
+            change_feed.observe(url, product_data, key=key)
+        except Exception as e:
+            logging.error(f"❌ Failed to record product changes: {str(e)}")
+    
+    # Опционально зеркалируем изображения в локальное хранилище
+    if mirror:
+        product_data["mirrored_images"] = image_mirror.mirror(product_data.get("images", []))
+
 @app.route('/api/parse', methods=['GET'])
 def parse_product():
     """API endpoint для парсинга товаров"""
@@ -63,7 +137,9 @@ def parse_product():
         # Определяем и запускаем соответствующий парсер
         logging.info(f"🔍 Parsing URL: {url}")
         try:
-            parser = get_parser(url)
+            # hedge=true - страховочный запуск второй реализации при медленном парсинге
+            hedge = request.args.get('hedge', '').lower() == 'true' or None
+            parser = get_parser(url, hedge=hedge)
         except ValueError as ve:
             logging.error(f"❌ Parser selection error: {str(ve)}")
             return jsonify({
@@ -72,7 +148,33 @@ def parse_product():
             }), 400
         
         # Таймаут: если парсинг > 60 секунд → ошибка
-        product_data = parser.parse()
+        if job_queue:
+            job_id = enqueue_parse(url, parser, request.args.get('profile'),
+                                   request.args.get('variants', 'false').lower() == 'true', hedge)
+            logging.info(f"📨 Parse job {job_id} queued")
+            try:
+                job = job_queue.wait(job_id, QUEUE_WAIT_TIMEOUT)
+            except TimeoutError as te:
+                raise ValueError(str(te))
+            if job['status'] != STATUS_DONE:
+                raise ValueError(job['error'] or f"Задача парсинга {job_id} завершилась ошибкой")
+            product_data = job['result']
+        else:
+            # profile=mobile - облегченная мобильная версия страниц
+            if request.args.get('profile'):
+                parser.profile = get_profile(request.args['profile'], parser.marketplace)
+            # variants=true - вернуть все цвета товара (поддерживается парсером Wildberries)
+            if request.args.get('variants', 'false').lower() == 'true' and hasattr(parser, 'include_variants'):
+                parser.include_variants = True
+            if process_pool:
+                # В воркер уходит канонический URL и параметры, а не сам парсер
+                product_data = process_pool.parse(
+                    parser.url, hedge=hedge, profile=request.args.get('profile'),
+                    variants=request.args.get('variants', 'false').lower() == 'true')
+            elif browser_executor:
+                product_data = browser_executor.parse(parser)
+            else:
+                product_data = parser.parse()
         
         elapsed_time = time_module.time() - start_time
         logging.info(f"✅ Successfully parsed product: {product_data.get('title', 'Unknown')} (took {elapsed_time:.2f}s)")
@@ -80,19 +182,32 @@ def parse_product():
         if elapsed_time > 15:
             logging.warning(f"⚠️ Parsing took {elapsed_time:.2f}s (more than 15s)")
         
-        return jsonify({
+        observe_result(url, product_data, mirror=request.args.get('mirror', 'false').lower() == 'true',
+                       key=parser.identity.key)
+        
+        return json_response({
             "success": True,
             "data": product_data
         })
 
+    except CaptchaDetectedError as e:
+        # Маркетплейс показал капчу - временная ошибка, клиент может повторить позже
+        elapsed_time = time_module.time() - start_time
+        logging.warning(f"🛑 Captcha after {elapsed_time:.2f}s: {e.signal}")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "error_type": "captcha"
+        }), 503
     except ValueError as e:
         # Ошибки парсинга (неподдерживаемый маркетплейс, не удалось извлечь данные)
         elapsed_time = time_module.time() - start_time
         logging.error(f"❌ Parse error after {elapsed_time:.2f}s: {str(e)}")
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 400
+        payload = {"success": False, "error": str(e)}
+        # Класс отказа (timeout, not_found, structure - см. parsers/errors.py), если известен
+        if getattr(e, 'kind', ''):
+            payload["error_type"] = e.kind
+        return jsonify(payload), 400
     except Exception as e:
         # Другие ошибки
         elapsed_time = time_module.time() - start_time
@@ -104,9 +219,288 @@ def parse_product():
             "error": f"Internal server error: {str(e)}"
         }), 500
 
+def enqueue_parse(url: str, parser, profile, variants: bool, hedge) -> int:
+    """Задача очереди с параметрами запроса (профиль, варианты, страховка) - их применяет воркер"""
+    if profile:
+        # Неизвестный профиль - ValueError до постановки задачи
+        get_profile(profile, parser.marketplace)
+    options = {'profile': profile, 'variants': variants, 'hedge': hedge}
+    return job_queue.enqueue(url, dedupe_key=parser.identity.key,
+                             options={name: value for name, value in options.items() if value})
+
+
+def sse_event(event: str, payload) -> bytes:
+    """Событие Server-Sent Events с JSON в data"""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+
+def start_stream_parse(url: str, parser, progress, hedge, profile, variants):
+    """
+    Запускает парсинг для потока событий: (future, отмена, таймаут).
+    Группы полей приходят в progress из того же исполнителя, что и у /api/parse;
+    в режиме очереди задач прогресса нет - группы отдаются из итоговой записи
+    """
+    if job_queue:
+        future = Future()
+
+        def wait_job():
+            try:
+                job_id = enqueue_parse(url, parser, profile, variants, hedge)
+                job = job_queue.wait(job_id, QUEUE_WAIT_TIMEOUT)
+                if job['status'] != STATUS_DONE:
+                    raise ValueError(job['error'] or f"Задача парсинга {job_id} завершилась ошибкой")
+                future.set_result(job['result'])
+            except TimeoutError as te:
+                future.set_exception(ValueError(str(te)))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=wait_job, name='parse-stream', daemon=True).start()
+        return future, lambda: None, QUEUE_WAIT_TIMEOUT + 5
+
+    if profile:
+        parser.profile = get_profile(profile, parser.marketplace)
+    if variants and hasattr(parser, 'include_variants'):
+        parser.include_variants = True
+    if process_pool:
+        timeout = pool_timeout()
+        future = process_pool.submit(parser.url, progress=progress, hedge=hedge, profile=profile, variants=variants,
+                                     deadline=time_module.time() + timeout)
+        return future, lambda: process_pool.abort(future), timeout
+
+    parser.progress = progress
+    parser.cancel_event = threading.Event()
+    if browser_executor:
+        timeout = executor_timeout()
+        parser.deadline = time_module.time() + timeout
+        future = browser_executor.submit(parser)
+        return future, lambda: future.cancel() or parser.cancel_event.set(), timeout
+
+    future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(parser.parse())
+        except BaseException as e:
+            future.set_exception(e)
+
+    parser.deadline = time_module.time() + STREAM_TIMEOUT
+    threading.Thread(target=run, name='parse-stream', daemon=True).start()
+    return future, parser.cancel_event.set, STREAM_TIMEOUT
+
+
+@app.route('/api/parse/stream', methods=['GET'])
+def parse_product_stream():
+    """
+    Парсинг с прогрессивной отдачей (text/event-stream): событие на каждую группу полей
+    (identity, price, images, description, characteristics) со стратегией, которая ее дала,
+    reset перед повтором после отказа (полученные группы недействительны),
+    затем done с полной записью (или error). Параметры те же, что у /api/parse
+    """
+    url = request.args.get('url', '').strip()
+    if not url:
+        return jsonify({
+            "success": False,
+            "error": "URL parameter is required. Please provide a valid marketplace URL."
+        }), 400
+    from urllib.parse import unquote
+    url = unquote(url)
+    if 'captcha' in url.lower() or 'challenge' in url.lower():
+        return jsonify({
+            "success": False,
+            "error": "Обнаружена капча в URL. Попробуйте использовать чистую ссылку на товар."
+        }), 400
+    hedge = request.args.get('hedge', '').lower() == 'true' or None
+    try:
+        parser = get_parser(url, hedge=hedge)
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
+    profile = request.args.get('profile')
+    variants = request.args.get('variants', 'false').lower() == 'true'
+    mirror = request.args.get('mirror', 'false').lower() == 'true'
+    logging.info(f"📡 Stream parse request: url={url}")
+
+    def generate():
+        start_time = time_module.time()
+        events = queue.Queue()
+
+        def progress(group, fields, strategy):
+            events.put((group, fields, strategy))
+
+        future, cancel, timeout = start_stream_parse(url, parser, progress, hedge, profile, variants)
+        future.add_done_callback(lambda _: events.put(None))
+        deadline = start_time + timeout
+        # Последнее отправленное значение группы: повторы (DOM-дозаполнение, вторая реализация) не шлем
+        sent = {}
+
+        def group_event(group, fields, strategy):
+            if group == PROGRESS_RESET:
+                # Повтор после отказа: клиент отбрасывает полученные группы, они придут заново
+                sent.clear()
+                return sse_event(PROGRESS_RESET, dict(fields, elapsed=round(time_module.time() - start_time, 3)))
+            body = dumps(fields)
+            if sent.get(group) == body:
+                return None
+            sent[group] = body
+            return sse_event(group, {
+                "group": group,
+                "strategy": strategy,
+                "fields": fields,
+                "elapsed": round(time_module.time() - start_time, 3),
+            })
+
+        try:
+            while True:
+                remaining = deadline - time_module.time()
+                if remaining <= 0:
+                    cancel()
+                    logging.error(f"❌ Stream parse timed out after {timeout:g}s: {url}")
+                    yield sse_event('error', {"success": False, "error": f"Парсинг не завершился за {timeout:g}s"})
+                    return
+                try:
+                    item = events.get(timeout=min(remaining, STREAM_PING_INTERVAL))
+                except queue.Empty:
+                    # Комментарий SSE не дает прокси закрыть соединение на длинном парсинге
+                    yield b": ping\n\n"
+                    continue
+                if item is None:
+                    break
+                chunk = group_event(*item)
+                if chunk:
+                    yield chunk
+
+            elapsed_time = time_module.time() - start_time
+            try:
+                product_data = future.result()
+            except CaptchaDetectedError as e:
+                logging.warning(f"🛑 Captcha after {elapsed_time:.2f}s: {e.signal}")
+                yield sse_event('error', {"success": False, "error": str(e), "error_type": "captcha"})
+                return
+            except ValueError as e:
+                logging.error(f"❌ Parse error after {elapsed_time:.2f}s: {str(e)}")
+                payload = {"success": False, "error": str(e)}
+                if getattr(e, 'kind', ''):
+                    payload["error_type"] = e.kind
+                yield sse_event('error', payload)
+                return
+            except Exception as e:
+                logging.error(f"❌ Unexpected error after {elapsed_time:.2f}s: {str(e)}")
+                yield sse_event('error', {"success": False, "error": f"Internal server error: {str(e)}"})
+                return
+
+            # Группы, о которых парсер не сообщил (упрощенные реализации, очередь задач), - из итоговой записи
+            for group, names in PROGRESS_GROUPS.items():
+                if group not in sent and product_data.get(names[0]):
+                    chunk = group_event(group, {name: product_data.get(name) for name in names}, None)
+                    if chunk:
+                        yield chunk
+            logging.info(f"✅ Streamed product: {product_data.get('title', 'Unknown')} (took {elapsed_time:.2f}s)")
+            observe_result(url, product_data, mirror=mirror, key=parser.identity.key)
+            yield sse_event('done', {
+                "success": True,
+                "data": product_data,
+                "elapsed": round(elapsed_time, 3),
+            })
+        finally:
+            # Клиент отключился раньше - парсинг больше никому не нужен
+            if not future.done():
+                cancel()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/images/mirror', methods=['POST'])
+def mirror_images():
+    """Скачивает изображения с CDN маркетплейсов в локальное хранилище и генерирует миниатюры"""
+    payload = request.get_json(silent=True) or {}
+    images = payload.get('images')
+    if not isinstance(images, list) or not all(isinstance(url, str) for url in images):
+        return jsonify({
+            "success": False,
+            "error": "Field 'images' must be a list of URLs"
+        }), 400
+    
+    # Только CDN маркетплейсов на публичных адресах (см. parsers/images.py)
+    rejected = [url for url in images if not is_allowed_image_url(url)]
+    start_time = time_module.time()
+    mirrored = image_mirror.mirror([url for url in images if url not in rejected])
+    logging.info(f"🖼️ Mirrored {len(mirrored)} images, rejected {len(rejected)} "
+                 f"(took {time_module.time() - start_time:.2f}s)")
+    return jsonify({
+        "success": True,
+        "data": mirrored,
+        "rejected": rejected
+    })
+
+@app.route('/media/<digest>/<variant>', methods=['GET'])
+def serve_media(digest, variant):
+    """Отдает изображение из content-addressed хранилища (sendfile + долгий кэш)"""
+    path = image_mirror.resolve(digest, variant)
+    if not path:
+        abort(404)
+    response = send_file(
+        path,
+        mimetype=guess_mimetype(path),
+        max_age=MEDIA_CACHE_MAX_AGE,
+        conditional=True,
+        etag=f"{digest}-{variant}",
+    )
+    response.headers['Cache-Control'] = f"public, max-age={MEDIA_CACHE_MAX_AGE}, immutable"
+    return response
+
+@app.route('/api/changes', methods=['GET'])
+def list_changes():
+    """Читает события изменений товаров начиная с offset-курсора"""
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "Parameters 'offset' and 'limit' must be integers"
+        }), 400
+    
+    events, next_offset = change_feed.read(offset, limit)
+    return jsonify({
+        "success": True,
+        "data": events,
+        "next_offset": next_offset
+    })
+
+@app.route('/api/strategies', methods=['GET'])
+def list_strategies():
+    """Текущий порядок стратегий извлечения, их статистика, эскалации статического режима, хеджирование и повторы"""
+    return jsonify({
+        "success": True,
+        "data": strategy_stats.snapshot(),
+        "static_mode": escalation_stats.snapshot(),
+        "hedging": hedge_stats.snapshot(),
+        "retries": retry_stats.snapshot()
+    })
+
+@app.route('/api/browsers', methods=['GET'])
+def list_browsers():
+    """Память и счетчики браузеров Chromium, пересоздания и убранные процессы-сироты"""
+    return jsonify({
+        "success": True,
+        "data": browser_watchdog.snapshot(),
+        "executor": browser_executor.snapshot() if browser_executor else None,
+        "process_pool": process_pool.snapshot() if process_pool else None
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Готовность к трафику: прогрев завершен и браузер запускается (в отличие от /api/health)"""
+    snapshot = warmup.snapshot()
+    return jsonify(snapshot), 200 if snapshot['ready'] else 503
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Проверка здоровья API"""
+    if job_queue:
+        return jsonify({"ok": True, "queue": job_queue.stats()})
     return jsonify({"ok": True})
 
 @app.route('/', methods=['GET'])
@@ -116,7 +510,14 @@ def root():
         "status": "ok",
         "message": "Marketplace Parser API is running",
         "endpoints": {
-            "/api/parse": "GET - Parse product from marketplace URL",
+            "/api/parse": "GET - Parse product from marketplace URL (mirror=true to mirror images, variants=true for all WB colours, profile=desktop|mobile, hedge=true to race the alternate parser on slow pages)",
+            "/api/parse/stream": "GET - Same parameters as /api/parse, Server-Sent Events: one event per field group (identity, price, images, description, characteristics) with the strategy that produced it, reset before a retry (earlier groups are void), then done",
+            "/api/images/mirror": "POST - Mirror marketplace CDN image URLs into local store",
+            "/media/<hash>/<variant>": "GET - Mirrored image (original or <size>.webp)",
+            "/api/changes": "GET - Product change events (offset cursor)",
+            "/api/strategies": "GET - Learned extraction strategy order and stats, hedging and retry (PARSE_RETRIES) counters",
+            "/api/browsers": "GET - Chromium memory per browser, recycling, reaped orphans, browser executor and process pool load",
+            "/api/ready": "GET - Readiness: 503 until parser warm-up (PARSER_WARMUP=true) is done",
             "/api/health": "GET - Health check"
         }
     })
@@ -127,4 +528,8 @@ if __name__ == '__main__':
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
     print(f"Starting Flask API server on port {port}")
+    # В debug-режиме процесс-родитель перезагрузчика только следит за файлами и
+    # перезапускает дочерний процесс - фоновые службы нужны только в дочернем
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(host='0.0.0.0', port=port, debug=debug)
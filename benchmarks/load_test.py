@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест api_server с перебором уровней параллельности.
+
+На каждом уровне N клиентов в замкнутом цикле шлют GET /api/parse со ссылками
+на разные товары (артикулы не повторяются, кэши и дедупликация не помогают)
+в течение --duration секунд. Параллельно раз в --sample-interval секунд
+снимаются число процессов Chromium и занятая память хоста.
+
+Для каждого уровня: пропускная способность (парсингов в минуту),
+p50/p95/p99 задержки, доли ошибок, таймаутов и капч, пик процессов Chromium
+и памяти. Уровень, после которого пропускная способность перестает расти
+или растут ошибки, отмечается как точка насыщения.
+
+С --spawn скрипт сам поднимает mock_marketplace.py и api_server.py
+(PARSER_HOST_MAP направлен на mock), иначе бьет в уже запущенный --api.
+
+Примеры:
+    python benchmarks/load_test.py --spawn --levels 1,2,4,8 --duration 60
+    python benchmarks/load_test.py --api http://127.0.0.1:5001 --marketplaces wb,ozon --output load.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_API = 'http://127.0.0.1:5001'
+DEFAULT_LEVELS = '1,2,4,8,16'
+DEFAULT_OUTPUT = 'load_report.json'
+# Уровень считается насыщенным, если прирост пропускной способности меньше этой доли
+SATURATION_GAIN = 0.05
+# ...или доля неуспешных запросов выше этой
+SATURATION_ERROR_RATE = 0.05
+STARTUP_TIMEOUT = 30
+CHROMIUM_NAMES = ('chrome', 'chromium', 'headless_shell')
+
+URL_TEMPLATES = {
+    'wb': 'https://www.wildberries.ru/catalog/{id}/detail.aspx',
+    'ozon': 'https://www.ozon.ru/product/load-test-item-{id}/',
+    'ym': 'https://market.yandex.ru/product--load-test-item/{id}',
+}
+
+
+def product_urls(marketplaces: list):
+    """Бесконечный поток ссылок на разные товары по кругу маркетплейсов"""
+    ids = itertools.count(random.randint(10_000_000, 90_000_000))
+    for marketplace in itertools.cycle(marketplaces):
+        yield URL_TEMPLATES[marketplace].format(id=next(ids))
+
+
+class HostSampler:
+    """Фоновый сбор числа процессов Chromium и памяти хоста (Linux, /proc)"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = time.time()
+
+    @staticmethod
+    def chromium_processes() -> tuple:
+        """(число процессов Chromium, их суммарный RSS в МБ)"""
+        count, rss_kb = 0, 0
+        try:
+            pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+        except OSError:
+            return None, None
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/comm', 'r') as f:
+                    name = f.read().strip().lower()
+                if not any(chromium in name for chromium in CHROMIUM_NAMES):
+                    continue
+                count += 1
+                with open(f'/proc/{pid}/status', 'r') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            rss_kb += int(line.split()[1])
+                            break
+            except (OSError, ValueError):
+                # Процесс завершился между listdir и чтением
+                continue
+        return count, round(rss_kb / 1024, 1)
+
+    @staticmethod
+    def host_used_mb():
+        """Занятая память хоста: MemTotal - MemAvailable"""
+        try:
+            with open('/proc/meminfo', 'r') as f:
+                meminfo = {line.split(':')[0]: int(line.split()[1]) for line in f}
+        except (OSError, ValueError, IndexError):
+            return None
+        return round((meminfo['MemTotal'] - meminfo['MemAvailable']) / 1024, 1)
+
+    def sample(self) -> dict:
+        chromium, chromium_rss = self.chromium_processes()
+        return {
+            't': round(time.time() - self._started, 1),
+            'chromium': chromium,
+            'chromium_rss_mb': chromium_rss,
+            'host_used_mb': self.host_used_mb(),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(self.sample())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._started = time.time()
+        self.samples = []
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> list:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+
+def parse_once(api: str, url: str, timeout: float, params: str) -> dict:
+    """Один запрос к /api/parse: статус и время"""
+    request_url = f"{api}/api/parse?url={quote(url, safe='')}{params}"
+    start = time.time()
+    outcome = 'ok'
+    status = None
+    try:
+        with urllib.request.urlopen(request_url, timeout=timeout) as response:
+            status = response.status
+            payload = json.loads(response.read() or b'{}')
+            if not payload.get('success'):
+                outcome = 'error'
+    except urllib.error.HTTPError as e:
+        status = e.code
+        try:
+            payload = json.loads(e.read() or b'{}')
+        except ValueError:
+            payload = {}
+        outcome = 'captcha' if payload.get('error_type') == 'captcha' else 'error'
+    except (TimeoutError, OSError) as e:
+        # socket.timeout - подкласс OSError; таймаут внутри URLError приходит как reason
+        reason = getattr(e, 'reason', e)
+        outcome = 'timeout' if isinstance(reason, TimeoutError) or 'timed out' in str(reason) else 'error'
+    return {'outcome': outcome, 'status': status, 'elapsed': time.time() - start}
+
+
+def percentile(values: list, quantile: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(quantile * (len(values) - 1))))]
+
+
+def run_level(api: str, concurrency: int, duration: float, urls, timeout: float,
+              params: str, sampler: HostSampler) -> dict:
+    """Уровень нагрузки: concurrency клиентов в замкнутом цикле duration секунд"""
+    results = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        while time.time() < deadline:
+            with lock:
+                url = next(urls)
+            result = parse_once(api, url, timeout, params)
+            with lock:
+                results.append(result)
+
+    sampler.start()
+    started = time.time()
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    # Запросы, начатые до дедлайна, дожидаемся - иначе теряются самые медленные
+    wall = time.time() - started
+    samples = sampler.stop()
+    return summarize_level(concurrency, results, wall, samples)
+
+
+def summarize_level(concurrency: int, results: list, wall: float, samples: list) -> dict:
+    total = len(results)
+    counts = {outcome: sum(1 for r in results if r['outcome'] == outcome)
+              for outcome in ('ok', 'error', 'timeout', 'captcha')}
+    latencies = [r['elapsed'] for r in results if r['outcome'] == 'ok']
+
+    def peak(key):
+        values = [s[key] for s in samples if s[key] is not None]
+        return max(values) if values else None
+
+    def rate(count):
+        return round(count / total, 3) if total else 0.0
+
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'ok': counts['ok'],
+        'errors': counts['error'],
+        'timeouts': counts['timeout'],
+        'captchas': counts['captcha'],
+        'error_rate': rate(counts['error']),
+        'timeout_rate': rate(counts['timeout']),
+        'captcha_rate': rate(counts['captcha']),
+        'wall_s': round(wall, 1),
+        'throughput_per_min': round(counts['ok'] / wall * 60, 1) if wall else 0.0,
+        'p50_s': round(percentile(latencies, 0.50), 2) if latencies else None,
+        'p95_s': round(percentile(latencies, 0.95), 2) if latencies else None,
+        'p99_s': round(percentile(latencies, 0.99), 2) if latencies else None,
+        'mean_s': round(statistics.mean(latencies), 2) if latencies else None,
+        'peak_chromium': peak('chromium'),
+        'peak_chromium_rss_mb': peak('chromium_rss_mb'),
+        'peak_host_used_mb': peak('host_used_mb'),
+        'samples': samples,
+    }
+
+
+def find_saturation(levels: list):
+    """Первый уровень, на котором рост нагрузки уже не дает пропускной способности"""
+    best = 0.0
+    for level in levels:
+        failed = level['error_rate'] + level['timeout_rate'] + level['captcha_rate']
+        if failed > SATURATION_ERROR_RATE:
+            return level['concurrency'], f"доля неуспешных {failed:.0%}"
+        if best and level['throughput_per_min'] < best * (1 + SATURATION_GAIN):
+            return level['concurrency'], f"пропускная способность {level['throughput_per_min']}/мин не растет"
+        best = max(best, level['throughput_per_min'])
+    return None, None
+
+
+def print_table(levels: list) -> None:
+    header = (f"{'N':>4} {'запросов':>9} {'в минуту':>9} {'p50, с':>7} {'p95, с':>7} {'p99, с':>7} "
+              f"{'ошибки':>7} {'таймауты':>9} {'капчи':>6} {'chromium':>9} {'память, МБ':>11}")
+    print(header)
+    print("-" * len(header))
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+
+    for level in levels:
+        print(f"{level['concurrency']:>4} {level['requests']:>9} {level['throughput_per_min']:>9.1f} "
+              f"{fmt(level['p50_s'], '>7.2f')} {fmt(level['p95_s'], '>7.2f')} {fmt(level['p99_s'], '>7.2f')} "
+              f"{level['error_rate']:>7.1%} {level['timeout_rate']:>9.1%} {level['captcha_rate']:>6.1%} "
+              f"{fmt(level['peak_chromium'], '>9')} {fmt(level['peak_host_used_mb'], '>11.1f')}")
+
+
+def wait_ready(url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError(f"Сервер не поднялся за {timeout:.0f}s: {url}")
+
+
+def spawn_servers(api_port: int, mock_port: int, behaviours: list) -> list:
+    """Поднимает mock-маркетплейсы и api_server, направленный на них"""
+    from mock_marketplace import host_map_for
+
+    mock_base = f"http://127.0.0.1:{mock_port}"
+    mock_cmd = [sys.executable, os.path.join(ROOT_DIR, 'mock_marketplace.py'), '--port', str(mock_port)]
+    for behaviour in behaviours:
+        mock_cmd += ['--behaviour', behaviour]
+    env = dict(os.environ, FLASK_PORT=str(api_port), PARSER_HOST_MAP=host_map_for(mock_base))
+    processes = [
+        subprocess.Popen(mock_cmd, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, 'api_server.py')], cwd=ROOT_DIR, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    try:
+        wait_ready(f"{mock_base}/__mock/behaviours", STARTUP_TIMEOUT)
+        wait_ready(f"http://127.0.0.1:{api_port}/api/health", STARTUP_TIMEOUT)
+    except RuntimeError:
+        stop_servers(processes)
+        raise
+    print(f"🧪 Mock: {mock_base}, API: http://127.0.0.1:{api_port}")
+    return processes
+
+
+def stop_servers(processes: list) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Нагрузочный тест api_server на mock-маркетплейсах")
+    arg_parser.add_argument('--api', default=DEFAULT_API, help="Адрес api_server")
+    arg_parser.add_argument('--levels', default=DEFAULT_LEVELS, help="Уровни параллельности через запятую")
+    arg_parser.add_argument('--duration', type=float, default=60, help="Длительность уровня, секунд")
+    arg_parser.add_argument('--timeout', type=float, default=120, help="Таймаут одного запроса, секунд")
+    arg_parser.add_argument('--marketplaces', default='wb,ozon,ym', help="Маркетплейсы ссылок через запятую")
+    arg_parser.add_argument('--params', default='', help="Доп. параметры /api/parse, например profile=mobile&hedge=true")
+    arg_parser.add_argument('--sample-interval', type=float, default=1.0, help="Период снятия метрик хоста, секунд")
+    arg_parser.add_argument('--cooldown', type=float, default=5, help="Пауза между уровнями, секунд")
+    arg_parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON-отчет")
+    arg_parser.add_argument('--spawn', action='store_true', help="Поднять mock_marketplace.py и api_server.py")
+    arg_parser.add_argument('--mock-port', type=int, default=8099)
+    arg_parser.add_argument('--behaviour', action='append', default=[], help="Поведение mock-сервера (с --spawn)")
+    args = arg_parser.parse_args()
+
+    marketplaces = [m.strip() for m in args.marketplaces.split(',') if m.strip()]
+    unknown = [m for m in marketplaces if m not in URL_TEMPLATES]
+    if unknown or not marketplaces:
+        arg_parser.error(f"Неизвестные маркетплейсы: {', '.join(unknown) or '-'} (доступны {', '.join(URL_TEMPLATES)})")
+    levels = [int(level) for level in args.levels.split(',') if level.strip()]
+    params = f"&{args.params.lstrip('&')}" if args.params else ''
+
+    api = args.api.rstrip('/')
+    processes = []
+    if args.spawn:
+        api_port = int(api.rsplit(':', 1)[-1]) if api.rsplit(':', 1)[-1].isdigit() else 5001
+        processes = spawn_servers(api_port, args.mock_port, args.behaviour)
+
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    urls = product_urls(marketplaces)
+    sampler = HostSampler(args.sample_interval)
+    results = []
+    try:
+        for index, concurrency in enumerate(levels):
+            if index and args.cooldown:
+                time.sleep(args.cooldown)
+            print(f"🚀 Уровень {concurrency}: {args.duration:.0f}s...")
+            level = run_level(api, concurrency, args.duration, urls, args.timeout, params, sampler)
+            results.append(level)
+            print(f"   {level['throughput_per_min']}/мин, p95 {level['p95_s']}s, "
+                  f"ошибок {level['error_rate']:.0%}, таймаутов {level['timeout_rate']:.0%}")
+    except KeyboardInterrupt:
+        print("⏹️ Прервано, отчет по завершенным уровням")
+    finally:
+        stop_servers(processes)
+
+    saturation, reason = find_saturation(results)
+    report = {
+        'api': api,
+        'marketplaces': marketplaces,
+        'params': args.params,
+        'duration_s': args.duration,
+        'timeout_s': args.timeout,
+        'started_at': started_at,
+        'saturation': {'concurrency': saturation, 'reason': reason},
+        'levels': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print()
+    print_table(results)
+    if saturation:
+        print(f"\n🔻 Насыщение на уровне {saturation}: {reason}")
+    elif results:
+        best = max(results, key=lambda level: level['throughput_per_min'])
+        print(f"\n✅ Насыщение не достигнуто, максимум {best['throughput_per_min']}/мин при N={best['concurrency']}")
+    print(f"💾 Отчет: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
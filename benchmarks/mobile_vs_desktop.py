@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Сравнение мобильного и десктопного профилей парсинга.
+
+Для каждой ссылки и профиля измеряет объем скачанных данных, число запросов,
+размер DOM и время до появления валидных данных товара (стратегии парсера
+опрашиваются сразу после domcontentloaded, без фиксированных задержек).
+
+Пример:
+    python benchmarks/mobile_vs_desktop.py \\
+        https://www.wildberries.ru/catalog/123456/detail.aspx \\
+        https://www.ozon.ru/product/some-item-123456/ \\
+        https://market.yandex.ru/product--some-item/123456 --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import get_parser
+from parsers.base import ParserWrapper
+from parsers.profiles import get_profile, PROFILE_NAMES
+from parsers.strategies import strategy_stats
+
+DATA_POLL_INTERVAL = 0.5
+
+
+def measure(url: str, profile_name: str, timeout: float) -> dict:
+    """Один прогон: открывает страницу в профиле и ждет данных товара"""
+    parser = ParserWrapper.innermost(get_parser(url, implementation='full'))
+    parser.profile = get_profile(profile_name, parser.marketplace)
+    playwright, browser, page = parser._get_browser_page()
+    transferred = {"bytes": 0, "requests": 0}
+
+    def on_finished(request):
+        try:
+            sizes = request.sizes()
+            transferred["bytes"] += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            pass
+        transferred["requests"] += 1
+
+    page.on("requestfinished", on_finished)
+    try:
+        start = time.time()
+        parser._open_product_page(page, parser.url, wait_until='domcontentloaded')
+        time_to_data = None
+        while time.time() - start < timeout:
+            if parser._has_valid_product_data(parser._extract_product_data(page)):
+                time_to_data = time.time() - start
+                break
+            time.sleep(DATA_POLL_INTERVAL)
+        dom = page.evaluate("""
+            () => ({
+                nodes: document.getElementsByTagName('*').length,
+                html: document.documentElement.outerHTML.length
+            })
+        """)
+        return {
+            "time_to_data": time_to_data,
+            "bytes": transferred["bytes"],
+            "requests": transferred["requests"],
+            "dom_nodes": dom["nodes"],
+            "html_chars": dom["html"],
+        }
+    finally:
+        parser._close_browser(playwright, browser)
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк мобильного профиля против десктопного")
+    arg_parser.add_argument('urls', nargs='+', help="Ссылки на товары (WB, Ozon, Яндекс Маркет)")
+    arg_parser.add_argument('--runs', type=int, default=3, help="Прогонов на ссылку и профиль")
+    arg_parser.add_argument('--timeout', type=float, default=45, help="Максимум секунд ожидания данных")
+    args = arg_parser.parse_args()
+
+    # Прогоны бенчмарка не должны влиять на выученный порядок стратегий продакшена
+    strategy_stats.path = ''
+
+    header = f"{'маркетплейс':<12} {'профиль':<8} {'до данных, с':>12} {'КБ':>9} {'запросов':>9} {'DOM узлов':>10} {'HTML, КБ':>9}"
+    print(header)
+    print("-" * len(header))
+    for url in args.urls:
+        for profile_name in PROFILE_NAMES:
+            results = []
+            for _ in range(max(1, args.runs)):
+                try:
+                    results.append(measure(url, profile_name, args.timeout))
+                except Exception as e:
+                    print(f"⚠️ {profile_name}: {url}: {e}", file=sys.stderr)
+            if not results:
+                continue
+            ttd = median(r["time_to_data"] for r in results)
+            marketplace = get_parser(url).marketplace
+            print(f"{marketplace:<12} {profile_name:<8} "
+                  f"{(f'{ttd:.2f}' if ttd is not None else 'нет данных'):>12} "
+                  f"{median(r['bytes'] for r in results) / 1024:>9.0f} "
+                  f"{median(r['requests'] for r in results):>9.0f} "
+                  f"{median(r['dom_nodes'] for r in results):>10.0f} "
+                  f"{median(r['html_chars'] for r in results) / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Поэтапный бенчмарк парсеров с бюджетами регрессий.
+
+Прогоняет парсеры по записанным HAR-фикстурам (см. har_fixtures.py) без сети
+и для каждого класса парсера измеряет этапы:
+    acquire       - запуск браузера и создание страницы (_get_browser_page)
+    navigate      - переход на страницу и проверка капчи (_open_product_page)
+    ready_wait    - ожидание готовности страницы (_wait_for_page_load)
+    sleep         - фиксированные паузы парсера (по умолчанию пропускаются)
+    strategy:<имя> - каждая стратегия извлечения (_run_strategies)
+    dom_fallback  - DOM-fallback вне стратегий (_extract_basic_fallback)
+    extract       - извлечение данных упрощенных парсеров (_extract_data)
+    api           - запросы request-клиента (_api_get)
+    teardown      - закрытие браузера (_close_browser)
+    assembly      - все остальное время parse(): сборка результата
+    total         - parse() целиком
+Для каждого этапа - min/median/p95 времени, число round-trip вызовов
+page.evaluate и выделенная Python-память (tracemalloc).
+
+Результат сравнивается с сохраненным baseline: этап падает, если его p95
+превышает бюджет (budget_ms из baseline, иначе p95 baseline * (1 + tolerance)
++ slack) или если вызовов page.evaluate стало больше.
+
+Примеры:
+    python benchmarks/stages.py --runs 5 --update-baseline
+    python benchmarks/stages.py --runs 5
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from har_fixtures import make_parser, REPLAY_SEED
+from parsers.har import har_dir
+from parsers.strategies import strategy_stats
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stage_baseline.json')
+DEFAULT_TOLERANCE = 0.25
+# Абсолютный запас, чтобы микросекундные этапы не падали от шума
+DEFAULT_SLACK_MS = 20
+
+STAGE_METHODS = {
+    '_get_browser_page': 'acquire',
+    '_open_product_page': 'navigate',
+    '_wait_for_page_load': 'ready_wait',
+    '_sleep': 'sleep',
+    '_extract_basic_fallback': 'dom_fallback',
+    '_extract_data': 'extract',
+    '_api_get': 'api',
+    '_close_browser': 'teardown',
+}
+EVALUATE_METHODS = ('evaluate', 'evaluate_handle', 'eval_on_selector', 'eval_on_selector_all')
+
+
+class StageRecorder:
+    """Замеры одного прогона: время, вызовы page.evaluate и память по этапам"""
+
+    def __init__(self):
+        self.elapsed = defaultdict(float)
+        self.evaluates = defaultdict(int)
+        self.allocated = defaultdict(int)
+        # Стек активных этапов: [имя, начало, время вложенных этапов]
+        self._stack = []
+        self.top_level = 0.0
+
+    def timed(self, stage: str, func):
+        def wrapper(*args, **kwargs):
+            frame = [stage, time.perf_counter(), 0.0]
+            memory_before = tracemalloc.get_traced_memory()[0]
+            self._stack.append(frame)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._stack.pop()
+                elapsed = time.perf_counter() - frame[1]
+                self.elapsed[stage] += elapsed
+                self.allocated[stage] += max(0, tracemalloc.get_traced_memory()[0] - memory_before)
+                if self._stack:
+                    self._stack[-1][2] += elapsed
+                else:
+                    self.top_level += elapsed
+        return wrapper
+
+    def count_evaluate(self, func):
+        def wrapper(*args, **kwargs):
+            stage = self._stack[-1][0] if self._stack else 'assembly'
+            self.evaluates[stage] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+
+def instrument(parser, recorder: StageRecorder, real_sleeps: bool) -> None:
+    """Оборачивает методы этапов на экземпляре парсера (класс не меняется)"""
+    for method, stage in STAGE_METHODS.items():
+        original = getattr(parser, method, None)
+        if original is None:
+            continue
+        if method == '_sleep' and not real_sleeps:
+            original = lambda seconds, _check=parser._check_cancelled: _check()
+        setattr(parser, method, recorder.timed(stage, original))
+
+    get_browser_page = parser._get_browser_page
+
+    def counted_browser_page(*args, **kwargs):
+        playwright, browser, page = get_browser_page(*args, **kwargs)
+        for name in EVALUATE_METHODS:
+            setattr(page, name, recorder.count_evaluate(getattr(page, name)))
+        return playwright, browser, page
+    parser._get_browser_page = counted_browser_page
+
+    run_strategies = parser._run_strategies
+
+    def timed_strategies(page, stage, strategies, is_valid, fallbacks=()):
+        def timed(items):
+            return [(name, recorder.timed(f"strategy:{name}", func)) for name, func in items]
+        return run_strategies(page, stage, timed(strategies), is_valid, fallbacks=timed(fallbacks))
+    parser._run_strategies = timed_strategies
+
+
+def run_once(fixture: dict, real_sleeps: bool) -> tuple:
+    """Один прогон фикстуры: (класс парсера, замеры этапов)"""
+    random.seed(REPLAY_SEED)
+    parser = make_parser(fixture['url'], fixture['implementation'], fixture['profile'])
+    recorder = StageRecorder()
+    instrument(parser, recorder, real_sleeps)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        parser.parse()
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stages = {stage: {'ms': elapsed * 1000, 'evaluate': recorder.evaluates.get(stage, 0),
+                      'alloc_kb': recorder.allocated.get(stage, 0) / 1024}
+              for stage, elapsed in recorder.elapsed.items()}
+    stages['assembly'] = {'ms': max(0.0, total - recorder.top_level) * 1000,
+                          'evaluate': recorder.evaluates.get('assembly', 0), 'alloc_kb': 0}
+    stages['total'] = {'ms': total * 1000, 'evaluate': sum(recorder.evaluates.values()), 'alloc_kb': peak / 1024}
+    return type(parser).__name__, stages
+
+
+def percentile(values: list, quantile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(quantile * (len(values) - 1))))]
+
+
+def summarize(runs: list) -> dict:
+    """runs: список замеров одного класса -> статистика по этапам"""
+    by_stage = defaultdict(list)
+    for stages in runs:
+        for stage, measure in stages.items():
+            by_stage[stage].append(measure)
+    summary = {}
+    for stage, measures in by_stage.items():
+        times = [m['ms'] for m in measures]
+        summary[stage] = {
+            'runs': len(measures),
+            'min_ms': round(min(times), 1),
+            'median_ms': round(statistics.median(times), 1),
+            'p95_ms': round(percentile(times, 0.95), 1),
+            'evaluate': max(m['evaluate'] for m in measures),
+            'alloc_kb': round(statistics.median(m['alloc_kb'] for m in measures), 1),
+        }
+    return summary
+
+
+def check_budgets(results: dict, baseline: dict, tolerance: float, slack_ms: float,
+                  require_all: bool = True) -> list:
+    """
+    Этапы, вышедшие за бюджет или пропавшие из результатов: [(класс, этап, причина)].
+    require_all=False - прогнана часть фикстур, отсутствие целых классов не нарушение
+    """
+    violations = []
+    for class_name, expected_stages in baseline.items():
+        stages = results.get(class_name)
+        if stages is None:
+            if require_all:
+                violations.append((class_name, '*', "нет результатов (класс есть в baseline)"))
+            continue
+        for stage in expected_stages:
+            if stage not in stages:
+                violations.append((class_name, stage, "этап не выполнялся (есть в baseline)"))
+    for class_name, stages in results.items():
+        for stage, current in stages.items():
+            expected = baseline.get(class_name, {}).get(stage)
+            if not expected:
+                continue
+            budget = expected.get('budget_ms') or expected['p95_ms'] * (1 + tolerance) + slack_ms
+            if current['p95_ms'] > budget:
+                violations.append((class_name, stage, f"p95 {current['p95_ms']}ms > бюджет {budget:.1f}ms"))
+            if current['evaluate'] > expected.get('evaluate', current['evaluate']):
+                violations.append((class_name, stage,
+                                   f"page.evaluate {current['evaluate']} > {expected['evaluate']}"))
+    return violations
+
+
+def print_results(results: dict) -> None:
+    header = f"{'этап':<28} {'min, мс':>9} {'медиана':>9} {'p95':>9} {'evaluate':>9} {'память, КБ':>11}"
+    for class_name, stages in sorted(results.items()):
+        print(f"\n{class_name}")
+        print(header)
+        print("-" * len(header))
+        for stage, s in sorted(stages.items(), key=lambda item: (item[0] == 'total', item[0])):
+            print(f"{stage:<28} {s['min_ms']:>9.1f} {s['median_ms']:>9.1f} {s['p95_ms']:>9.1f} "
+                  f"{s['evaluate']:>9} {s['alloc_kb']:>11.1f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Поэтапный бенчмарк парсеров по HAR-фикстурам")
+    arg_parser.add_argument('names', nargs='*', help="Имена фикстур (по умолчанию все в PARSER_HAR_DIR)")
+    arg_parser.add_argument('--runs', type=int, default=5, help="Прогонов на фикстуру")
+    arg_parser.add_argument('--implementation', help="Переопределить реализацию фикстуры: full или simple")
+    arg_parser.add_argument('--real-sleeps', action='store_true', help="Не пропускать фиксированные паузы парсеров")
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Файл baseline")
+    arg_parser.add_argument('--update-baseline', action='store_true', help="Сохранить результат как baseline")
+    arg_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Допустимый рост p95 (доля)")
+    arg_parser.add_argument('--slack-ms', type=float, default=DEFAULT_SLACK_MS, help="Абсолютный запас бюджета, мс")
+    args = arg_parser.parse_args()
+
+    os.environ['PARSER_HAR_MODE'] = 'replay'
+    # Прогоны бенчмарка не должны влиять на выученный порядок стратегий и сами должны быть детерминированы
+    strategy_stats.path = ''
+    strategy_stats.exploration = 0
+
+    paths = [os.path.join(har_dir(), f"{name}.json") for name in args.names] if args.names else \
+        sorted(glob.glob(os.path.join(har_dir(), '*.json')))
+    if not paths:
+        print(f"❌ Нет фикстур в {har_dir()}. Запишите их: python har_fixtures.py record <url>", file=sys.stderr)
+        sys.exit(1)
+
+    runs_by_class = defaultdict(list)
+    failed = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+        if args.implementation:
+            fixture['implementation'] = args.implementation
+        for _ in range(max(1, args.runs)):
+            try:
+                class_name, stages = run_once(fixture, args.real_sleeps)
+            except Exception as e:
+                print(f"❌ {os.path.basename(path)}: {e}", file=sys.stderr)
+                failed += 1
+                continue
+            runs_by_class[class_name].append(stages)
+
+    results = {class_name: summarize(runs) for class_name, runs in runs_by_class.items()}
+    print_results(results)
+
+    if failed:
+        # Упавший класс выпал бы из сравнения, и проверка бюджета прошла бы без него
+        print(f"\n❌ Упавших прогонов: {failed}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline сохранен: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ Baseline не найден ({args.baseline}), сравнение пропущено. Создайте: --update-baseline")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    violations = check_budgets(results, baseline, args.tolerance, args.slack_ms, require_all=not args.names)
+    if violations:
+        print("\n❌ Выход за бюджет:")
+        for class_name, stage, reason in violations:
+            print(f"   {class_name} / {stage}: {reason}")
+        sys.exit(1)
+    print("\n✅ Все этапы в пределах бюджета")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Корпус HAR-фикстур для воспроизводимых прогонов парсеров без сети.
+
+record - открывает страницы товаров и сохраняет весь трафик в HAR-архивы
+         (PARSER_HAR_DIR, по умолчанию fixtures/har) вместе с эталонным
+         результатом парсинга <имя>.json.
+replay - прогоняет парсеры по архивам без единого сетевого запроса, сверяет
+         результат с эталоном и печатает время каждого прогона. Прогон, в котором
+         хотя бы один ответ пришел из сети, а не из архива, считается упавшим.
+
+Примеры:
+    python har_fixtures.py record https://www.wildberries.ru/catalog/123456/detail.aspx \\
+        https://www.ozon.ru/product/some-item-123456/ https://market.yandex.ru/product--some-item/123456
+    python har_fixtures.py replay --runs 5
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from parsers.har import har_dir, har_name
+from parsers.profiles import get_profile
+from parsers.record import dumps, loads
+from parsers.selection import IMPLEMENTATIONS, IMPLEMENTATION_FULL, parser_class
+from parsers.strategies import strategy_stats
+from parsers.urls import canonicalize
+
+# Фиксированный seed: одинаковые паузы и порядок стратегий в каждом прогоне
+REPLAY_SEED = 0
+
+
+def make_parser(url: str, implementation: str, profile_name: str):
+    identity = canonicalize(url)
+    if identity.marketplace not in IMPLEMENTATIONS:
+        raise ValueError(f"Неподдерживаемый маркетплейс: {url}")
+    parser = parser_class(identity.marketplace, implementation)(identity.canonical_url, identity)
+    parser.profile = get_profile(profile_name, identity.marketplace)
+    return parser
+
+
+def run_parser(parser) -> tuple:
+    start = time.time()
+    result = parser.parse()
+    leaks = parser.replay_leaks
+    if leaks:
+        raise ValueError(f"{len(leaks)} запросов ушло в сеть мимо архива, первый: {leaks[0]}")
+    # Нормализуем через JSON, чтобы сравнение не зависело от типов контейнеров
+    return loads(dumps(result)), time.time() - start
+
+
+def record(urls: list, implementation: str, profile_name: str) -> int:
+    os.environ['PARSER_HAR_MODE'] = 'record'
+    errors = 0
+    for url in urls:
+        try:
+            parser = make_parser(url, implementation, profile_name)
+            result, elapsed = run_parser(parser)
+        except Exception as e:
+            errors += 1
+            print(f"❌ {url}: {e}", file=sys.stderr)
+            continue
+        fixture_path = os.path.join(har_dir(), har_name(parser.url, profile_name) + '.json')
+        with open(fixture_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "url": parser.url,
+                "implementation": implementation,
+                "profile": profile_name,
+                "result": result,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 {fixture_path} ({elapsed:.2f}s): {result.get('title', '')[:60]}")
+    return errors
+
+
+def replay(names: list, runs: int) -> int:
+    os.environ['PARSER_HAR_MODE'] = 'replay'
+    strategy_stats.exploration = 0
+    paths = [os.path.join(har_dir(), f"{name}.json") for name in names] if names else \
+        sorted(glob.glob(os.path.join(har_dir(), '*.json')))
+    if not paths:
+        print(f"❌ Нет фикстур в {har_dir()}", file=sys.stderr)
+        return 1
+    failures = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+        name = os.path.basename(path)[:-len('.json')]
+        timings = []
+        mismatched = []
+        for _ in range(max(1, runs)):
+            random.seed(REPLAY_SEED)
+            try:
+                result, elapsed = run_parser(make_parser(fixture["url"], fixture["implementation"], fixture["profile"]))
+            except Exception as e:
+                mismatched = [f"ошибка: {e}"]
+                break
+            timings.append(elapsed)
+            expected = fixture["result"]
+            mismatched = sorted(key for key in set(expected) | set(result) if expected.get(key) != result.get(key))
+            if mismatched:
+                break
+        if mismatched:
+            failures += 1
+            print(f"❌ {name}: расходится с эталоном: {', '.join(mismatched)}")
+        else:
+            print(f"✅ {name}: медиана {statistics.median(timings):.2f}s, "
+                  f"мин {min(timings):.2f}s, макс {max(timings):.2f}s ({len(timings)} прогонов)")
+    return failures
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Запись и воспроизведение HAR-фикстур парсеров")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help="Записать страницы товаров в HAR")
+    record_parser.add_argument('urls', nargs='+', help="Ссылки на товары (WB, Ozon, Яндекс Маркет)")
+    record_parser.add_argument('--implementation', default=IMPLEMENTATION_FULL, help="full или simple")
+    record_parser.add_argument('--profile', default='desktop', help="Профиль браузера: desktop или mobile")
+    replay_parser = commands.add_parser('replay', help="Прогнать парсеры по записанным HAR без сети")
+    replay_parser.add_argument('names', nargs='*', help="Имена фикстур (по умолчанию все)")
+    replay_parser.add_argument('--runs', type=int, default=1, help="Прогонов на фикстуру")
+    args = arg_parser.parse_args()
+
+    # Прогоны по фикстурам не должны влиять на выученный порядок стратегий продакшена
+    strategy_stats.path = ''
+    if args.command == 'record':
+        failures = record(args.urls, args.implementation, args.profile)
+    else:
+        failures = replay(args.names, args.runs)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Массовый импорт товаров по списку ссылок маркетплейсов.
+
+Читает URL из файла или stdin, парсит параллельно (с ограничением
+на каждый маркетплейс), пишет результаты в JSONL и сохраняет прогресс
+в checkpoint-файл, чтобы прерванный запуск продолжился без повторного парсинга.
+
+Примеры:
+    python import_products.py links.txt -o products.jsonl
+    cat links.txt | python import_products.py - -o products.jsonl --per-marketplace 3
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from parsers import get_parser
+from parsers.urls import canonicalize
+from parsers.record import dumps
+
+
+def read_urls(source: str) -> list:
+    """Читает ссылки (по одной в строке, допускаются CSV-строки - берется первое поле с http)"""
+    stream = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    urls = []
+    try:
+        for line in stream:
+            for cell in line.replace(';', ',').replace('\t', ',').split(','):
+                cell = cell.strip().strip('"')
+                if cell.startswith('http'):
+                    urls.append(cell)
+                    break
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return urls
+
+
+def load_checkpoint(path: str, retry_failed: bool) -> set:
+    """
+    Возвращает ключи уже обработанных товаров. С retry_failed - только успешно
+    обработанных: товар с хотя бы одной строкой ok не повторяется, в каком бы
+    порядке ни шли его строки error и ok
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            key, _, status = line.rstrip('\n').partition('\t')
+            if key and (status == 'ok' or not retry_failed):
+                done.add(key)
+    return done
+
+
+class ImportStats:
+    """Счетчики для живой сводки"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started_at = time.time()
+        self.done = 0
+        self.errors = 0
+        self.by_marketplace = defaultdict(lambda: {"ok": 0, "error": 0})
+        self.lock = threading.Lock()
+
+    def add(self, marketplace: str, ok: bool) -> None:
+        with self.lock:
+            self.done += 1
+            if not ok:
+                self.errors += 1
+            self.by_marketplace[marketplace]["ok" if ok else "error"] += 1
+
+    def summary(self) -> str:
+        with self.lock:
+            elapsed = max(time.time() - self.started_at, 0.001)
+            rate = self.done / elapsed * 60
+            parts = [f"{mp}: {c['ok']}✅ {c['error']}❌" for mp, c in sorted(self.by_marketplace.items())]
+            return (f"📊 {self.done}/{self.total} готово, ошибок: {self.errors}, "
+                    f"{rate:.1f} товаров/мин, {elapsed:.0f}с" + (f" | {' | '.join(parts)}" if parts else ""))
+
+
+class BulkImporter:
+    def __init__(self, output_path: str, checkpoint_path: str, per_marketplace: int, workers: int):
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.per_marketplace = per_marketplace
+        self.workers = workers
+        self._write_lock = threading.Lock()
+
+    def _write(self, record: dict, key: str, ok: bool) -> None:
+        """Пишет результат и отмечает товар в checkpoint (результат пишется раньше отметки)"""
+        with self._write_lock:
+            with open(self.output_path, 'a', encoding='utf-8') as out:
+                out.write(dumps(record).decode('utf-8') + "\n")
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as cp:
+                cp.write(f"{key}\t{'ok' if ok else 'error'}\n")
+
+    def _process(self, url: str, key: str, marketplace: str, stats: ImportStats) -> None:
+        start_time = time.time()
+        try:
+            product_data = get_parser(url).parse()
+            record = {"url": url, "key": key, "success": True, "data": product_data}
+            ok = True
+        except Exception as e:
+            record = {"url": url, "key": key, "success": False, "error": str(e)}
+            ok = False
+        record["elapsed"] = round(time.time() - start_time, 2)
+        self._write(record, key, ok)
+        stats.add(marketplace, ok)
+
+    def _dispatch(self, pool: ThreadPoolExecutor, pending: list, stats: ImportStats) -> list:
+        """
+        Отдает задачи в пул, только когда у маркетплейса есть свободный слот.
+        Очередь своя у каждого маркетплейса, выбор по кругу: отсортированный
+        по маркетплейсам список не занимает все потоки одним из них
+        """
+        queues = defaultdict(deque)
+        for url, key, marketplace in pending:
+            queues[marketplace].append((url, key))
+        running = defaultdict(int)
+        slots = threading.Condition()
+
+        def release(marketplace, _future):
+            with slots:
+                running[marketplace] -= 1
+                slots.notify()
+
+        futures = []
+        while queues:
+            with slots:
+                ready = [mp for mp in queues if running[mp] < self.per_marketplace]
+                if not ready or sum(running.values()) >= self.workers:
+                    slots.wait(1)
+                    continue
+                for marketplace in ready:
+                    if sum(running.values()) >= self.workers:
+                        break
+                    queue = queues.pop(marketplace)
+                    url, key = queue.popleft()
+                    if queue:
+                        # В конец круга: следующий свободный слот достается другим маркетплейсам
+                        queues[marketplace] = queue
+                    running[marketplace] += 1
+                    future = pool.submit(self._process, url, key, marketplace, stats)
+                    futures.append(future)
+                    future.add_done_callback(partial(release, marketplace))
+        return futures
+
+    def run(self, urls: list, retry_failed: bool = False) -> ImportStats:
+        done = load_checkpoint(self.checkpoint_path, retry_failed)
+
+        # Дедупликация по идентичности товара и пропуск уже обработанных. Короткие ссылки
+        # здесь не раскрываются (до 10с на ссылку до начала парсинга) - это делает парсер в пуле
+        pending = []
+        seen = set()
+        for url in urls:
+            identity = canonicalize(url, resolve=False)
+            marketplace = identity.marketplace
+            if not marketplace:
+                print(f"⚠️ Пропускаем неподдерживаемую ссылку: {url}", file=sys.stderr)
+                continue
+            key = identity.key
+            if key in seen or key in done:
+                continue
+            seen.add(key)
+            pending.append((url, key, marketplace))
+
+        print(f"🚀 К обработке: {len(pending)} (уже готово: {len(done)}, всего ссылок: {len(urls)})", file=sys.stderr)
+        stats = ImportStats(len(pending))
+        if not pending:
+            return stats
+
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(2):
+                print(f"\r{stats.summary()}", end='', file=sys.stderr, flush=True)
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = self._dispatch(pool, pending, stats)
+            for future in futures:
+                future.result()
+            pool.shutdown()
+        except KeyboardInterrupt:
+            # Незапущенные задачи отменяем - они останутся без отметки в checkpoint
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            stop.set()
+            print(f"\r{stats.summary()}", file=sys.stderr, flush=True)
+        return stats
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Массовый импорт товаров с маркетплейсов в JSONL")
+    arg_parser.add_argument('input', help="Файл со ссылками или '-' для stdin")
+    arg_parser.add_argument('-o', '--output', default='products.jsonl', help="Файл результатов (JSONL)")
+    arg_parser.add_argument('--checkpoint', help="Файл прогресса (по умолчанию <output>.checkpoint)")
+    arg_parser.add_argument('--per-marketplace', type=int, default=2, help="Параллельных парсингов на маркетплейс")
+    arg_parser.add_argument('--workers', type=int, default=6, help="Всего параллельных парсингов")
+    arg_parser.add_argument('--retry-failed', action='store_true', help="Повторить ссылки, завершившиеся ошибкой")
+    args = arg_parser.parse_args()
+
+    urls = read_urls(args.input)
+    if not urls:
+        print("❌ Не найдено ни одной ссылки", file=sys.stderr)
+        sys.exit(1)
+
+    importer = BulkImporter(
+        output_path=args.output,
+        checkpoint_path=args.checkpoint or f"{args.output}.checkpoint",
+        per_marketplace=max(1, args.per_marketplace),
+        workers=max(1, args.workers),
+    )
+    try:
+        stats = importer.run(urls, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        print("\n⏸️ Прервано. Повторный запуск продолжит с места остановки.", file=sys.stderr)
+        sys.exit(130)
+    sys.exit(1 if stats.errors and stats.errors == stats.done else 0)
+
+
+if __name__ == "__main__":
+    main()
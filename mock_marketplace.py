@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Локальный mock-сервер маркетплейсов для тестов без интернета.
+
+Отдает синтетические страницы товаров WB, Ozon и Яндекс Маркета в тех
+форматах, которые ищут парсеры: __WBLB_INITIAL_DATA__ / __WB_INITIAL_DATA__,
+JSON-LD Product, блоки Ozon data-widget и page API, зоны Яндекс Маркета
+data-zone-name и страницу /spec, а также card API Wildberries.
+Данные товара детерминированно выводятся из артикула.
+
+Поведения (включаются флагами --behaviour или POST /__mock/behaviours):
+    slow_xhr      - данные и разметка товара приходят отдельным XHR с задержкой
+    lazy_gallery  - картинки галереи в data-src, src появляется при прокрутке
+    captcha       - страница товара редиректит на капчу
+    missing_state - нет JSON-LD, window-состояния и page API (только DOM)
+    kopecks       - цены в JSON-LD и состоянии страницы в копейках
+    legacy_state  - WB отдает __WB_INITIAL_DATA__ вместо __WBLB_INITIAL_DATA__
+
+Парсеры направляются на сервер через PARSER_HOST_MAP (см. parsers/urls.py):
+    python mock_marketplace.py --port 8099 --behaviour lazy_gallery
+    export PARSER_HOST_MAP=wildberries.ru=http://127.0.0.1:8099/wb,wb.ru=http://127.0.0.1:8099/wb,\\
+ozon.ru=http://127.0.0.1:8099/ozon,market.yandex.ru=http://127.0.0.1:8099/ym
+"""
+import argparse
+import base64
+import html
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import Flask, jsonify, redirect, request, Response
+
+BEHAVIOURS = ('slow_xhr', 'lazy_gallery', 'captcha', 'missing_state', 'kopecks', 'legacy_state')
+MARKETPLACE_NAMES = {'wb': 'Wildberries', 'ozon': 'Ozon', 'ym': 'Яндекс Маркет'}
+IMAGES_PER_PRODUCT = 5
+
+# Прозрачный GIF 1x1 вместо картинок товара
+PIXEL_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+LAZY_PLACEHOLDER = 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+
+class MockState:
+    """Включенные поведения (меняются на лету через /__mock/behaviours)"""
+
+    def __init__(self, behaviours=(), xhr_delay: float = 3.0):
+        self._lock = threading.Lock()
+        self.behaviours = set(behaviours)
+        self.xhr_delay = xhr_delay
+
+    def enabled(self, name: str) -> bool:
+        with self._lock:
+            return name in self.behaviours
+
+    def update(self, behaviours=None, xhr_delay=None) -> None:
+        with self._lock:
+            if behaviours is not None:
+                unknown = set(behaviours) - set(BEHAVIOURS)
+                if unknown:
+                    raise ValueError(f"Неизвестные поведения: {', '.join(sorted(unknown))}")
+                self.behaviours = set(behaviours)
+            if xhr_delay is not None:
+                self.xhr_delay = float(xhr_delay)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'behaviours': sorted(self.behaviours), 'xhr_delay': self.xhr_delay}
+
+
+state = MockState()
+app = Flask(__name__)
+
+
+def product(marketplace: str, product_id: int) -> dict:
+    """Синтетический товар, детерминированный по артикулу"""
+    price = 990 + (product_id * 37) % 9000
+    base = request.host_url.rstrip('/')
+    return {
+        'id': product_id,
+        'title': f"{MARKETPLACE_NAMES[marketplace]} тестовый товар {product_id}",
+        'price': price,
+        'old_price': int(price * 1.3),
+        'description': f"Описание тестового товара {product_id}. Синтетическая страница для проверки парсеров без сети.",
+        'category': 'Тестовая категория',
+        'characteristics': {'Цвет': 'черный', 'Материал': 'хлопок', 'Страна производства': 'Россия'},
+        'images': [f"{base}/{marketplace}/img/{product_id}/{n}.gif" for n in range(1, IMAGES_PER_PRODUCT + 1)],
+        'colors': [product_id + offset for offset in range(3)],
+    }
+
+
+def state_price(rubles: int) -> int:
+    """Цена в рублях или в копейках (поведение kopecks)"""
+    return rubles * 100 if state.enabled('kopecks') else rubles
+
+
+def json_ld(item: dict) -> dict:
+    return {
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': item['title'],
+        'description': item['description'],
+        'image': item['images'],
+        'offers': {'@type': 'Offer', 'price': state_price(item['price']), 'priceCurrency': 'RUB',
+                   'availability': 'https://schema.org/InStock'},
+    }
+
+
+def gallery_html(item: dict, container: str) -> str:
+    """Галерея: обычные src или ленивые data-src (поведение lazy_gallery)"""
+    if state.enabled('lazy_gallery'):
+        images = ''.join(f'<img src="{LAZY_PLACEHOLDER}" data-src="{src}" loading="lazy">' for src in item['images'])
+    else:
+        images = ''.join(f'<img src="{src}">' for src in item['images'])
+    return f'<div {container}>{images}</div>'
+
+
+LAZY_SCRIPT = """
+<script>
+  const lazyObserver = new IntersectionObserver(entries => entries.forEach(entry => {
+    if (entry.isIntersecting) { entry.target.src = entry.target.dataset.src; lazyObserver.unobserve(entry.target); }
+  }));
+  window.observeLazy = () => document.querySelectorAll('img[data-src]').forEach(img => lazyObserver.observe(img));
+  document.addEventListener('DOMContentLoaded', window.observeLazy);
+</script>
+"""
+
+XHR_SCRIPT = """
+<script>
+  fetch('%s').then(r => r.json()).then(data => {
+    if (data.state_var) window[data.state_var] = data.state;
+    if (data.json_ld) {
+      const ld = document.createElement('script');
+      ld.type = 'application/ld+json';
+      ld.textContent = JSON.stringify(data.json_ld);
+      document.head.appendChild(ld);
+    }
+    document.getElementById('app').innerHTML = data.html;
+    if (window.observeLazy) observeLazy();
+  });
+</script>
+"""
+
+
+def render_page(marketplace: str, item: dict, body: str, state_var: str = None, page_state: dict = None) -> Response:
+    """Страница товара: состояние и JSON-LD inline или через медленный XHR (slow_xhr)"""
+    missing = state.enabled('missing_state')
+    head = [f"<title>{html.escape(item['title'])} - {MARKETPLACE_NAMES[marketplace]}</title>"]
+    scripts = [LAZY_SCRIPT] if state.enabled('lazy_gallery') else []
+    if state.enabled('slow_xhr'):
+        scripts.append(XHR_SCRIPT % f"/{marketplace}/__xhr/{item['id']}")
+        app_html = '<div class="skeleton">Загрузка...</div>'
+    else:
+        app_html = body
+        if not missing:
+            head.append(f'<script type="application/ld+json">{json.dumps(json_ld(item), ensure_ascii=False)}</script>')
+            if state_var:
+                scripts.insert(0, f"<script>window.{state_var} = {json.dumps(page_state, ensure_ascii=False)};</script>")
+    page = (f"<!DOCTYPE html><html lang=\"ru\"><head><meta charset=\"utf-8\">{''.join(head)}</head>"
+            f"<body><div id=\"app\">{app_html}</div>{''.join(scripts)}</body></html>")
+    return Response(page, mimetype='text/html')
+
+
+def captcha_redirect(marketplace: str):
+    if state.enabled('captcha'):
+        return redirect(f"/{marketplace}/showcaptcha?retpath={request.full_path}", code=302)
+    return None
+
+
+# ---------- Wildberries ----------
+
+def wb_state(item: dict) -> dict:
+    return {'product': {
+        'id': item['id'],
+        'nm_id': item['id'],
+        'imt_name': item['title'],
+        'name': item['title'],
+        'salePriceU': item['price'] * 100,
+        'priceU': item['old_price'] * 100,
+        'description': item['description'],
+        'subjectName': item['category'],
+        'characteristics': [{'name': k, 'value': v} for k, v in item['characteristics'].items()],
+        'photos': [{'url': src} for src in item['images']],
+        'stocks': [{'inStock': True}],
+        'colors': [{'nm_id': nm_id} for nm_id in item['colors']],
+        'sizes': [{'origName': size, 'stocks': [{'qty': 5}]} for size in ('S', 'M', 'L')],
+    }}
+
+
+def wb_body(item: dict) -> str:
+    return (f'<h1 class="product-page__title">{html.escape(item["title"])}</h1>'
+            f'<div class="price-block"><span class="price-block__final-price">{item["price"]} ₽</span>'
+            f'<del class="price-block__old-price">{item["old_price"]} ₽</del></div>'
+            f'<div class="product-page__description">{html.escape(item["description"])}</div>'
+            + gallery_html(item, 'class="product-page__gallery"')
+            + '<div class="product-page__colors">'
+            + ''.join(f'<a href="/catalog/{nm_id}/detail.aspx">{nm_id}</a>' for nm_id in item['colors'])
+            + '</div>')
+
+
+def wb_state_var() -> str:
+    return '__WB_INITIAL_DATA__' if state.enabled('legacy_state') else '__WBLB_INITIAL_DATA__'
+
+
+@app.route('/wb/catalog/<int:nm_id>/detail.aspx')
+def wb_product(nm_id):
+    blocked = captcha_redirect('wb')
+    if blocked:
+        return blocked
+    item = product('wb', nm_id)
+    return render_page('wb', item, wb_body(item), wb_state_var(), wb_state(item))
+
+
+@app.route('/wb/cards/v2/detail')
+def wb_card_api():
+    ids = [int(i) for i in re.findall(r'\d+', request.args.get('nm', ''))]
+    products = []
+    for nm_id in ids:
+        item = product('wb', nm_id)
+        products.append({
+            'id': nm_id,
+            'name': item['title'],
+            'colors': [{'name': 'черный'}],
+            'pics': IMAGES_PER_PRODUCT,
+            'totalQuantity': 10,
+            'sizes': [{'origName': 'M', 'price': {'product': item['price'] * 100, 'basic': item['old_price'] * 100},
+                       'stocks': [{'qty': 10}]}],
+        })
+    return jsonify({'data': {'products': products}})
+
+
+# ---------- Ozon ----------
+
+def ozon_widgets(item: dict) -> dict:
+    """widgetStates page API: значения - JSON-строки, как у настоящего Ozon"""
+    widgets = {
+        'webProductHeading': {'title': item['title']},
+        'webPrice': {'price': f"{item['price']:,} ₽".replace(',', ' '),
+                     'originalPrice': f"{item['old_price']:,} ₽".replace(',', ' '), 'isAvailable': True},
+        'webGallery': {'images': [{'src': src} for src in item['images']]},
+        'webCharacteristics': {'characteristics': [{'short': [
+            {'key': name, 'name': name, 'values': [{'text': value}]} for name, value in item['characteristics'].items()
+        ]}]},
+        'breadCrumbs': {'breadcrumbs': [{'text': 'Главная'}, {'text': item['category']}]},
+    }
+    return {f"{name}-{item['id']}-default-1": json.dumps(value, ensure_ascii=False) for name, value in widgets.items()}
+
+
+def ozon_state(item: dict) -> dict:
+    return {'product': {
+        'title': item['title'],
+        'price': state_price(item['price']),
+        'oldPrice': state_price(item['old_price']),
+        'description': item['description'],
+        'category': item['category'],
+        'characteristics': [{'name': k, 'value': v} for k, v in item['characteristics'].items()],
+        'images': [{'url': src} for src in item['images']],
+        'isAvailable': True,
+    }}
+
+
+def ozon_body(item: dict) -> str:
+    characteristics = ''.join(f'<dt>{html.escape(k)}</dt><dd>{html.escape(v)}</dd>'
+                              for k, v in item['characteristics'].items())
+    return (f'<div data-widget="webProductHeading"><h1>{html.escape(item["title"])}</h1></div>'
+            f'<div data-widget="webPrice"><span>{item["price"]} ₽</span><span>{item["old_price"]} ₽</span></div>'
+            + gallery_html(item, 'data-widget="webGallery"')
+            + f'<div data-widget="webProductDescription">{html.escape(item["description"])}</div>'
+            f'<div data-widget="webCharacteristics"><dl>{characteristics}</dl></div>')
+
+
+def ozon_product_id(path: str) -> int:
+    match = re.search(r'(\d+)/?$', path.rstrip('/'))
+    return int(match.group(1)) if match else 0
+
+
+@app.route('/ozon/product/<slug>/')
+def ozon_product(slug):
+    blocked = captcha_redirect('ozon')
+    if blocked:
+        return blocked
+    item = product('ozon', ozon_product_id(slug))
+    return render_page('ozon', item, ozon_body(item), '__INITIAL_STATE__', ozon_state(item))
+
+
+@app.route('/ozon/api/entrypoint-api.bx/page/json/v2')
+def ozon_page_api():
+    if state.enabled('captcha'):
+        return Response('Forbidden', status=403)
+    if state.enabled('missing_state'):
+        return Response('Not Found', status=404)
+    item = product('ozon', ozon_product_id(urlsplit(request.args.get('url', '')).path))
+    data = {'widgetStates': ozon_widgets(item),
+            'seo': {'script': [{'innerHTML': json.dumps(json_ld(item), ensure_ascii=False)}]}}
+    return jsonify(data)
+
+
+# ---------- Яндекс Маркет ----------
+
+def ym_state(item: dict) -> dict:
+    return {'product': {
+        'title': item['title'],
+        'name': item['title'],
+        'price': state_price(item['price']),
+        'oldPrice': state_price(item['old_price']),
+        'description': item['description'],
+        'category': item['category'],
+        'images': item['images'],
+        'characteristics': [{'name': k, 'value': v} for k, v in item['characteristics'].items()],
+    }}
+
+
+def ym_specs(item: dict) -> str:
+    return ''.join(f'<dt>{html.escape(k)}</dt><dd>{html.escape(v)}</dd>' for k, v in item['characteristics'].items())
+
+
+def ym_body(item: dict) -> str:
+    return (f'<div data-zone-name="productTitle"><h1 data-auto="product-title">{html.escape(item["title"])}</h1></div>'
+            f'<div data-zone-name="price"><span data-auto="price">{item["price"]} ₽</span>'
+            f'<span data-auto="old-price">{item["old_price"]} ₽</span></div>'
+            + gallery_html(item, 'data-zone-name="productGallery"')
+            + f'<div data-zone-name="productDescription">{html.escape(item["description"])}</div>'
+            f'<div data-zone-name="productSpecifications"><dl>{ym_specs(item)}</dl></div>'
+            f'<div data-auto="stock-status">В наличии</div>')
+
+
+@app.route('/ym/product--<slug>/<int:product_id>')
+@app.route('/ym/product/<int:product_id>')
+@app.route('/ym/card/<slug>/<int:product_id>')
+def ym_product(product_id, slug=''):
+    blocked = captcha_redirect('ym')
+    if blocked:
+        return blocked
+    item = product('ym', product_id)
+    return render_page('ym', item, ym_body(item), '__INITIAL_DATA__', ym_state(item))
+
+
+@app.route('/ym/product--<slug>/<int:product_id>/spec')
+@app.route('/ym/card/<slug>/<int:product_id>/spec')
+def ym_spec(product_id, slug=''):
+    blocked = captcha_redirect('ym')
+    if blocked:
+        return blocked
+    item = product('ym', product_id)
+    body = f'<h1>{html.escape(item["title"])}</h1><div data-auto="product-full-specs"><dl>{ym_specs(item)}</dl></div>'
+    return Response(f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Характеристики</title></head>"
+                    f"<body>{body}</body></html>", mimetype='text/html')
+
+
+# ---------- Общие маршруты ----------
+
+@app.route('/<marketplace>/__xhr/<int:product_id>')
+def slow_xhr(marketplace, product_id):
+    """Данные товара для поведения slow_xhr: отдаются с задержкой"""
+    if marketplace not in MARKETPLACE_NAMES:
+        return Response('Not Found', status=404)
+    time.sleep(state.snapshot()['xhr_delay'])
+    item = product(marketplace, product_id)
+    bodies = {'wb': wb_body, 'ozon': ozon_body, 'ym': ym_body}
+    states = {'wb': (wb_state_var(), wb_state(item)), 'ozon': ('__INITIAL_STATE__', ozon_state(item)),
+              'ym': ('__INITIAL_DATA__', ym_state(item))}
+    missing = state.enabled('missing_state')
+    state_var, page_state = states[marketplace]
+    return jsonify({
+        'html': bodies[marketplace](item),
+        'state_var': None if missing else state_var,
+        'state': None if missing else page_state,
+        'json_ld': None if missing else json_ld(item),
+    })
+
+
+@app.route('/<marketplace>/')
+def home(marketplace):
+    """Главная страница маркетплейса (ее открывает прогрев парсеров)"""
+    if marketplace not in MARKETPLACE_NAMES:
+        return Response('Not found', status=404)
+    return Response(f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{MARKETPLACE_NAMES[marketplace]}</title>"
+                    f"</head><body><h1>{MARKETPLACE_NAMES[marketplace]}</h1></body></html>", mimetype='text/html')
+
+
+@app.route('/<marketplace>/img/<int:product_id>/<int:number>.gif')
+def image(marketplace, product_id, number):
+    return Response(PIXEL_GIF, mimetype='image/gif')
+
+
+@app.route('/<marketplace>/showcaptcha')
+def captcha_page(marketplace):
+    return Response("<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Вы не робот?</title></head>"
+                    "<body><form action=\"/showcaptcha/check\" class=\"CheckboxCaptcha\">"
+                    "<h1>Подтвердите, что вы не робот</h1></form></body></html>",
+                    mimetype='text/html')
+
+
+@app.route('/__mock/behaviours', methods=['GET', 'POST'])
+def behaviours():
+    """GET - текущие поведения; POST {"behaviours": [...], "xhr_delay": 3} - переключить"""
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        try:
+            state.update(payload.get('behaviours'), payload.get('xhr_delay'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'data': state.snapshot(), 'available': list(BEHAVIOURS)})
+
+
+def host_map_for(base_url: str) -> str:
+    """Значение PARSER_HOST_MAP для этого сервера"""
+    return ','.join([
+        f"wildberries.ru={base_url}/wb",
+        f"wb.ru={base_url}/wb",
+        f"ozon.ru={base_url}/ozon",
+        f"market.yandex.ru={base_url}/ym",
+    ])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Локальный mock-сервер маркетплейсов")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8099)
+    arg_parser.add_argument('--behaviour', action='append', default=[], choices=BEHAVIOURS,
+                            help="Включить поведение (можно несколько раз)")
+    arg_parser.add_argument('--xhr-delay', type=float, default=3.0, help="Задержка XHR для slow_xhr, секунд")
+    args = arg_parser.parse_args()
+
+    state.update(args.behaviour, args.xhr_delay)
+    base_url = f"http://{args.host}:{args.port}"
+    print(f"🧪 Mock-маркетплейсы на {base_url} (поведения: {', '.join(args.behaviour) or 'нет'})")
+    print(f"   export PARSER_HOST_MAP={host_map_for(base_url)}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
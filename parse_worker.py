@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Воркер парсинга: забирает задачи из общей очереди и возвращает результаты.
+
+Запускается в любом количестве процессов на той же машине, что и API сервер,
+с общим файлом очереди (PARSE_QUEUE_DB на локальном диске, см. parsers/job_queue.py).
+API сервер в режиме очереди кладет задачи в ту же БД и ждет результатов.
+
+Пример:
+    PARSE_QUEUE_DB=data/parse_queue.db python parse_worker.py --concurrency 2
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from parsers import get_parser, get_marketplace
+from parsers.errors import ProductNotFoundError
+from parsers.job_queue import JobQueue
+from parsers.profiles import get_profile
+
+
+def _heartbeat(queue: JobQueue, job_id: int, owner: str, stop: threading.Event) -> None:
+    """Продлевает аренду, пока идет парсинг"""
+    interval = max(5, queue.visibility_timeout / 3)
+    while not stop.wait(interval):
+        if not queue.extend(job_id, owner):
+            print(f"⚠️ Worker {owner}: аренда задачи {job_id} потеряна")
+            return
+
+
+def run_worker(queue: JobQueue, owner: str, stop: threading.Event, idle_sleep: float = 1.0) -> None:
+    print(f"👷 Worker {owner} запущен, очередь: {queue.path}")
+    while not stop.is_set():
+        job = queue.lease(owner)
+        if job is None:
+            stop.wait(idle_sleep)
+            continue
+
+        job_id, url = job['id'], job['url']
+        print(f"📥 Worker {owner}: задача {job_id} (попытка {job['attempts']}/{job['max_attempts']}): {url}")
+        start_time = time.time()
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(queue, job_id, owner, heartbeat_stop), daemon=True)
+        heartbeat.start()
+        try:
+            if not get_marketplace(url):
+                queue.fail(job_id, owner, f"Неподдерживаемый маркетплейс: {url}", retryable=False)
+                continue
+            options = job['options']
+            parser = get_parser(url, hedge=options.get('hedge'))
+            if options.get('profile'):
+                parser.profile = get_profile(options['profile'], parser.marketplace)
+            if options.get('variants') and hasattr(parser, 'include_variants'):
+                parser.include_variants = True
+            product_data = parser.parse()
+            if queue.complete(job_id, owner, product_data):
+                print(f"✅ Worker {owner}: задача {job_id} готова за {time.time() - start_time:.2f}s")
+            else:
+                print(f"⚠️ Worker {owner}: результат задачи {job_id} отброшен (аренда перехвачена)")
+        except Exception as e:
+            # Товара нет - повтор задачи ничего не изменит
+            status = queue.fail(job_id, owner, str(e), retryable=not isinstance(e, ProductNotFoundError))
+            print(f"❌ Worker {owner}: задача {job_id} -> {status or 'lost'}: {e}")
+        finally:
+            heartbeat_stop.set()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Воркер парсинга из общей очереди задач")
+    arg_parser.add_argument('--queue', default=os.environ.get('PARSE_QUEUE_DB', 'data/parse_queue.db'),
+                            help="Путь к SQLite БД очереди")
+    arg_parser.add_argument('--concurrency', type=int, default=1, help="Параллельных задач на этом узле")
+    arg_parser.add_argument('--visibility-timeout', type=int, default=120, help="Время аренды задачи, секунд")
+    args = arg_parser.parse_args()
+
+    queue = JobQueue(args.queue, visibility_timeout=args.visibility_timeout)
+    node = f"{socket.gethostname()}-{os.getpid()}"
+    stop = threading.Event()
+    threads = []
+    for i in range(max(1, args.concurrency)):
+        owner = f"{node}-{i}-{uuid.uuid4().hex[:6]}"
+        thread = threading.Thread(target=run_worker, args=(queue, owner, stop), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Остановка воркеров (текущие задачи вернутся в очередь по таймауту аренды)...")
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,53 @@
-import os
-from .wildberries import WildberriesParser
-from .ozon import OzonParser
-from .yandex_market import YandexMarketParser
-
-# Упрощенные версии парсеров (опционально, можно переключиться)
-try:
-    from .wildberries_simple import WildberriesParserSimple
-    from .ozon_simple import OzonParserSimple
-    from .yandex_market_simple import YandexMarketParserSimple
-    # Переключите на True для использования упрощенных версий
-    # Можно также установить через переменную окружения: export USE_SIMPLE_PARSERS=true
-    # Упрощенные парсеры могут работать лучше, если полные не справляются
-    USE_SIMPLE_PARSERS = os.environ.get('USE_SIMPLE_PARSERS', 'false').lower() == 'true'
-except ImportError:
-    USE_SIMPLE_PARSERS = False
+from dotenv import load_dotenv
+
+# .env читается до импорта модулей пакета: часть настроек они читают при импорте
+load_dotenv()
+
+from .selection import create_parser, parser_class, IMPLEMENTATIONS, IMPLEMENTATION_FULL
+from .static import StaticFirstParser, static_first_marketplaces
+from .hedging import create_hedged_parser, hedged_marketplaces
+from .retry import RetryingParser, retry_attempts
+from .urls import canonicalize, marketplace_for_url
+
+# Классы парсеров загружаются лениво: импорт пакета не импортирует Playwright
+_PARSER_CLASSES = {
+    'WildberriesParser': 'wb',
+    'OzonParser': 'ozon',
+    'YandexMarketParser': 'ym',
+}
+
+
+def __getattr__(name: str):
+    if name in _PARSER_CLASSES:
+        return parser_class(_PARSER_CLASSES[name], IMPLEMENTATION_FULL)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_marketplace(url: str) -> str:
-    """Определяет маркетплейс по URL"""
-    if "wildberries.ru" in url:
-        return "wb"
-    elif "ozon.ru" in url:
-        return "ozon"
-    elif "market.yandex.ru" in url:
-        return "ym"
-    else:
-        return None
-
-def get_parser(url: str):
-    """Возвращает соответствующий парсер для URL"""
-    marketplace = get_marketplace(url)
-    
-    if USE_SIMPLE_PARSERS:
-        # Используем упрощенные версии
-        if marketplace == "wb":
-            return WildberriesParserSimple(url)
-        elif marketplace == "ozon":
-            return OzonParserSimple(url)
-        elif marketplace == "ym":
-            return YandexMarketParserSimple(url)
-    else:
-        # Используем полные версии с retry и fallback
-        if marketplace == "wb":
-            return WildberriesParser(url)
-        elif marketplace == "ozon":
-            return OzonParser(url)
-        elif marketplace == "ym":
-            return YandexMarketParser(url)
-    
-    raise ValueError(f"Неподдерживаемый маркетплейс: {url}")
+    """Определяет маркетплейс по хосту URL (см. urls.py)"""
+    return marketplace_for_url(url)
+
+def get_parser(url: str, implementation: str = None, hedge: bool = None):
+    """
+    Возвращает парсер для URL. Реализация (полная или упрощенная) выбирается
+    по живой статистике маркетплейса, если не указана явно или не закреплена
+    через PARSER_OVERRIDE / USE_SIMPLE_PARSERS (см. selection.py).
+    hedge - страховочный запуск второй реализации (по умолчанию HEDGED_PARSING, см. hedging.py)
+    """
+    identity = canonicalize(url)
+    marketplace = identity.marketplace
+    if marketplace not in IMPLEMENTATIONS:
+        raise ValueError(f"Неподдерживаемый маркетплейс: {url}")
+
+    parser = create_parser(marketplace, identity.canonical_url, implementation, identity=identity)
+    if hedge is None:
+        hedge = marketplace in hedged_marketplaces()
+    if hedge:
+        parser = create_hedged_parser(parser) or parser
+    # STATIC_FIRST: сначала страница без JavaScript, полный рендер - только при нехватке полей
+    if marketplace in static_first_marketplaces():
+        parser = StaticFirstParser(parser)
+    # PARSE_RETRIES: повторы по классам отказов со сменой отпечатка в пределах срока (см. retry.py)
+    if retry_attempts() > 0:
+        parser = RetryingParser(parser)
+    return parser
@@ -0,0 +1,91 @@
+"""
+Быстрый детектор капчи и антибот-заглушек для всех парсеров.
+
+Использует только дешевые сигналы: статус основного документа, URL,
+заголовок страницы, несколько селекторов (один page.evaluate) и URL фреймов.
+Не сериализует DOM (page.content()) и не ждет загрузки ресурсов.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Optional
+
+from .errors import CaptchaDetectedError
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+
+# Статусы основного документа: 403/429 - блокировка, 498 - антибот Wildberries
+BLOCK_STATUSES = (403, 429, 498)
+
+URL_MARKERS = ('captcha', 'challenge', 'showcaptcha', 'antibot', '/abt/')
+
+TITLE_MARKERS = (
+    'подтвердите, что вы не робот',
+    'вы не робот',
+    'доступ ограничен',
+    'почти готово',
+    'проверка браузера',
+    'access denied',
+    'attention required',
+    'just a moment',
+)
+
+CHALLENGE_SELECTORS = (
+    'iframe[src*="captcha"]',
+    'form[action*="captcha"]',
+    'form[action*="showcaptcha"]',
+    '#challenge-form',
+    '#js-challenge',
+    '.CheckboxCaptcha',
+    '.AdvancedCaptcha',
+    '.SmartCaptcha',
+    '[data-testid="checkbox-captcha"]',
+)
+
+FRAME_MARKERS = ('smartcaptcha', 'captcha', 'challenges.cloudflare.com', 'hcaptcha.com', 'recaptcha')
+
+_PROBE_SCRIPT = """
+    (selectors) => {
+        const hit = selectors.find(s => document.querySelector(s));
+        return { title: document.title || '', selector: hit || null };
+    }
+"""
+
+
+def detect_challenge(page: Page, response: Any = None) -> Optional[str]:
+    """Возвращает описание найденного сигнала капчи или None"""
+    status = getattr(response, 'status', None)
+    if status in BLOCK_STATUSES:
+        return f"HTTP {status}"
+
+    url = (page.url or '').lower()
+    for marker in URL_MARKERS:
+        if marker in url:
+            return f"url:{marker}"
+
+    for frame in page.frames[1:]:
+        frame_url = (frame.url or '').lower()
+        for marker in FRAME_MARKERS:
+            if marker in frame_url:
+                return f"frame:{marker}"
+
+    try:
+        probe = page.evaluate(_PROBE_SCRIPT, list(CHALLENGE_SELECTORS))
+    except Exception:
+        # Страница в процессе навигации (например, редирект антибота) - проверяем только то, что уже есть
+        return None
+    title = (probe.get('title') or '').lower()
+    for marker in TITLE_MARKERS:
+        if marker in title:
+            return f"title:{marker}"
+    if probe.get('selector'):
+        return f"selector:{probe['selector']}"
+    return None
+
+
+def ensure_no_challenge(page: Page, response: Any, marketplace: str) -> None:
+    """Бросает CaptchaDetectedError, если страница оказалась капчей"""
+    signal = detect_challenge(page, response)
+    if signal:
+        print(f"⚠️ {marketplace}: Обнаружена капча ({signal})")
+        raise CaptchaDetectedError(marketplace, signal)
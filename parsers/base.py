@@ -1,24 +1,105 @@
+from __future__ import annotations
+
 import os
 import json
 import re
 import time
 import random
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, Tuple
-from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, Browser, Page, TimeoutError as PlaywrightTimeoutError
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple, List, Callable
+from .record import ProductRecord
+from .antibot import ensure_no_challenge
+from .errors import ParseCancelledError, ProductNotFoundError
+from .strategies import strategy_stats
+from .profiles import get_profile
+from .urls import ProductIdentity, canonicalize, map_host
+from .har import HarArchive, har_mode, har_path
+from .browsers import BrowserLease, browser_watchdog
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Browser, Page
+
+# Группы полей товара для прогрессивной отдачи (/api/parse/stream); первое поле группы - признак, что она получена
+PROGRESS_GROUPS = {
+    'identity': ('title', 'category'),
+    'price': ('price', 'old_price', 'in_stock'),
+    'images': ('images',),
+    'description': ('description',),
+    'characteristics': ('characteristics',),
+}
+# Служебная группа прогресса: группы, полученные до нее, недействительны (повтор после отказа, см. retry.py)
+PROGRESS_RESET = 'reset'
+
+
+def blocking_route_handler(blocked: Tuple[str, ...]) -> Callable[[Any], None]:
+    """
+    Обработчик маршрутов, обрывающий запросы ресурсов типов blocked. Остальные
+    передаются следующему обработчику (fallback, а не continue_): при воспроизведении
+    это route_from_har - continue_ отправил бы запрос в сеть мимо архива
+    """
+    def handle(route: Any) -> None:
+        if route.request.resource_type in blocked:
+            route.abort()
+        else:
+            route.fallback()
+    return handle
+
+
+def launch_browser(marker_args: List[str]) -> Tuple[Any, Browser]:
+    """Запускает Playwright и Chromium (marker_args - метка аренды для учета процессов, см. browsers.py)"""
+    # Playwright импортируется только при первом запуске браузера (импорт пакета остается быстрым)
+    from playwright.sync_api import sync_playwright
+    playwright = sync_playwright().start()
+    # headless можно отключить через переменную окружения для отладки
+    # По умолчанию headless=True для продакшена, но можно включить headful для обхода защиты
+    headless_mode = os.environ.get('PLAYWRIGHT_HEADLESS', 'true').lower() == 'true'
+    try:
+        browser = playwright.chromium.launch(
+            headless=headless_mode,
+            args=[
+                '--no-sandbox',
+                '--disable-setuid-sandbox',
+                '--disable-dev-shm-usage',
+                '--disable-accelerated-2d-canvas',
+                '--disable-gpu',
+                '--disable-blink-features=AutomationControlled',  # Скрываем автоматизацию
+                *marker_args,
+            ]
+        )
+    except BaseException:
+        playwright.stop()
+        raise
+    return playwright, browser
 
-load_dotenv()
 
 class MarketplaceParserInterface(ABC):
-    def __init__(self, url: str):
-        self.url = url
+    # Код маркетплейса ('wb', 'ozon', 'ym') и название для сообщений
+    marketplace = ""
+    marketplace_name = ""
+    # threading.Event: при установке парсинг прерывается на ближайшей паузе или стратегии
+    cancel_event = None
+    # time.time(), к которому результат нужен вызывающему: в него укладываются повторы (retry.py)
+    deadline = None
+    # callable(group, fields, strategy): вызывается, когда группа полей товара получена (см. PROGRESS_GROUPS)
+    progress = None
+    # Архив, из которого в режиме PARSER_HAR_MODE=replay отвечаются запросы request-клиента
+    _har_archive = None
+    # URL запросов, ответ на которые при воспроизведении HAR пришел из сети (должен быть пуст)
+    replay_leaks = None
+
+    def __init__(self, url: str, identity: ProductIdentity = None):
+        # Идентичность товара; get_parser передает уже вычисленную (без повторного раскрытия ссылки)
+        self.identity = identity or canonicalize(url)
+        # Канонический URL: основной домен маркетплейса, без параметров (короткие ссылки раскрыты)
+        self.url = self.identity.canonical_url
         self.timeout = 30000  # 30 секунд таймаут по умолчанию
+        # Профиль браузера (desktop/mobile), по умолчанию из PARSER_PROFILE
+        self.profile = get_profile(marketplace=self.marketplace)
 
     @abstractmethod
-    def parse(self) -> Dict[str, Any]:
+    def parse(self) -> ProductRecord:
         """
-        Должен возвращать объект:
+        Должен возвращать ProductRecord с полями:
         {
           "title": "",
           "price": 0,
@@ -33,32 +114,43 @@ class MarketplaceParserInterface(ABC):
         """
         pass
 
-    def _get_browser_page(self) -> Tuple[Any, Browser, Page]:
-        """Создает браузер и страницу через Playwright. Возвращает (playwright, browser, page)"""
-        playwright = sync_playwright().start()
-        # headless можно отключить через переменную окружения для отладки
-        # По умолчанию headless=True для продакшена, но можно включить headful для обхода защиты
-        headless_mode = os.environ.get('PLAYWRIGHT_HEADLESS', 'true').lower() == 'true'
-        browser = playwright.chromium.launch(
-            headless=headless_mode,
-            args=[
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--disable-gpu',
-                '--disable-blink-features=AutomationControlled',  # Скрываем автоматизацию
-            ]
-        )
+    def _launch_browser(self, marker_args: List[str]) -> Tuple[Any, Browser]:
+        """Запуск браузера для аренды (см. browsers.py)"""
+        return launch_browser(marker_args)
+
+    def _get_browser_page(self, java_script_enabled: bool = True,
+                          blocked_resources: Optional[Tuple[str, ...]] = None) -> Tuple[Any, Browser, Page]:
+        """Создает контекст и страницу в браузере потока (см. browsers.py). Возвращает (playwright, browser, page)"""
+        lease = browser_watchdog.acquire(self._launch_browser)
+        try:
+            page = self._new_context_page(lease, java_script_enabled, blocked_resources)
+        except BaseException:
+            # Ошибка до возврата страницы: в finally парсера браузер еще не попадет
+            self._close_browser(lease.playwright, lease.browser)
+            raise
+        return lease.playwright, lease.browser, page
+
+    def _new_context_page(self, lease: BrowserLease, java_script_enabled: bool,
+                          blocked_resources: Optional[Tuple[str, ...]]) -> Page:
+        browser = lease.browser
+        # PARSER_HAR_MODE: запись трафика в HAR или воспроизведение из него без сети (см. har.py)
+        mode = har_mode()
+        har_file = har_path(self.url, self.profile.name, java_script_enabled) if mode else None
+        har_options = {}
+        if mode == 'record':
+            os.makedirs(os.path.dirname(os.path.abspath(har_file)), exist_ok=True)
+            har_options = {'record_har_path': har_file, 'record_har_mode': 'full'}
+        elif mode == 'replay' and not os.path.exists(har_file):
+            raise ValueError(f"Нет HAR-архива для {self.url}: {har_file}. Запишите его: PARSER_HAR_MODE=record")
         context = browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36',
-            locale='ru-RU',
+            **self.profile.context_options(),
+            **har_options,
+            java_script_enabled=java_script_enabled,
             timezone_id='Europe/Moscow',
             # Добавляем дополнительные заголовки для обхода капчи
             extra_http_headers={
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+                'Accept-Language': self.profile.accept_language,
                 'Accept-Encoding': 'gzip, deflate, br',
                 'DNT': '1',
                 'Connection': 'keep-alive',
@@ -69,9 +161,21 @@ class MarketplaceParserInterface(ABC):
                 'Cache-Control': 'max-age=0',
             }
         )
-        # Скрываем автоматизацию - расширенная версия
-        page = context.new_page()
-        page.add_init_script("""
+        if mode == 'replay':
+            context.route_from_har(har_file, not_found='abort')
+            self._har_archive = HarArchive(har_file)
+            if self.replay_leaks is None:
+                self.replay_leaks = []
+            context.on('response', self._check_replay_response)
+        # Легкие профили не грузят картинки, шрифты и видео (ссылки на них остаются в DOM)
+        blocked = self.profile.blocked_resources if blocked_resources is None else blocked_resources
+        if blocked:
+            context.route("**/*", blocking_route_handler(blocked))
+        # Счетчик страниц браузера - порог его пересоздания
+        context.on('page', lease.count_page)
+        # Скрываем автоматизацию - расширенная версия; скрипт контекста действует во всех
+        # его вкладках (в том числе во второй вкладке /spec Яндекс Маркета)
+        context.add_init_script("""
             // Скрываем webdriver
             Object.defineProperty(navigator, 'webdriver', {
                 get: () => undefined
@@ -83,7 +187,7 @@ class MarketplaceParserInterface(ABC):
             });
             
             Object.defineProperty(navigator, 'languages', {
-                get: () => ['ru-RU', 'ru', 'en-US', 'en']
+                get: () => __LANGUAGES__
             });
             
             // Скрываем автоматизацию в window
@@ -105,17 +209,80 @@ class MarketplaceParserInterface(ABC):
                     Promise.resolve({ state: Notification.permission }) :
                     originalQuery(parameters)
             );
-        """)
-        return playwright, browser, page
+        """.replace("__LANGUAGES__", json.dumps(list(self.profile.languages))))
+        return context.new_page()
+
+    def _close_browser(self, playwright: Any, browser: Optional[Browser]) -> None:
+        """
+        Закрывает контексты парсинга и возвращает браузер сторожу: он закрывает браузер
+        или оставляет его потоку (BROWSER_REUSE). Контексты закрываются явно - только так
+        записанный HAR сохраняется
+        """
+        try:
+            if browser:
+                for context in browser.contexts:
+                    try:
+                        context.close()
+                    except Exception:
+                        pass
+        finally:
+            browser_watchdog.release(playwright, browser)
+            if self._har_archive is not None:
+                self._har_archive.close()
+                self._har_archive = None
+
+    def _check_replay_response(self, response: Any) -> None:
+        """Ответ из архива подставлен маршрутом и адреса сервера не имеет; с адресом - запрос ушел в сеть"""
+        try:
+            server_addr = response.server_addr()
+        except Exception:
+            return
+        if server_addr:
+            print(f"⚠️ HAR: Запрос ушел в сеть при воспроизведении: {response.url}")
+            self.replay_leaks.append(response.url)
+
+    def _api_get(self, page: Page, url: str) -> Any:
+        """GET через request-клиент контекста (общие cookies); при воспроизведении HAR - из архива"""
+        url = map_host(url)
+        if self._har_archive is not None:
+            return self._har_archive.response_for('GET', url)
+        return page.context.request.get(url, headers={'Accept': 'application/json'}, timeout=self.timeout)
+
+    def _open_product_page(self, page: Page, url: str, wait_until: str = 'networkidle') -> Any:
+        """
+        Открывает страницу и сразу проверяет ее на капчу (до любых ожиданий и fallback-ов).
+        Навигация ждет только DOM: страница капчи часто не доходит до networkidle, и
+        ожидание заняло бы весь таймаут. Затем - состояние загрузки wait_until и
+        повторная проверка (капча, отрисованная скриптом после DOMContentLoaded)
+        """
+        url = self._page_url(url)
+        goto_until = 'commit' if wait_until == 'commit' else 'domcontentloaded'
+        response = page.goto(url, wait_until=goto_until, timeout=self.timeout)
+        self._check_challenge(page, response)
+        if response is not None and response.status in (404, 410):
+            raise ProductNotFoundError(self.marketplace_name)
+        if wait_until != goto_until:
+            page.wait_for_load_state(wait_until, timeout=self.timeout)
+            self._check_challenge(page, response)
+        return response
+
+    def _page_url(self, url: str) -> str:
+        """Адрес для браузера: домен профиля (мобильная версия) и подмена хоста из PARSER_HOST_MAP"""
+        return map_host(self.profile.rewrite_url(url))
+
+    def _check_challenge(self, page: Page, response: Any = None) -> None:
+        """Бросает CaptchaDetectedError, если вместо товара открылась капча"""
+        ensure_no_challenge(page, response, self.marketplace_name)
 
     def _wait_for_page_load(self, page: Page, timeout: int = None) -> None:
         """Ожидает полной загрузки страницы и выполнения JS"""
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
         timeout = timeout or self.timeout
         try:
             # Ждем загрузки DOM
             page.wait_for_load_state('domcontentloaded', timeout=timeout)
             # Случайная задержка 3-5 секунд для обхода защиты
-            time.sleep(random.uniform(3, 5))
+            self._sleep(random.uniform(3, 5))
             # Ждем загрузки всех ресурсов (networkidle)
             try:
                 page.wait_for_load_state('networkidle', timeout=15000)
@@ -123,11 +290,75 @@ class MarketplaceParserInterface(ABC):
                 # Если не удалось дождаться networkidle, продолжаем
                 pass
             # Дополнительная задержка для полной загрузки JS
-            time.sleep(random.uniform(1, 2))
+            self._sleep(random.uniform(1, 2))
         except PlaywrightTimeoutError:
             # Если не удалось дождаться, продолжаем с domcontentloaded
             pass
 
+    def _sleep(self, seconds: float) -> None:
+        """Пауза, которую можно прервать через cancel_event"""
+        if self.cancel_event is None:
+            time.sleep(seconds)
+        elif self.cancel_event.wait(seconds):
+            raise ParseCancelledError(self.marketplace_name)
+
+    def _check_cancelled(self) -> None:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ParseCancelledError(self.marketplace_name)
+
+    def _run_strategies(self, page: Page, stage: str, strategies: List[Tuple[str, Callable[[Page], Any]]],
+                        is_valid: Callable[[Any], bool],
+                        fallbacks: List[Tuple[str, Callable[[Page], Any]]] = ()) -> Tuple[Any, Optional[str]]:
+        """
+        Пробует стратегии извлечения в порядке, выученном по прошлым попыткам
+        (strategies задает исходный порядок), затем fallbacks - всегда в заданном порядке.
+        Fallbacks (разбор DOM) быстрые, но дают только часть полей: в общем рейтинге p / t
+        они обогнали бы JSON-стратегии и результат навсегда потерял бы характеристики и картинки.
+        Возвращает (данные, имя стратегии)
+        """
+        stage = self._strategy_stage(stage)
+        by_name = dict(strategies)
+        by_name.update(fallbacks)
+        learned = strategy_stats.order(self.marketplace, stage, [name for name, _ in strategies])
+        for name in learned + [name for name, _ in fallbacks]:
+            self._check_cancelled()
+            start = time.time()
+            try:
+                data = by_name[name](page)
+            except Exception as e:
+                print(f"⚠️ {self.marketplace_name}: Стратегия {name} упала: {e}")
+                data = None
+            ok = bool(data) and is_valid(data)
+            strategy_stats.record(self.marketplace, stage, name, ok, time.time() - start)
+            if ok:
+                print(f"✅ {self.marketplace_name}: Данные получены стратегией {name}")
+                return data, name
+        return None, None
+
+    def _record_strategy_fields(self, stage: str, name: Optional[str], **fields: Any) -> None:
+        """Отмечает, какие поля товара дала стратегия (до DOM-дозаполнения)"""
+        if name:
+            strategy_stats.record_fields(self.marketplace, self._strategy_stage(stage), name, fields)
+
+    def _report_progress(self, strategy: Optional[str], **fields: Any) -> None:
+        """
+        Сообщает подписчику progress группы полей, которые уже получены (первое поле группы не пустое).
+        Повторный вызов после DOM-дозаполнения сообщает группы заново - дубли отсекает подписчик
+        """
+        if self.progress is None:
+            return
+        for group, names in PROGRESS_GROUPS.items():
+            if not fields.get(names[0]):
+                continue
+            try:
+                self.progress(group, {name: fields[name] for name in names if name in fields}, strategy)
+            except Exception as e:
+                print(f"⚠️ {self.marketplace_name}: Подписчик прогресса упал: {e}")
+
+    def _strategy_stage(self, stage: str) -> str:
+        """Мобильные страницы устроены иначе - порядок стратегий для них учится отдельно"""
+        return stage if self.profile.name == 'desktop' else f"{stage}:{self.profile.name}"
+
     def _extract_from_window_object(self, page: Page, object_path: str) -> Any:
         """Извлекает данные из window объекта на странице"""
         try:
@@ -141,3 +372,57 @@ class MarketplaceParserInterface(ABC):
             return page.evaluate(script)
         except Exception:
             return default
+
+
+class ParserWrapper(MarketplaceParserInterface):
+    """
+    Базовый класс для парсеров-оберток (статический режим, выбор реализации и т.п.).
+    Профиль и флаг вариантов читаются и задаются у обернутого парсера.
+    """
+
+    def __init__(self, parser: MarketplaceParserInterface):
+        self.parser = parser
+        self.marketplace = parser.marketplace
+        self.marketplace_name = parser.marketplace_name
+        self.identity = parser.identity
+        self.url = parser.url
+        self.timeout = parser.timeout
+
+    @property
+    def profile(self):
+        return self.parser.profile
+
+    @profile.setter
+    def profile(self, value) -> None:
+        self.parser.profile = value
+
+    @property
+    def cancel_event(self):
+        return self.parser.cancel_event
+
+    @cancel_event.setter
+    def cancel_event(self, value) -> None:
+        self.parser.cancel_event = value
+
+    @property
+    def progress(self):
+        return self.parser.progress
+
+    @progress.setter
+    def progress(self, value) -> None:
+        self.parser.progress = value
+
+    @property
+    def include_variants(self) -> bool:
+        return getattr(self.parser, 'include_variants', False)
+
+    @include_variants.setter
+    def include_variants(self, value: bool) -> None:
+        self.parser.include_variants = value
+
+    @staticmethod
+    def innermost(parser: MarketplaceParserInterface) -> MarketplaceParserInterface:
+        """Конкретный парсер маркетплейса под всеми обертками"""
+        while isinstance(parser, ParserWrapper):
+            parser = parser.parser
+        return parser
@@ -0,0 +1,365 @@
+"""
+Учет браузеров Chromium: память, переиспользование и уборка сирот.
+
+Каждый запуск браузера - аренда (BrowserLease). В командную строку Chromium
+добавляется метка --parser-browser=<pid сервера>-<id аренды>, по ней дерево
+процессов браузера (сам браузер, рендереры, GPU) находится в /proc.
+
+BROWSER_REUSE=true - поток держит свой браузер между парсингами (sync API
+Playwright привязан к потоку), каждому парсингу - новый контекст. Между
+арендами браузер пересоздается, если RSS его дерева процессов больше
+BROWSER_MAX_RSS_MB или в нем открыто больше BROWSER_MAX_PAGES страниц.
+Имеет смысл для долгоживущих потоков (parse_worker.py, import_products.py);
+без переиспользования браузер закрывается после каждого парсинга.
+
+Сторож (раз в BROWSER_WATCHDOG_INTERVAL секунд) обновляет память браузеров
+и убивает сирот: деревья Chromium этого процесса без живой аренды, браузеры
+завершившихся потоков и браузеры с меткой уже несуществующего процесса
+(остались после kill или перезапуска сервера).
+Работает по /proc (Linux); на других ОС учет памяти и уборка сирот отключены.
+"""
+import atexit
+import os
+import signal
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MARKER_ARG = '--parser-browser='
+DEFAULT_MAX_RSS_MB = 1024
+DEFAULT_MAX_PAGES = 50
+DEFAULT_WATCHDOG_INTERVAL = 30
+# Сколько ждать завершения после SIGTERM перед SIGKILL
+KILL_GRACE = 2.0
+
+try:
+    PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+except (AttributeError, ValueError, OSError):
+    PAGE_KB = 4
+
+
+def reuse_enabled() -> bool:
+    return os.environ.get('BROWSER_REUSE', 'false').lower() == 'true'
+
+
+def max_rss_mb() -> float:
+    return float(os.environ.get('BROWSER_MAX_RSS_MB', DEFAULT_MAX_RSS_MB))
+
+
+def max_pages() -> int:
+    return int(os.environ.get('BROWSER_MAX_PAGES', DEFAULT_MAX_PAGES))
+
+
+def read_processes() -> Dict[int, Dict[str, Any]]:
+    """pid -> {ppid, name, cmdline, rss_kb} по /proc (пустой словарь без /proc)"""
+    processes = {}
+    try:
+        pids = [int(pid) for pid in os.listdir('/proc') if pid.isdigit()]
+    except OSError:
+        return processes
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                stat = f.read()
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+            # Имя процесса в скобках может содержать пробелы и скобки
+            fields = stat[stat.rindex(')') + 2:].split()
+            processes[pid] = {
+                'ppid': int(fields[1]),
+                'name': stat[stat.index('(') + 1:stat.rindex(')')],
+                'cmdline': cmdline,
+                'rss_kb': int(fields[21]) * PAGE_KB,
+            }
+        except (OSError, ValueError, IndexError):
+            # Процесс завершился между listdir и чтением
+            continue
+    return processes
+
+
+def browser_trees(processes: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Деревья процессов помеченных браузеров: метка, корень, pid-ы, RSS и процесс драйвера"""
+    children: Dict[int, List[int]] = {}
+    for pid, info in processes.items():
+        children.setdefault(info['ppid'], []).append(pid)
+
+    def marker_of(pid: int) -> Optional[str]:
+        for arg in processes[pid]['cmdline'].split():
+            if arg.startswith(MARKER_ARG):
+                return arg[len(MARKER_ARG):]
+        return None
+
+    trees = []
+    for pid in processes:
+        marker = marker_of(pid)
+        parent = processes[pid]['ppid']
+        if not marker or (parent in processes and marker_of(parent) == marker):
+            continue
+        pids, stack = [], [pid]
+        while stack:
+            current = stack.pop()
+            pids.append(current)
+            stack.extend(children.get(current, []))
+        owner, _, lease_id = marker.partition('-')
+        driver = processes.get(parent)
+        trees.append({
+            'marker': marker,
+            'owner_pid': int(owner) if owner.isdigit() else None,
+            'lease_id': lease_id,
+            'root': pid,
+            'pids': pids,
+            'rss_mb': round(sum(processes[p]['rss_kb'] for p in pids) / 1024, 1),
+            # Драйвер Playwright (node run-driver) - родитель браузера
+            'driver': parent if driver and 'run-driver' in driver['cmdline'] else None,
+        })
+    return trees
+
+
+def kill_processes(pids: List[int]) -> int:
+    """SIGTERM, через KILL_GRACE секунд SIGKILL оставшимся; число завершенных процессов"""
+    alive = []
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            alive.append(pid)
+        except (ProcessLookupError, PermissionError):
+            continue
+    deadline = time.time() + KILL_GRACE
+    while alive and time.time() < deadline:
+        time.sleep(0.1)
+        alive = [pid for pid in alive if os.path.exists(f'/proc/{pid}')]
+    for pid in alive:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    return len(pids)
+
+
+class BrowserLease:
+    """Браузер одного потока: Playwright, Browser и счетчики для решения о пересоздании"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.thread = threading.current_thread()
+        self.playwright = None
+        self.browser = None
+        self.created = time.time()
+        self.leases = 0
+        self.pages = 0
+        self.in_use = False
+        self.rss_mb: Optional[float] = None
+        self.processes = 0
+
+    @property
+    def marker(self) -> str:
+        return f"{MARKER_ARG}{os.getpid()}-{self.id}"
+
+    def count_page(self, _page=None) -> None:
+        self.pages += 1
+
+
+class BrowserWatchdog:
+    """Аренды браузеров, их память по /proc, пересоздание по порогам и уборка сирот"""
+
+    def __init__(self, interval: float = None):
+        self.interval = float(os.environ.get('BROWSER_WATCHDOG_INTERVAL', DEFAULT_WATCHDOG_INTERVAL)) \
+            if interval is None else interval
+        self._lock = threading.Lock()
+        self._leases: Dict[str, BrowserLease] = {}
+        self._local = threading.local()
+        self._thread = None
+        self._stop = threading.Event()
+        self.recycled: Dict[str, int] = {}
+        self.reaped_browsers = 0
+        self.reaped_processes = 0
+
+    def pin_thread(self) -> None:
+        """Текущий поток держит свой браузер между парсингами независимо от BROWSER_REUSE (потоки executor.py)"""
+        self._local.pinned = True
+
+    def close_thread_browser(self) -> None:
+        """Закрывает браузер текущего потока - перед завершением долгоживущего потока"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            self._close(lease)
+
+    def _thread_reuse(self) -> bool:
+        return reuse_enabled() or getattr(self._local, 'pinned', False)
+
+    def acquire(self, launch: Callable[[List[str]], Tuple[Any, Any]]) -> BrowserLease:
+        """Браузер для парсинга: свой браузер потока (BROWSER_REUSE) или новый через launch(args)"""
+        self.start()
+        lease = getattr(self._local, 'lease', None) if self._thread_reuse() else None
+        if lease is not None:
+            reason = self._recycle_reason(lease)
+            if reason:
+                print(f"♻️ Браузер {lease.id}: пересоздание ({reason}, "
+                      f"страниц {lease.pages}, RSS {lease.rss_mb or 0:.0f} МБ)")
+                with self._lock:
+                    self.recycled[reason] = self.recycled.get(reason, 0) + 1
+                self._close(lease)
+                lease = None
+        if lease is None:
+            lease = BrowserLease()
+            # Аренда регистрируется до запуска: процесс с ее меткой не должен выглядеть сиротой
+            with self._lock:
+                self._leases[lease.id] = lease
+            try:
+                lease.playwright, lease.browser = launch([lease.marker])
+            except BaseException:
+                self._forget(lease)
+                raise
+            if self._thread_reuse():
+                self._local.lease = lease
+        lease.in_use = True
+        lease.leases += 1
+        return lease
+
+    def lease_for(self, browser: Any) -> Optional[BrowserLease]:
+        with self._lock:
+            for lease in self._leases.values():
+                if lease.browser is browser:
+                    return lease
+        return None
+
+    def release(self, playwright: Any, browser: Any, keep: bool = True) -> None:
+        """Конец парсинга: браузер остается потоку (BROWSER_REUSE и keep) или закрывается"""
+        lease = self.lease_for(browser) if browser is not None else None
+        if lease is None:
+            _stop_quietly(browser, playwright)
+            return
+        lease.in_use = False
+        if keep and self._thread_reuse() and getattr(self._local, 'lease', None) is lease:
+            return
+        self._close(lease)
+
+    def _recycle_reason(self, lease: BrowserLease) -> str:
+        try:
+            if not lease.browser.is_connected():
+                return 'disconnected'
+        except Exception:
+            return 'disconnected'
+        if lease.pages >= max_pages():
+            return 'pages'
+        for tree in browser_trees(read_processes()):
+            if tree['marker'] == lease.marker[len(MARKER_ARG):]:
+                lease.rss_mb, lease.processes = tree['rss_mb'], len(tree['pids'])
+        if lease.rss_mb is not None and lease.rss_mb > max_rss_mb():
+            return 'rss'
+        return ''
+
+    def _close(self, lease: BrowserLease) -> None:
+        """Закрывает браузер аренды (только из потока-владельца - так требует sync API)"""
+        try:
+            _stop_quietly(lease.browser, lease.playwright)
+        finally:
+            self._forget(lease)
+
+    def _forget(self, lease: BrowserLease) -> None:
+        with self._lock:
+            self._leases.pop(lease.id, None)
+        if getattr(self._local, 'lease', None) is lease:
+            self._local.lease = None
+
+    def check(self) -> None:
+        """Один проход сторожа: память браузеров и уборка сирот"""
+        trees = browser_trees(read_processes())
+        pid = os.getpid()
+        with self._lock:
+            leases = dict(self._leases)
+        orphans = []
+        for tree in trees:
+            lease = leases.get(tree['lease_id']) if tree['owner_pid'] == pid else None
+            if lease is not None:
+                lease.rss_mb, lease.processes = tree['rss_mb'], len(tree['pids'])
+                if lease.thread.is_alive():
+                    continue
+                # Поток завершился, не закрыв браузер: закрыть через sync API уже некому
+                self._forget(lease)
+                orphans.append((tree, f"поток {lease.thread.name} завершен"))
+            elif tree['owner_pid'] == pid:
+                orphans.append((tree, "аренда уже закрыта"))
+            elif tree['owner_pid'] and not os.path.exists(f"/proc/{tree['owner_pid']}"):
+                orphans.append((tree, f"процесс {tree['owner_pid']} завершен"))
+        for tree, reason in orphans:
+            pids = tree['pids'] + ([tree['driver']] if tree['driver'] else [])
+            killed = kill_processes(pids)
+            with self._lock:
+                self.reaped_browsers += 1
+                self.reaped_processes += killed
+            print(f"🧹 Браузер-сирота {tree['marker']}: {reason}, завершено процессов: {killed}, "
+                  f"RSS {tree['rss_mb']:.0f} МБ")
+
+    def shutdown(self) -> None:
+        """Выход процесса: браузеры чужих потоков закрыть через sync API нельзя - завершаем процессы"""
+        self._stop.set()
+        pid = os.getpid()
+        for tree in browser_trees(read_processes()):
+            if tree['owner_pid'] == pid:
+                kill_processes(tree['pids'] + ([tree['driver']] if tree['driver'] else []))
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0 or not os.path.isdir('/proc'):
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='browser-watchdog', daemon=True)
+            self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _run(self) -> None:
+        # Первый проход сразу: сироты прошлого запуска сервера убираются при старте
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ Сторож браузеров: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Метрики: память и счетчики каждого браузера, пересоздания и убранные сироты"""
+        now = time.time()
+        with self._lock:
+            leases = list(self._leases.values())
+            recycled = dict(self.recycled)
+            reaped = {'browsers': self.reaped_browsers, 'processes': self.reaped_processes}
+        browsers = [{
+            'id': lease.id,
+            'thread': lease.thread.name,
+            'in_use': lease.in_use,
+            'leases': lease.leases,
+            'pages': lease.pages,
+            'age_s': round(now - lease.created, 1),
+            'rss_mb': lease.rss_mb,
+            'processes': lease.processes,
+        } for lease in leases]
+        return {
+            'reuse': reuse_enabled(),
+            'max_rss_mb': max_rss_mb(),
+            'max_pages': max_pages(),
+            'browsers': browsers,
+            'total_rss_mb': round(sum(b['rss_mb'] or 0 for b in browsers), 1),
+            'recycled': recycled,
+            'reaped': reaped,
+        }
+
+
+def _stop_quietly(browser: Any, playwright: Any) -> None:
+    """Закрывает браузер и Playwright; ошибка одного не мешает остановке другого"""
+    if browser is not None:
+        try:
+            browser.close()
+        except Exception as e:
+            print(f"⚠️ Не удалось закрыть браузер: {e}")
+    if playwright is not None:
+        try:
+            playwright.stop()
+        except Exception as e:
+            print(f"⚠️ Не удалось остановить Playwright: {e}")
+
+
+browser_watchdog = BrowserWatchdog()
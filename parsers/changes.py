@@ -0,0 +1,185 @@
+"""
+Лента изменений товаров.
+
+Хранит последний известный результат парсинга для каждого товара и пишет
+события изменений (цена, старая цена, наличие, название, набор изображений)
+в append-only лог. Потребители читают лог с offset-курсором.
+
+Снимки тоже журнал (snapshots.jsonl): строка дописывается, только когда
+снимок товара изменился; при старте журнал сжимается, если в нем накопилось
+много устаревших строк.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from .urls import product_key
+
+# Поля, изменения которых превращаются в события
+TRACKED_FIELDS = ("price", "old_price", "in_stock", "title", "images")
+
+# Сколько лишних строк журнала снимков терпим до сжатия при старте
+SNAPSHOT_COMPACT_SLACK = 1000
+
+EVENT_TYPES = {
+    "price": "price_changed",
+    "old_price": "old_price_changed",
+    "in_stock": "stock_changed",
+    "title": "title_changed",
+    "images": "images_changed",
+}
+
+def _snapshot(product_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": product_data.get("title", ""),
+        "price": product_data.get("price", 0) or 0,
+        "old_price": product_data.get("old_price", 0) or 0,
+        "in_stock": bool(product_data.get("in_stock", True)),
+        "images": list(product_data.get("images") or []),
+    }
+
+
+def diff_snapshots(previous: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Сравнивает два снимка и возвращает список изменений"""
+    changes = []
+    for field in TRACKED_FIELDS:
+        old_value = previous.get(field)
+        new_value = current.get(field)
+        if field == "images":
+            old_set, new_set = set(old_value or []), set(new_value or [])
+            if old_set != new_set:
+                changes.append({
+                    "type": EVENT_TYPES[field],
+                    "field": field,
+                    "added": [img for img in new_value if img not in old_set],
+                    "removed": [img for img in old_value if img not in new_set],
+                })
+            continue
+        if field in ("price", "old_price"):
+            if float(old_value or 0) == float(new_value or 0):
+                continue
+        elif old_value == new_value:
+            continue
+        changes.append({"type": EVENT_TYPES[field], "field": field, "old": old_value, "new": new_value})
+    return changes
+
+
+class ChangeFeed:
+    """Последние снимки товаров + append-only лог событий (JSONL)"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = os.path.abspath(directory or os.environ.get('CHANGE_FEED_DIR', 'data/changes'))
+        self.log_path = os.path.join(self.directory, 'events.jsonl')
+        self.snapshots_path = os.path.join(self.directory, 'snapshots.jsonl')
+        self._lock = threading.Lock()
+        self._snapshots = self._load_snapshots()
+
+    def _load_snapshots(self) -> Dict[str, Dict[str, Any]]:
+        snapshots = {}
+        lines = 0
+        try:
+            with open(self.snapshots_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        key, snapshot = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка после падения процесса
+                        continue
+                    snapshots[key] = snapshot
+        except OSError:
+            pass
+        if lines > 2 * len(snapshots) + SNAPSHOT_COMPACT_SLACK:
+            self._compact(snapshots)
+        return snapshots
+
+    def _compact(self, snapshots: Dict[str, Dict[str, Any]]) -> None:
+        """Переписывает журнал снимков: по строке на товар"""
+        try:
+            tmp_path = f"{self.snapshots_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key, snapshot in snapshots.items():
+                    f.write(json.dumps([key, snapshot], ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.snapshots_path)
+        except OSError as e:
+            print(f"⚠️ Changes: не удалось сжать журнал снимков: {e}")
+
+    def _append_snapshot(self, key: str, snapshot: Dict[str, Any]) -> None:
+        with open(self.snapshots_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps([key, snapshot], ensure_ascii=False) + "\n")
+
+    def observe(self, url: str, product_data: Dict[str, Any], key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Сохраняет новый результат парсинга и пишет события изменений. Возвращает события"""
+        key = key or product_key(url)
+        current = _snapshot(product_data)
+        now = time.time()
+
+        with self._lock:
+            previous = self._snapshots.get(key)
+            if previous is None:
+                changes = [{"type": "product_added", "field": None, "new": current}]
+            else:
+                changes = diff_snapshots(previous, current)
+
+            events = []
+            if changes:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.log_path, 'a', encoding='utf-8') as log:
+                    for change in changes:
+                        event = {"ts": now, "product": key, "url": url, **change}
+                        log.write(json.dumps(event, ensure_ascii=False) + "\n")
+                        events.append(event)
+                    log.flush()
+                    os.fsync(log.fileno())
+
+            # Снимок пишется, только если он изменился (при пустом diff он тот же)
+            if previous != current:
+                self._snapshots[key] = current
+                os.makedirs(self.directory, exist_ok=True)
+                self._append_snapshot(key, current)
+
+        if events:
+            print(f"📣 Changes: {key} - {', '.join(e['type'] for e in events)}")
+        return events
+
+    def last_known(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def read(self, offset: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Читает события начиная с offset (байтовая позиция в логе).
+        Возвращает (события, следующий offset). Возвращаемый offset всегда указывает
+        на начало строки; offset клиента из середины строки сдвигается к следующей
+        """
+        events = []
+        offset = max(0, offset)
+        try:
+            with open(self.log_path, 'rb') as log:
+                if offset > 0:
+                    log.seek(offset - 1)
+                    if log.read(1) != b"\n":
+                        partial = log.readline()
+                        if not partial.endswith(b"\n"):
+                            # Середина недописанной строки: ждем ее конца
+                            return events, offset
+                        offset += len(partial)
+                while len(events) < limit:
+                    line = log.readline()
+                    # Недописанную строку (без \n) оставляем на следующий запрос
+                    if not line or not line.endswith(b"\n"):
+                        break
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        print(f"⚠️ Changes: пропускаем поврежденную строку лога на offset {offset}")
+                        offset += len(line)
+                        continue
+                    event["offset"] = offset
+                    events.append(event)
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        return events, offset
@@ -0,0 +1,71 @@
+"""
+Типизированные ошибки парсеров.
+
+Все ошибки наследуются от ValueError, поэтому существующие обработчики
+(API отвечает 400 на ValueError) продолжают работать без изменений.
+
+Классы отказов (kind) - основа повторов с отступом (см. retry.py):
+captcha, timeout, not_found, structure.
+"""
+
+
+class ParserError(ValueError):
+    """Базовая ошибка парсинга"""
+
+    # Класс отказа для повторов и ответа API (error_type); пусто - без классификации
+    kind = ''
+
+
+class CaptchaDetectedError(ParserError):
+    """Маркетплейс показал капчу или антибот-заглушку вместо страницы товара"""
+
+    kind = 'captcha'
+
+    def __init__(self, marketplace: str, signal: str):
+        self.marketplace = marketplace
+        self.signal = signal
+        super().__init__(f"Обнаружена капча на {marketplace} ({signal}). Попробуйте позже.")
+
+
+class ParseCancelledError(ParserError):
+    """Парсинг отменен (например, проигравшая сторона хеджированного парсинга)"""
+
+    def __init__(self, marketplace: str):
+        self.marketplace = marketplace
+        super().__init__(f"Парсинг {marketplace} отменен")
+
+
+class ParseTimeoutError(ParserError):
+    """Страница товара не загрузилась за отведенное время"""
+
+    kind = 'timeout'
+
+    def __init__(self, marketplace: str, message: str = ''):
+        self.marketplace = marketplace
+        super().__init__(message or f"Превышено время ожидания загрузки страницы {marketplace}")
+
+
+class ProductNotFoundError(ParserError):
+    """Товара нет: маркетплейс ответил 404/410 на страницу товара"""
+
+    kind = 'not_found'
+
+    def __init__(self, marketplace: str, message: str = ''):
+        self.marketplace = marketplace
+        super().__init__(message or f"Товар не найден на {marketplace}")
+
+
+class StructureChangedError(ParserError):
+    """Страница открылась, но ни одна стратегия не нашла данных товара (верстка или данные изменились)"""
+
+    kind = 'structure'
+
+    def __init__(self, marketplace: str, message: str = ''):
+        self.marketplace = marketplace
+        super().__init__(message or f"Не удалось извлечь данные товара с {marketplace}. "
+                                    f"Возможно, товар недоступен или страница изменилась.")
+
+
+# Класс отказа -> тип ошибки с конструктором (marketplace, message): восстановление типа после
+# передачи между процессами (у капчи свой конструктор - с сигналом)
+ERROR_KINDS = {cls.kind: cls for cls in (ParseTimeoutError, ProductNotFoundError, StructureChangedError)}
@@ -0,0 +1,175 @@
+"""
+Исполнитель парсинга на выделенных потоках-владельцах браузеров.
+
+Объекты sync API Playwright привязаны к потоку, который их создал, поэтому
+потоки Flask (свой на каждый запрос) не могут делить браузеры. Исполнитель
+держит фиксированный набор потоков: у каждого свой Playwright и браузер,
+закрепленный за потоком между задачами (см. browsers.py - пересоздание по
+памяти и числу страниц работает и здесь). Обработчик запроса отправляет
+парсер в общую очередь и ждет future, так что один процесс сервера
+обслуживает много параллельных запросов несколькими браузерами.
+
+Sync API выполняет вызовы потока последовательно, поэтому поток ведет одну
+задачу за раз (в ней - свои контекст и вкладки); параллельность задается
+числом потоков BROWSER_EXECUTOR_THREADS (0 - исполнитель выключен,
+парсинг идет в потоке запроса). Задача, не завершенная за
+BROWSER_EXECUTOR_TIMEOUT секунд, отменяется через cancel_event парсера.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+from .base import MarketplaceParserInterface
+from .browsers import browser_watchdog
+from .record import ProductRecord
+
+DEFAULT_TIMEOUT = 120.0
+# Сколько ждать прогрева браузеров всех потоков
+WARM_TIMEOUT = 120.0
+
+
+def executor_threads() -> int:
+    return int(os.environ.get('BROWSER_EXECUTOR_THREADS', 0))
+
+
+def executor_timeout() -> float:
+    return float(os.environ.get('BROWSER_EXECUTOR_TIMEOUT', DEFAULT_TIMEOUT))
+
+
+class BrowserExecutor:
+    """Фиксированный набор потоков с закрепленными браузерами и общая очередь задач парсинга"""
+
+    def __init__(self, threads: int = None):
+        self.threads = max(1, threads if threads is not None else executor_threads())
+        self._tasks: 'queue.Queue' = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+        self._warm_attempts = 0
+        self._warm_done = threading.Event()
+        self.warm_workers = 0
+        self.warm_pages: Dict[str, Dict[str, Any]] = {}
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def start(self, warm_marketplaces: Optional[List[str]] = None) -> None:
+        """
+        Запускает потоки (повторный вызов ничего не делает).
+        warm_marketplaces - каждый поток сначала запускает браузер и открывает главные страницы (warmup.py)
+        """
+        with self._lock:
+            if self._workers:
+                return
+            if warm_marketplaces is None:
+                self._warm_done.set()
+            for index in range(self.threads):
+                worker = threading.Thread(target=self._run, args=(warm_marketplaces,),
+                                          name=f"browser-executor-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        print(f"🧵 Исполнитель браузеров: потоков {self.threads}")
+
+    def wait_warm(self, timeout: float = WARM_TIMEOUT) -> Dict[str, Dict[str, Any]]:
+        """Ждет прогрева всех потоков; результаты открытия главных страниц первого прогретого"""
+        self._warm_done.wait(timeout)
+        return self.warm_pages
+
+    def submit(self, parser: MarketplaceParserInterface) -> Future:
+        """Ставит parser.parse() в очередь потоков-владельцев браузеров"""
+        self.start()
+        future: Future = Future()
+        self._tasks.put((parser, future))
+        return future
+
+    def parse(self, parser: MarketplaceParserInterface, timeout: float = None) -> ProductRecord:
+        """Парсинг на потоке исполнителя с ожиданием результата в потоке запроса"""
+        timeout = executor_timeout() if timeout is None else timeout
+        if parser.cancel_event is None:
+            parser.cancel_event = threading.Event()
+        if parser.deadline is None:
+            parser.deadline = time.time() + timeout
+        future = self.submit(parser)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Еще в очереди - снимаем; уже выполняется - прерываем на ближайшей паузе или стратегии
+            if not future.cancel():
+                parser.cancel_event.set()
+            with self._lock:
+                self.cancelled += 1
+            raise ValueError(f"Парсинг не завершился за {timeout:g}s (очередь исполнителя: {self._tasks.qsize()})")
+
+    def _run(self, warm_marketplaces: Optional[List[str]]) -> None:
+        browser_watchdog.pin_thread()
+        if warm_marketplaces is not None:
+            self._warm(warm_marketplaces)
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    return
+                parser, future = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                with self._lock:
+                    self.busy += 1
+                try:
+                    result = parser.parse()
+                except BaseException as e:
+                    with self._lock:
+                        self.failed += 1
+                    future.set_exception(e)
+                else:
+                    with self._lock:
+                        self.completed += 1
+                    future.set_result(result)
+                finally:
+                    with self._lock:
+                        self.busy -= 1
+        finally:
+            browser_watchdog.close_thread_browser()
+
+    def _warm(self, marketplaces: List[str]) -> None:
+        from .warmup import warm_browser
+
+        start = time.time()
+        try:
+            pages = warm_browser(marketplaces, keep=True)
+        except Exception as e:
+            print(f"⚠️ {threading.current_thread().name}: браузер не прогрелся: {e}")
+            pages = None
+        with self._lock:
+            if pages is not None:
+                self.warm_workers += 1
+                self.warm_pages = self.warm_pages or pages
+                print(f"🔥 {threading.current_thread().name}: браузер прогрет за {time.time() - start:.2f}s")
+            self._warm_attempts += 1
+            if self._warm_attempts >= self.threads:
+                self._warm_done.set()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Останавливает потоки после текущих задач; их браузеры закрываются в своих потоках"""
+        with self._lock:
+            workers = list(self._workers)
+        for _ in workers:
+            self._tasks.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'threads': self.threads,
+                'alive': sum(1 for worker in self._workers if worker.is_alive()),
+                'warm': self.warm_workers,
+                'busy': self.busy,
+                'queued': self._tasks.qsize(),
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+            }
@@ -0,0 +1,118 @@
+"""
+Запись и воспроизведение страниц маркетплейсов через HAR-архивы.
+
+PARSER_HAR_MODE=record - каждый контекст браузера пишет весь трафик страницы
+                         в HAR (PARSER_HAR_DIR, по умолчанию fixtures/har).
+PARSER_HAR_MODE=replay - все запросы страницы отдаются из архива, запросы,
+                         которых в архиве нет, обрываются (ноль сетевых обращений).
+
+Архив называется по идентичности товара (см. urls.py), профилю и режиму
+JavaScript: wb_123456.har.zip, ym_42-mobile.har.zip, ozon_987-nojs.har.zip.
+Запросы request-клиента контекста (Ozon page API, WB card API) маршрутизацией
+страницы не перехватываются, поэтому при воспроизведении они отвечаются
+из того же архива через HarArchive.
+"""
+import base64
+import hashlib
+import json
+import os
+import zipfile
+from typing import Dict, Any, Optional
+
+from .urls import canonicalize
+
+HAR_MODES = ('record', 'replay')
+DEFAULT_HAR_DIR = 'fixtures/har'
+HAR_ENTRY_NAME = 'har.har'
+
+
+def har_mode() -> str:
+    """Текущий режим: '' (обычная сеть), 'record' или 'replay'"""
+    mode = os.environ.get('PARSER_HAR_MODE', '').lower().strip()
+    if mode and mode not in HAR_MODES:
+        raise ValueError(f"Неизвестный режим HAR: {mode}. Доступны: {', '.join(HAR_MODES)}")
+    return mode
+
+
+def har_dir() -> str:
+    return os.environ.get('PARSER_HAR_DIR', DEFAULT_HAR_DIR)
+
+
+def har_name(url: str, profile_name: str = 'desktop', java_script_enabled: bool = True) -> str:
+    """Базовое имя архива (без расширения) для товара, профиля и режима JavaScript"""
+    identity = canonicalize(url, resolve=False)
+    if identity.marketplace and identity.product_id:
+        name = f"{identity.marketplace}_{identity.product_id}"
+    else:
+        name = f"{identity.marketplace or 'unknown'}_{hashlib.sha1(identity.canonical_url.encode()).hexdigest()[:12]}"
+    if profile_name != 'desktop':
+        name += f"-{profile_name}"
+    if not java_script_enabled:
+        name += "-nojs"
+    return name
+
+
+def har_path(url: str, profile_name: str = 'desktop', java_script_enabled: bool = True) -> str:
+    return os.path.join(har_dir(), har_name(url, profile_name, java_script_enabled) + '.har.zip')
+
+
+class HarResponse:
+    """Ответ из архива с интерфейсом APIResponse, который используют парсеры"""
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body_bytes = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def body(self) -> bytes:
+        return self.body_bytes
+
+    def text(self) -> str:
+        return self.body_bytes.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.body_bytes)
+
+
+class HarArchive:
+    """Чтение записанного HAR (.har или .har.zip с вложенными телами ответов)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path) if path.endswith('.zip') else None
+        if self._zip is not None:
+            har = json.loads(self._zip.read(HAR_ENTRY_NAME))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                har = json.load(f)
+        # (метод, URL) -> последняя запись: при записи с повторами актуален последний ответ
+        self._entries: Dict[tuple, Dict[str, Any]] = {}
+        for entry in har.get('log', {}).get('entries', []):
+            request = entry.get('request', {})
+            self._entries[(request.get('method', 'GET'), request.get('url'))] = entry
+
+    def _content(self, content: Dict[str, Any]) -> bytes:
+        if content.get('_file') and self._zip is not None:
+            return self._zip.read(content['_file'])
+        text = content.get('text') or ''
+        if content.get('encoding') == 'base64':
+            return base64.b64decode(text)
+        return text.encode('utf-8')
+
+    def response_for(self, method: str, url: str) -> HarResponse:
+        """Записанный ответ; если запроса в архиве нет - 404, как при обрыве в route_from_har"""
+        entry = self._entries.get((method.upper(), url))
+        if entry is None:
+            print(f"⚠️ HAR: Нет записи для {method} {url}")
+            return HarResponse(404, {}, b'')
+        response = entry.get('response', {})
+        headers = {header['name'].lower(): header['value'] for header in response.get('headers', [])}
+        return HarResponse(response.get('status', 200), headers, self._content(response.get('content', {})))
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
@@ -0,0 +1,206 @@
+"""
+Хеджированный парсинг: страховка от медленного хвоста.
+
+Основная реализация (выбранная по статистике) запускается сразу. Если за
+задержку хеджирования она не дала полный результат (название и цена),
+параллельно в отдельном потоке и своем браузере запускается другая
+реализация того же маркетплейса. Возвращается первый полный результат,
+проигравший парсер отменяется (кооперативно: на паузах и между стратегиями).
+
+Задержка - перцентиль HEDGE_PERCENTILE времени успешных парсингов основной
+реализации (не меньше HEDGE_MIN_DELAY), пока статистики нет - HEDGE_DELAY.
+Включается через HEDGED_PARSING=true (все маркетплейсы) или списком
+HEDGED_PARSING=wb,ozon, либо параметром hedge=true в /api/parse.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from typing import Dict, Any, Optional
+
+from .base import MarketplaceParserInterface, ParserWrapper
+from .record import ProductRecord
+from .selection import SELECTION_STAGE, alternate_implementation, create_parser, is_complete
+from .strategies import strategy_stats
+
+DEFAULT_HEDGE_DELAY = 15.0
+DEFAULT_HEDGE_MIN_DELAY = 5.0
+DEFAULT_HEDGE_PERCENTILE = 0.9
+# Как часто связка отмены проверяет событие вызывающего
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def hedge_delay(marketplace: str, implementation: str) -> float:
+    """Через сколько секунд без полного результата запускать запасную реализацию"""
+    quantile = float(os.environ.get('HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE))
+    observed = strategy_stats.latency_percentile(marketplace, SELECTION_STAGE, implementation, quantile)
+    if observed is None:
+        return float(os.environ.get('HEDGE_DELAY', DEFAULT_HEDGE_DELAY))
+    return max(observed, float(os.environ.get('HEDGE_MIN_DELAY', DEFAULT_HEDGE_MIN_DELAY)))
+
+
+class HedgeStats:
+    """Сколько парсингов потребовали хеджирования и какая реализация выиграла"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def record(self, marketplace: str, hedged: bool, winner: str = '') -> None:
+        with self._lock:
+            counters = self._counters.setdefault(
+                marketplace, {'parses': 0, 'hedged': 0, 'primary_won': 0, 'alternate_won': 0})
+            counters['parses'] += 1
+            if hedged:
+                counters['hedged'] += 1
+                if winner:
+                    counters[f"{winner}_won"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                marketplace: dict(counters, hedge_rate=round(counters['hedged'] / counters['parses'], 3)
+                                  if counters['parses'] else 0)
+                for marketplace, counters in self._counters.items()
+            }
+
+
+hedge_stats = HedgeStats()
+
+
+class HedgedParser(ParserWrapper):
+    """Основная реализация со страховочным запуском альтернативной по перцентилю задержки"""
+
+    def __init__(self, parser: MarketplaceParserInterface, alternate: MarketplaceParserInterface):
+        super().__init__(parser)
+        self.alternate = alternate
+        # Отмена вызывающего (исполнитель, поток SSE): на время парсинга связана с отменами обеих сторон
+        self._cancel_event = None
+
+    # Профиль, варианты, отмена и прогресс применяются к обеим реализациям
+    @ParserWrapper.profile.setter
+    def profile(self, value) -> None:
+        self.parser.profile = value
+        self.alternate.profile = value
+
+    @ParserWrapper.include_variants.setter
+    def include_variants(self, value: bool) -> None:
+        self.parser.include_variants = value
+        self.alternate.include_variants = value
+
+    @property
+    def cancel_event(self):
+        return self._cancel_event
+
+    @cancel_event.setter
+    def cancel_event(self, value) -> None:
+        self._cancel_event = value
+        self.parser.cancel_event = value
+        self.alternate.cancel_event = value
+
+    @ParserWrapper.progress.setter
+    def progress(self, value) -> None:
+        self.parser.progress = value
+        self.alternate.progress = value
+
+    def parse(self) -> ProductRecord:
+        delay = hedge_delay(self.marketplace, getattr(self.parser, 'implementation', ''))
+        # У каждой стороны своя отмена, чтобы остановить только проигравшую; отмена вызывающего - обе
+        outer = self._cancel_event
+        events = {'primary': threading.Event(), 'alternate': threading.Event()}
+        parsers = {'primary': self.parser, 'alternate': self.alternate}
+        for side, parser in parsers.items():
+            parser.cancel_event = events[side]
+        finished_event = threading.Event()
+        if outer is not None:
+            threading.Thread(target=self._link_cancel, args=(outer, list(events.values()), finished_event),
+                             name=f"hedge-cancel-{self.marketplace}", daemon=True).start()
+
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"hedge-{self.marketplace}")
+        futures = {executor.submit(self.parser.parse): 'primary'}
+        try:
+            done, _ = wait(futures, timeout=delay)
+            if done and self._complete(next(iter(done))):
+                hedge_stats.record(self.marketplace, hedged=False)
+                return next(iter(done)).result()
+
+            print(f"🪁 {self.marketplace_name}: Нет полного результата за {delay:.1f}с, "
+                  f"запускаем запасную реализацию")
+            futures[executor.submit(self.alternate.parse)] = 'alternate'
+            finished = []
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    side = futures[future]
+                    if self._complete(future):
+                        events['alternate' if side == 'primary' else 'primary'].set()
+                        hedge_stats.record(self.marketplace, hedged=True, winner=side)
+                        winner = 'основная' if side == 'primary' else 'запасная'
+                        print(f"🏁 {self.marketplace_name}: Первой успела {winner} реализация")
+                        return future.result()
+                    finished.append(future)
+
+            hedge_stats.record(self.marketplace, hedged=True)
+            return self._best_partial(finished, futures)
+        finally:
+            finished_event.set()
+            for event in events.values():
+                event.set()
+            executor.shutdown(wait=False)
+            started = {side: future for future, side in futures.items()}
+            for side, parser in parsers.items():
+                restore = partial(self._restore_cancel, parser, events[side], outer)
+                if side in started:
+                    # Проигравшая сторона еще может быть внутри долгого вызова Playwright: ее отмена
+                    # остается установленной, пока она не дойдет до ближайшей паузы или стратегии
+                    started[side].add_done_callback(lambda _, restore=restore: restore())
+                else:
+                    restore()
+
+    @staticmethod
+    def _link_cancel(outer: threading.Event, events, finished: threading.Event) -> None:
+        """Переносит отмену вызывающего на обе стороны, пока хеджированный парсинг не завершен"""
+        while not finished.is_set():
+            if outer.wait(CANCEL_POLL_INTERVAL):
+                for event in events:
+                    event.set()
+                return
+
+    @staticmethod
+    def _restore_cancel(parser: MarketplaceParserInterface, event: threading.Event,
+                        outer: Optional[threading.Event]) -> None:
+        # Следующий парсинг (например, повтор) мог уже выдать стороне новое событие - его не трогаем
+        if parser.cancel_event is event:
+            parser.cancel_event = outer
+
+    @staticmethod
+    def _complete(future) -> bool:
+        return future.exception() is None and is_complete(future.result())
+
+    @staticmethod
+    def _best_partial(finished, futures) -> ProductRecord:
+        """Ни одна реализация не дала полный результат: частичный результат или ошибка основной"""
+        results = [future.result() for future in finished if future.exception() is None and future.result()]
+        if results:
+            return max(results, key=lambda result: sum(1 for name in ProductRecord.FIELDS if result.get(name)))
+        primary = next((future for future in finished if futures[future] == 'primary'), finished[0])
+        raise primary.exception()
+
+
+def hedged_marketplaces() -> tuple:
+    """HEDGED_PARSING=true - для всех маркетплейсов, либо список: HEDGED_PARSING=wb,ozon"""
+    value = os.environ.get('HEDGED_PARSING', 'false').lower().strip()
+    if value in ('', 'false', '0', 'no'):
+        return ()
+    if value in ('true', '1', 'yes', 'all'):
+        return ('wb', 'ozon', 'ym')
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def create_hedged_parser(parser: MarketplaceParserInterface) -> Optional[HedgedParser]:
+    """Оборачивает выбранную реализацию в хеджирование, если у маркетплейса есть альтернатива"""
+    alternate = alternate_implementation(parser.marketplace, getattr(parser, 'implementation', ''))
+    if not alternate:
+        return None
+    return HedgedParser(parser, create_parser(parser.marketplace, parser.url, alternate, identity=parser.identity))
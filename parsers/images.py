@@ -0,0 +1,295 @@
+"""
+Локальное зеркало изображений товаров.
+
+Скачивает картинки из результата парсинга (WB basket, Ozon cdn, Яндекс avatars),
+складывает их в content-addressed хранилище (ключ - sha256 содержимого),
+генерирует WebP-миниатюры в пуле процессов и отдает локальные URL.
+
+Скачиваются только картинки с CDN маркетплейсов (IMAGE_HOSTS, дополнить можно
+через IMAGE_MIRROR_HOSTS=host1,host2) и только с публичных адресов: иначе
+/api/images/mirror был бы открытым прокси во внутреннюю сеть. Редиректы
+проверяются так же.
+"""
+import hashlib
+import ipaddress
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import urllib.request
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow опционален: без него отдаем только оригиналы
+    Image = None
+
+# Размеры миниатюр по большей стороне (px)
+THUMBNAIL_SIZES = (320, 800)
+DOWNLOAD_WORKERS = int(os.environ.get('IMAGE_DOWNLOAD_WORKERS', 8))
+DOWNLOAD_TIMEOUT = 20
+MAX_IMAGE_BYTES = 15 * 1024 * 1024
+
+# CDN изображений маркетплейсов: хост или его поддомены
+IMAGE_HOSTS = ('wbbasket.ru', 'wbstatic.net', 'ozone.ru', 'ozonstatic.ru', 'avatars.mds.yandex.net')
+
+USER_AGENT = os.environ.get(
+    'USER_AGENT',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36'
+)
+
+
+def image_hosts() -> tuple:
+    extra = os.environ.get('IMAGE_MIRROR_HOSTS', '')
+    return IMAGE_HOSTS + tuple(host.strip().lower() for host in extra.split(',') if host.strip())
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+def is_allowed_image_url(url: str) -> bool:
+    """http(s) на CDN маркетплейса, и все адреса хоста публичные (не loopback и не внутренняя сеть)"""
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower().rstrip('.')
+        if parts.scheme not in ('http', 'https') or not host:
+            return False
+        if not any(host == allowed or host.endswith(f".{allowed}") for allowed in image_hosts()):
+            return False
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or None, proto=socket.IPPROTO_TCP)}
+        return bool(addresses) and all(_is_public_address(address) for address in addresses)
+    except (ValueError, OSError):
+        return False
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Редирект допускается только на разрешенный адрес"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not is_allowed_image_url(newurl):
+            raise ValueError(f"редирект на неразрешенный адрес: {newurl}")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_CheckedRedirectHandler)
+
+
+def _make_thumbnails(source_path: str, target_dir: str, sizes: tuple) -> List[int]:
+    """Генерирует WebP миниатюры для одного файла (выполняется в отдельном процессе)"""
+    created = []
+    with Image.open(source_path) as img:
+        img = img.convert('RGBA') if img.mode in ('P', 'LA') else img
+        img = img.convert('RGB') if img.mode not in ('RGB', 'RGBA') else img
+        for size in sizes:
+            target = os.path.join(target_dir, f"{size}.webp")
+            if os.path.exists(target):
+                created.append(size)
+                continue
+            thumb = img.copy()
+            thumb.thumbnail((size, size))
+            tmp_path = f"{target}.tmp"
+            thumb.save(tmp_path, 'WEBP', quality=82, method=4)
+            os.replace(tmp_path, target)
+            created.append(size)
+    return created
+
+
+def guess_mimetype(path: str) -> str:
+    """Определяет тип картинки по сигнатуре файла (у оригиналов нет расширения)"""
+    if path.endswith('.webp'):
+        return 'image/webp'
+    with open(path, 'rb') as f:
+        header = f.read(12)
+    if header.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if header.startswith(b'\x89PNG'):
+        return 'image/png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if header[4:12] in (b'ftypavif', b'ftypheic'):
+        return 'image/avif' if header[8:12] == b'avif' else 'image/heic'
+    return 'application/octet-stream'
+
+
+class ImageStore:
+    """
+    Content-addressed хранилище: <root>/<ab>/<sha256>/original + <size>.webp.
+    Индекс url -> digest - журнал index.jsonl: новые записи дописываются в конец
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or os.environ.get('IMAGE_STORE_DIR', 'media'))
+        self._index_path = os.path.join(self.root, 'index.jsonl')
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        # Записи, еще не дописанные в журнал
+        self._unsaved: List[tuple] = []
+
+    def _load_index(self) -> Dict[str, str]:
+        """Индекс url -> digest, чтобы не скачивать одну картинку повторно"""
+        index = {}
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        url, digest = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка после падения процесса
+                        continue
+                    index[url] = digest
+        except OSError:
+            pass
+        return index
+
+    def _save_index(self) -> None:
+        if not self._unsaved:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._index_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in self._unsaved))
+        self._unsaved = []
+
+    def digest_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def original_path(self, digest: str) -> str:
+        return os.path.join(self.digest_dir(digest), 'original')
+
+    def thumbnail_path(self, digest: str, size: int) -> str:
+        return os.path.join(self.digest_dir(digest), f"{size}.webp")
+
+    def lookup(self, url: str) -> Optional[str]:
+        digest = self._index.get(url)
+        if digest and os.path.exists(self.original_path(digest)):
+            return digest
+        return None
+
+    def put(self, url: str, content: bytes) -> str:
+        """Сохраняет содержимое, возвращает digest. Одинаковые файлы хранятся один раз"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.original_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if self._index.get(url) != digest:
+                self._index[url] = digest
+                self._unsaved.append((url, digest))
+        return digest
+
+    def flush(self) -> None:
+        with self._lock:
+            self._save_index()
+
+
+class ImageMirror:
+    """Зеркалирует список изображений товара в локальное хранилище"""
+
+    def __init__(self, store: Optional[ImageStore] = None, public_prefix: str = '/media'):
+        self.store = store or ImageStore()
+        self.public_prefix = public_prefix.rstrip('/')
+        self._process_pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._process_pool is None:
+                # spawn, а не fork: сервер многопоточный (Playwright, сторож, диспетчер), и fork
+                # унаследовал бы блокировки, захваченные другими потоками
+                self._process_pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1),
+                                                         mp_context=multiprocessing.get_context('spawn'))
+            return self._process_pool
+
+    def _download(self, url: str) -> Optional[str]:
+        """Скачивает одну картинку, возвращает digest или None при ошибке"""
+        digest = self.store.lookup(url)
+        if digest:
+            return digest
+        if not is_allowed_image_url(url):
+            print(f"⚠️ Images: Пропускаем {url}: не CDN маркетплейса или непубличный адрес")
+            return None
+        try:
+            req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, 'Accept': 'image/*,*/*;q=0.8'})
+            with _opener.open(req, timeout=DOWNLOAD_TIMEOUT) as response:
+                content = response.read(MAX_IMAGE_BYTES + 1)
+            if not content or len(content) > MAX_IMAGE_BYTES:
+                print(f"⚠️ Images: Пропускаем {url} (размер {len(content)} байт)")
+                return None
+            return self.store.put(url, content)
+        except Exception as e:
+            print(f"⚠️ Images: Не удалось скачать {url}: {e}")
+            return None
+
+    def mirror(self, images: List[str]) -> List[Dict[str, Any]]:
+        """
+        Скачивает изображения параллельно, дедуплицирует по хэшу содержимого
+        и генерирует миниатюры. Порядок исходного списка сохраняется.
+        """
+        urls = [url for url in dict.fromkeys(images or []) if url and url.startswith('http')]
+        if not urls:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(urls))) as pool:
+            digests = list(pool.map(self._download, urls))
+        self.store.flush()
+
+        # Дедупликация: одинаковые картинки с разных CDN-адресов
+        unique = []
+        seen = set()
+        for url, digest in zip(urls, digests):
+            if digest and digest not in seen:
+                seen.add(digest)
+                unique.append((url, digest))
+
+        thumbnails = {}
+        if Image is not None:
+            pool = self._get_process_pool()
+            futures = {
+                digest: pool.submit(_make_thumbnails, self.store.original_path(digest),
+                                    self.store.digest_dir(digest), THUMBNAIL_SIZES)
+                for _, digest in unique
+            }
+            for digest, future in futures.items():
+                try:
+                    thumbnails[digest] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Images: Не удалось создать миниатюры для {digest}: {e}")
+                    thumbnails[digest] = []
+
+        result = []
+        for url, digest in unique:
+            base_url = f"{self.public_prefix}/{digest}"
+            result.append({
+                "source": url,
+                "hash": digest,
+                "original": f"{base_url}/original",
+                "thumbnails": {str(size): f"{base_url}/{size}.webp" for size in thumbnails.get(digest, [])},
+            })
+        print(f"🖼️ Images: Сохранено {len(result)} уникальных изображений из {len(urls)}")
+        return result
+
+    def resolve(self, digest: str, variant: str) -> Optional[str]:
+        """Возвращает путь к файлу варианта ('original' или '<size>.webp') или None"""
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            return None
+        if variant == 'original':
+            path = self.store.original_path(digest)
+        elif variant.endswith('.webp') and variant[:-5].isdigit() and int(variant[:-5]) in THUMBNAIL_SIZES:
+            path = self.store.thumbnail_path(digest, int(variant[:-5]))
+        else:
+            return None
+        return path if os.path.exists(path) else None
+
+    def shutdown(self) -> None:
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
@@ -0,0 +1,232 @@
+"""
+Общая очередь задач парсинга на SQLite.
+
+Любое количество воркеров на одной машине (процессы parse_worker.py и API
+сервер с одним файлом БД) забирает задачи с арендой (lease). Если воркер не
+подтвердил задачу до истечения visibility timeout, задача снова становится
+видимой. После max_attempts неудачных попыток задача уходит в dead-letter
+(status='dead').
+
+Только один хост: режим WAL держит индекс в разделяемой памяти (-shm) и
+не работает с файлом БД на сетевом диске (NFS, SMB) - блокировки и записи
+там теряются. Для воркеров на нескольких машинах нужна очередь с сервером
+(например, Redis); здесь она не реализована.
+
+Параметры запроса (профиль, варианты, страховочный парсинг) хранятся в
+задаче (options, JSON) и применяются воркером.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from .record import dumps, loads
+
+STATUS_QUEUED = 'queued'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+STATUS_DEAD = 'dead'
+
+DEFAULT_VISIBILITY_TIMEOUT = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parse_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    dedupe_key TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    visible_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    options TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_parse_jobs_ready ON parse_jobs (status, visible_at);
+CREATE INDEX IF NOT EXISTS idx_parse_jobs_lease ON parse_jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_parse_jobs_dedupe ON parse_jobs (dedupe_key, status);
+"""
+
+
+class JobQueue:
+    """Durable очередь задач парсинга (SQLite, WAL)"""
+
+    def __init__(self, path: Optional[str] = None, visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path or os.environ.get('PARSE_QUEUE_DB', 'data/parse_queue.db')
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['options'] = json.loads(job['options']) if job.get('options') else {}
+        return job
+
+    def _connection(self) -> sqlite3.Connection:
+        """Отдельное соединение на поток (sqlite3 connection не потокобезопасен)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, url: str, dedupe_key: Optional[str] = None, max_attempts: Optional[int] = None,
+                options: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Добавляет задачу. Если такая же задача (тот же товар и параметры) уже в работе - возвращает ее id.
+        options - параметры парсинга для воркера: profile, variants, hedge
+        """
+        options_json = json.dumps(options, sort_keys=True) if options else None
+        if dedupe_key and options_json:
+            # Задача с другим профилем или вариантами дает другой результат
+            dedupe_key = f"{dedupe_key}|{options_json}"
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe_key:
+                row = conn.execute(
+                    "SELECT id FROM parse_jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY id LIMIT 1",
+                    (dedupe_key, STATUS_QUEUED, STATUS_LEASED)
+                ).fetchone()
+                if row:
+                    conn.execute('COMMIT')
+                    return row['id']
+            cursor = conn.execute(
+                "INSERT INTO parse_jobs (url, dedupe_key, options, status, max_attempts, visible_at, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, dedupe_key, options_json, STATUS_QUEUED, max_attempts or self.max_attempts, now, now, now)
+            )
+            conn.execute('COMMIT')
+            return cursor.lastrowid
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def lease(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Забирает следующую видимую задачу в аренду (или задачу с истекшей арендой)"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT * FROM parse_jobs "
+                "WHERE (status = ? AND visible_at <= ?) OR (status = ? AND lease_expires < ?) "
+                "ORDER BY visible_at, id LIMIT 1",
+                (STATUS_QUEUED, now, STATUS_LEASED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+
+            attempts = row['attempts'] + 1
+            if row['status'] == STATUS_LEASED and row['attempts'] >= row['max_attempts']:
+                # Воркер умер на последней попытке - в dead-letter
+                conn.execute(
+                    "UPDATE parse_jobs SET status = ?, error = ?, lease_owner = NULL, updated_at = ? WHERE id = ?",
+                    (STATUS_DEAD, row['error'] or 'Lease expired on last attempt', now, row['id'])
+                )
+                conn.execute('COMMIT')
+                return self.lease(owner)
+
+            conn.execute(
+                "UPDATE parse_jobs SET status = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated_at = ? "
+                "WHERE id = ?",
+                (STATUS_LEASED, attempts, owner, now + self.visibility_timeout, now, row['id'])
+            )
+            conn.execute('COMMIT')
+            job = self._job(row)
+            job.update(status=STATUS_LEASED, attempts=attempts, lease_owner=owner)
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def extend(self, job_id: int, owner: str) -> bool:
+        """Продлевает аренду (heartbeat). False - аренда потеряна"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE parse_jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+            (now + self.visibility_timeout, now, job_id, owner, STATUS_LEASED)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, result: Any) -> bool:
+        cursor = self._connection().execute(
+            "UPDATE parse_jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = ?",
+            (STATUS_DONE, dumps(result).decode('utf-8'), time.time(), job_id, owner, STATUS_LEASED)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str, retryable: bool = True) -> str:
+        """Отмечает неудачную попытку. Возвращает новый статус задачи"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM parse_jobs WHERE id = ? AND lease_owner = ? AND status = ?",
+                (job_id, owner, STATUS_LEASED)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return ''
+            if not retryable or row['attempts'] >= row['max_attempts']:
+                status, visible_at = STATUS_DEAD, now
+            else:
+                # Экспоненциальная задержка перед повтором с джиттером
+                status = STATUS_QUEUED
+                visible_at = now + min(300, 5 * 2 ** (row['attempts'] - 1)) * random.uniform(0.8, 1.2)
+            conn.execute(
+                "UPDATE parse_jobs SET status = ?, error = ?, visible_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (status, error, visible_at, now, job_id, owner)
+            )
+            conn.execute('COMMIT')
+            return status
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT * FROM parse_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._job(row)
+        if job['result']:
+            job['result'] = loads(job['result'])
+        return job
+
+    def wait(self, job_id: int, timeout: float, poll_interval: float = 0.5) -> Dict[str, Any]:
+        """Ждет завершения задачи (done/dead) не дольше timeout секунд"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                raise ValueError(f"Задача парсинга {job_id} не найдена")
+            if job['status'] in (STATUS_DONE, STATUS_DEAD):
+                return job
+            if time.time() >= deadline:
+                raise TimeoutError(f"Задача парсинга {job_id} не завершилась за {timeout:.0f}с")
+            time.sleep(poll_interval)
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM parse_jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
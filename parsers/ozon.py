@@ -1,65 +1,98 @@
 import json
+import os
 import re
 import time
 import random
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from urllib.parse import urlparse, quote
 from .base import MarketplaceParserInterface
+from .errors import ParseTimeoutError, ParserError, StructureChangedError
+from .record import ProductRecord
+from .urls import ProductIdentity
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
 
+# Хост - домен канонического URL товара (региональные витрины ozon.kz, ozon.by отвечают своими ценами)
+OZON_API_URL = "https://{host}/api/entrypoint-api.bx/page/json/v2?url={path}"
+# Вторая "страница" компоновщика содержит характеристики и описание
+OZON_API_SECOND_PAGE = "&layout_container=pdpPage2column&layout_page_index=2"
+
+
 class OzonParser(MarketplaceParserInterface):
-    def parse(self) -> Dict[str, Any]:
+    marketplace = "ozon"
+    marketplace_name = "Ozon"
+
+    def __init__(self, url: str, identity: ProductIdentity = None):
+        super().__init__(url, identity)
+        # Извлечение через JSON API можно отключить: OZON_USE_API=false
+        self.use_api = os.environ.get('OZON_USE_API', 'true').lower() == 'true'
+        self.product_data_strategy = None
+        # Страница товара уже открыта быстрым путем (_parse_via_api) - рендер ее не перезагружает
+        self._page_opened = False
+
+    def parse(self) -> ProductRecord:
         playwright = None
         browser = None
         try:
             playwright, browser, page = self._get_browser_page()
             
-            # Убираем параметры из URL для избежания капчи
-            clean_url = self.url.split('?')[0]
+            # URL уже канонический: без параметров (они провоцируют капчу и не влияют на товар)
+            clean_url = self.url
+            self._page_opened = False
             
-            # Открываем страницу товара с ожиданием networkidle
-            page.goto(clean_url, wait_until='networkidle', timeout=self.timeout)
-            self._wait_for_page_load(page)
-            
-            # Проверяем на капчу или блокировку (только явные признаки)
-            page_url = page.url.lower()
-            page_title = page.title().lower()
+            # Быстрый путь: JSON page-composer API Ozon через request-клиент контекста браузера
+            if self.use_api:
+                api_result = self._parse_via_api(page, clean_url)
+                if api_result:
+                    self._report_progress('page_composer_api', **api_result)
+                    return api_result
+                print("⚠️ Ozon: API не вернуло полные данные, используем рендер страницы")
             
-            # Проверяем только URL - не заголовок и не содержимое (может быть ложное срабатывание)
-            if 'captcha' in page_url or 'challenge' in page_url:
-                print("⚠️ Ozon: Обнаружена капча в URL")
-                raise ValueError("Обнаружена капча на Ozon. Попробуйте позже или используйте другой товар.")
+            # Открываем страницу товара с ожиданием networkidle (капча проверяется сразу после навигации)
+            # (page.url с адресом не сравнивается: его переписывают мобильный профиль и PARSER_HOST_MAP)
+            if self._page_opened:
+                page.wait_for_load_state('networkidle', timeout=self.timeout)
+            else:
+                self._open_product_page(page, clean_url)
+            self._wait_for_page_load(page)
             
             # Дополнительная задержка для загрузки JS
-            time.sleep(random.uniform(2, 4))
+            self._sleep(random.uniform(2, 4))
             
-            # Извлекаем данные из JS объектов
+            # Стратегии (JS объекты и DOM) пробуются в порядке, выученном по прошлым попыткам
             product_data = self._extract_product_data(page)
             
-            # Если JS данные не найдены, пробуем еще раз с перезагрузкой
-            if not product_data or not product_data.get("title"):
-                print("⚠️ Ozon: JS данные не найдены, пробуем перезагрузку...")
-                time.sleep(2)
-                page.reload(wait_until='networkidle', timeout=self.timeout)
+            # Если ни одна стратегия не сработала, пробуем еще раз с перезагрузкой
+            if not self._has_valid_product_data(product_data):
+                print("⚠️ Ozon: Данные не найдены, пробуем перезагрузку...")
+                self._sleep(2)
+                response = page.reload(wait_until='networkidle', timeout=self.timeout)
+                self._check_challenge(page, response)
                 self._wait_for_page_load(page)
                 product_data = self._extract_product_data(page)
             
-            # Если JS данные все еще не найдены, используем DOM fallback
-            if not product_data or not product_data.get("title"):
-                print("⚠️ Ozon: JS данные не найдены после перезагрузки, используем DOM fallback")
-                # Пробуем агрессивный поиск в DOM
-                aggressive_dom = self._extract_from_dom_aggressive(page)
-                if aggressive_dom and aggressive_dom.get("title"):
-                    print("✅ Ozon: Данные извлечены агрессивным поиском в DOM")
-                    product_data = aggressive_dom
-                else:
-                    raise ValueError("Не удалось извлечь данные товара с Ozon. Возможно, товар недоступен или страница изменилась.")
+            if not self._has_valid_product_data(product_data):
+                raise StructureChangedError("Ozon")
             
-            # Формируем результат
+            # Забираем из payload страницы все нужные поля за один проход
             title = product_data.get("title", product_data.get("name", ""))
+            description = product_data.get("description", "")
+            price = self._extract_price(product_data)
+            old_price = self._extract_old_price(product_data)
+            category = product_data.get("category", "")
+            characteristics = self._extract_characteristics(product_data)
+            in_stock = product_data.get("isAvailable", product_data.get("available", True))
+            images = self._extract_images(product_data, page)
+            self._record_strategy_fields("product_data", self.product_data_strategy, title=title, price=price,
+                                         description=description, characteristics=characteristics, images=images)
+            self._report_progress(self.product_data_strategy, title=title, category=category, price=price,
+                                  old_price=old_price, in_stock=in_stock, images=images,
+                                  description=description, characteristics=characteristics)
+            
+            # Сырой payload страницы больше не нужен
+            del product_data
             
             # Проверяем описание - если пустое, пробуем из DOM
-            description = product_data.get("description", "")
             if not description or len(description) < 10:
                 dom_desc = page.evaluate("""
                     () => {
@@ -84,8 +117,7 @@ class OzonParser(MarketplaceParserInterface):
                 if dom_desc:
                     description = dom_desc
 
-            # Извлекаем цену
-            price = self._extract_price(product_data)
+            # Если цена не найдена в данных, пробуем DOM
             if price == 0:
                 # Пробуем из DOM - более агрессивный поиск
                 dom_price = page.evaluate("""
@@ -121,8 +153,7 @@ class OzonParser(MarketplaceParserInterface):
                 else:
                     print(f"⚠️ Ozon: Цена не найдена в DOM")
             
-            # Извлекаем изображения
-            images = self._extract_images(product_data, page)
+            # Если изображения не найдены в данных, пробуем DOM
             if not images or len(images) == 0:
                 print("⚠️ Ozon: Изображения не найдены в данных, пробуем DOM...")
                 # Пробуем из DOM с улучшенными селекторами
@@ -175,36 +206,186 @@ class OzonParser(MarketplaceParserInterface):
                 else:
                     print("⚠️ Ozon: Изображения не найдены")
 
-            result = {
-                "title": title if title and len(title) > 3 else "",
-                "price": int(price) if price else 0,
-                "old_price": int(self._extract_old_price(product_data)) if self._extract_old_price(product_data) else 0,
-                "description": description,
-                "category": product_data.get("category", ""),
-                "characteristics": self._extract_characteristics(product_data),
-                "composition": self._extract_composition(product_data),
-                "images": images,
-                "in_stock": product_data.get("isAvailable", product_data.get("available", True))
-            }
+            result = ProductRecord(
+                title=title if title and len(title) > 3 else "",
+                price=int(price) if price else 0,
+                old_price=int(old_price) if old_price else 0,
+                description=description,
+                category=category,
+                characteristics=characteristics,
+                images=images,
+                in_stock=in_stock,
+            )
+            # Группы, которых не было в данных стратегии, дозаполнены из DOM
+            self._report_progress('dom', **result)
             
             print(f"📦 Ozon: Результат - название: '{result['title']}', цена: {result['price']}, изображений: {len(result['images'])}, описание: {len(result['description'])} символов")
             
             return result
 
+        except ParserError:
+            # Типизированные ошибки (капча, отмена) отдаем как есть
+            raise
         except PlaywrightTimeoutError:
-            raise ValueError("Превышено время ожидания загрузки страницы Ozon")
+            raise ParseTimeoutError("Ozon")
         except Exception as e:
             raise ValueError(f"Ошибка при парсинге Ozon: {str(e)}")
         finally:
-            if browser:
-                browser.close()
-            if playwright:
-                playwright.stop()
+            self._close_browser(playwright, browser)
+
+    def _fetch_api_page(self, page: Page, path: str, extra: str = "") -> Optional[Dict[str, Any]]:
+        """Запрашивает JSON компоновщика страниц через request-клиент контекста (общие cookies)"""
+        api_url = OZON_API_URL.format(host=urlparse(self.url).netloc, path=quote(path, safe='/')) + extra
+        try:
+            response = self._api_get(page, api_url)
+            if not response.ok or 'json' not in response.headers.get('content-type', ''):
+                print(f"⚠️ Ozon API: статус {response.status}, content-type {response.headers.get('content-type')}")
+                return None
+            data = response.json()
+            return data if isinstance(data, dict) and data.get('widgetStates') else None
+        except Exception as e:
+            print(f"⚠️ Ozon API: Ошибка запроса: {e}")
+            return None
+
+    def _decode_widget_states(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """widgetStates хранит JSON-строки под ключами вида 'webPrice-3121879-default-1'"""
+        widgets = {}
+        for key, value in (data.get('widgetStates') or {}).items():
+            name = key.split('-')[0]
+            if name in widgets:
+                continue
+            try:
+                widgets[name] = json.loads(value) if isinstance(value, str) else value
+            except ValueError:
+                continue
+        return widgets
+
+    def _parse_api_price(self, value: Any) -> int:
+        """Цены в API приходят строками в рублях ('1 329 ₽') - без эвристик с копейками"""
+        if isinstance(value, (int, float)):
+            return int(value)
+        if not isinstance(value, str):
+            return 0
+        digits = re.sub(r'[^\d,.]', '', value).replace(',', '.')
+        try:
+            return int(float(digits)) if digits else 0
+        except ValueError:
+            return 0
+
+    def _json_ld_from_api(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        for script in (data.get('seo') or {}).get('script', []) or []:
+            try:
+                ld = json.loads(script.get('innerHTML', ''))
+            except (ValueError, AttributeError):
+                continue
+            if isinstance(ld, dict) and ld.get('@type') in ('Product', 'http://schema.org/Product'):
+                return ld
+        return {}
+
+    def _characteristics_from_widget(self, widget: Dict[str, Any]) -> Dict[str, str]:
+        characteristics = {}
+        for group in widget.get('characteristics', []) or []:
+            for item in (group.get('short') or []) + (group.get('long') or []):
+                name = item.get('name') or item.get('key')
+                values = [v.get('text', '') for v in item.get('values', []) if isinstance(v, dict)]
+                value = ', '.join(v for v in values if v)
+                if name and value:
+                    characteristics[name] = value
+        return characteristics
+
+    def _parse_via_api(self, page: Page, clean_url: str) -> Optional[ProductRecord]:
+        """Извлекает товар из widgetStates JSON API. None - если данных недостаточно"""
+        path = urlparse(clean_url).path
+        data = self._fetch_api_page(page, path)
+        if data is None:
+            # Нет cookies антибота - получаем их загрузкой документа без ожидания рендера.
+            # Капча здесь прерывает парсинг сразу, без долгого fallback на рендер
+            self._open_product_page(page, clean_url, wait_until='domcontentloaded')
+            self._page_opened = True
+            data = self._fetch_api_page(page, path)
+            if data is None:
+                return None
+
+        widgets = self._decode_widget_states(data)
+        ld = self._json_ld_from_api(data)
+        price_widget = widgets.get('webPrice', {})
+
+        title = (widgets.get('webProductHeading', {}).get('title') or ld.get('name') or '').strip()
+        price = self._parse_api_price(price_widget.get('price') or price_widget.get('cardPrice'))
+        if not price and isinstance(ld.get('offers'), dict):
+            price = self._parse_api_price(ld['offers'].get('price'))
+        old_price = self._parse_api_price(price_widget.get('originalPrice'))
+
+        images = []
+        gallery = widgets.get('webGallery', {})
+        for img in gallery.get('images', []) or []:
+            src = img.get('src') if isinstance(img, dict) else img
+            if src and src not in images:
+                images.append(src)
+        if not images and ld.get('image'):
+            images = ld['image'] if isinstance(ld['image'], list) else [ld['image']]
+
+        characteristics = self._characteristics_from_widget(widgets.get('webCharacteristics', {}))
+        description = ld.get('description', '')
+        if not characteristics or not description:
+            second = self._fetch_api_page(page, path, OZON_API_SECOND_PAGE)
+            if second:
+                second_widgets = self._decode_widget_states(second)
+                characteristics = characteristics or self._characteristics_from_widget(
+                    second_widgets.get('webCharacteristics', {}))
+                if not description:
+                    description = self._json_ld_from_api(second).get('description', '')
+
+        breadcrumbs = widgets.get('breadCrumbs', {}).get('breadcrumbs', []) or []
+        category = breadcrumbs[-1].get('text', '') if breadcrumbs and isinstance(breadcrumbs[-1], dict) else ''
+        in_stock = bool(price_widget.get('isAvailable', True)) and 'webOutOfStock' not in widgets
+
+        if not title or len(title) <= 3 or not price:
+            print(f"⚠️ Ozon API: Неполные данные (название: '{title}', цена: {price})")
+            return None
+
+        result = ProductRecord(
+            title=title,
+            price=price,
+            old_price=old_price if old_price > price else 0,
+            description=description,
+            category=category,
+            characteristics=characteristics,
+            images=images[:3],
+            in_stock=in_stock,
+        )
+        print(f"📦 Ozon API: Результат - название: '{result['title']}', цена: {result['price']}, изображений: {len(result['images'])}, характеристик: {len(result['characteristics'])}")
+        return result
 
     def _extract_product_data(self, page: Page) -> Dict[str, Any]:
-        """Извлекает данные товара из JS объектов на странице - улучшенная версия"""
-        
-        # Способ 1: JSON-LD данные (наиболее надежный способ)
+        """Извлекает данные товара, пробуя стратегии в выученном порядке (см. strategies.py)"""
+        product_data, self.product_data_strategy = self._run_strategies(
+            page, "product_data", self._product_data_strategies(), self._has_valid_product_data,
+            fallbacks=self._product_data_fallbacks())
+        return product_data
+
+    def _product_data_strategies(self) -> List[Tuple[str, Callable[[Page], Any]]]:
+        """Стратегии извлечения данных товара (JSON страницы) в исходном порядке"""
+        return [
+            ("json_ld", self._from_json_ld),
+            ("initial_state", self._from_initial_state),
+            ("app_state", self._from_app_state),
+            ("window_scan", self._from_window_scan),
+            ("json_scripts", self._from_json_scripts),
+        ]
+
+    def _product_data_fallbacks(self) -> List[Tuple[str, Callable[[Page], Any]]]:
+        """Разбор DOM после выученных стратегий, в фиксированном порядке (см. _run_strategies)"""
+        return [
+            ("dom_aggressive", self._extract_from_dom_aggressive),
+        ]
+
+    @staticmethod
+    def _has_valid_product_data(data: Any) -> bool:
+        return bool(data) and isinstance(data, dict) and bool(data.get("title"))
+
+    def _from_json_ld(self, page: Page) -> Optional[Dict[str, Any]]:
+        """JSON-LD данные (наиболее надежный способ)"""
         try:
             json_ld = page.evaluate("""
                 () => {
@@ -250,8 +431,10 @@ class OzonParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Ozon: Ошибка извлечения JSON-LD: {e}")
             pass
-        
-        # Способ 2: window.__INITIAL_STATE__ (Ozon изменил структуру!)
+        return None
+
+    def _from_initial_state(self, page: Page) -> Optional[Dict[str, Any]]:
+        """window.__INITIAL_STATE__ (Ozon изменил структуру!)"""
         try:
             initial_state = page.evaluate("""
                 () => {
@@ -288,8 +471,10 @@ class OzonParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Ozon: Ошибка извлечения __INITIAL_STATE__: {e}")
             pass
-        
-        # Способ 3: window.__APP_STATE__ (старый формат, на случай если еще используется)
+        return None
+
+    def _from_app_state(self, page: Page) -> Optional[Dict[str, Any]]:
+        """window.__APP_STATE__ (старый формат, на случай если еще используется)"""
         try:
             app_state = page.evaluate("""
                 () => {
@@ -323,8 +508,10 @@ class OzonParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Ozon: Ошибка извлечения __APP_STATE__: {e}")
             pass
-        
-        # Способ 4: Ищем в window любые объекты с product
+        return None
+
+    def _from_window_scan(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Ищем в window любые объекты с product"""
         try:
             any_product = page.evaluate("""
                 () => {
@@ -373,8 +560,10 @@ class OzonParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Ozon: Ошибка поиска product в window: {e}")
             pass
-        
-        # Способ 5: Ищем данные в скриптах с type="application/json"
+        return None
+
+    def _from_json_scripts(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Ищем данные в скриптах с type=application/json"""
         try:
             script_data = page.evaluate("""
                 () => {
@@ -408,174 +597,6 @@ class OzonParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Ozon: Ошибка поиска в скриптах: {e}")
             pass
-        
-        print("⚠️ Ozon: Не удалось найти данные в JS объектах, будет использован DOM fallback")
-        return None
-        
-        # Способ 3: Ищем данные в скриптах
-        try:
-            script_data = page.evaluate("""
-                () => {
-                    const scripts = document.querySelectorAll('script[type="application/json"]');
-                    for (const script of scripts) {
-                        try {
-                            const data = JSON.parse(script.textContent);
-                            if (data.product || data.widgetStates) {
-                                return data;
-                            }
-                        } catch (e) {}
-                    }
-                    return null;
-                }
-            """)
-            
-            if script_data:
-                if 'product' in script_data:
-                    return script_data['product']
-                # Пробуем извлечь из widgetStates
-                if 'widgetStates' in script_data:
-                    for key, value in script_data['widgetStates'].items():
-                        if isinstance(value, dict) and 'product' in value:
-                            return value['product']
-        except Exception:
-            pass
-        
-        # Способ 4: Из DOM элементов
-        try:
-            dom_data = page.evaluate("""
-                () => {
-                    const data = {};
-                    
-                    // Название - пробуем разные селекторы и проверяем на капчу
-                    const titleSelectors = [
-                        'h1',
-                        '[data-widget="webProductHeading"]',
-                        '.product-page__title',
-                        '[data-test-id="productTitle"]',
-                        'h1[itemprop="name"]',
-                        '[class*="product-title"]',
-                        '[class*="heading"]'
-                    ];
-                    for (const selector of titleSelectors) {
-                        const titleEl = document.querySelector(selector);
-                        if (titleEl) {
-                            const titleText = titleEl.textContent.trim();
-                            // Проверяем, что это не капча (более мягкая проверка)
-                            if (titleText && 
-                                titleText.length > 5 &&
-                                !(titleText.toLowerCase().includes('подтвердите') && titleText.toLowerCase().includes('бот'))) {
-                                data.title = titleText;
-                                break;
-                            }
-                        }
-                    }
-                    
-                    // Цена - пробуем разные селекторы
-                    const priceSelectors = [
-                        '[data-widget="webPrice"]',
-                        '.product-page__price',
-                        '[data-test-id="price-current"]',
-                        '[class*="price"]',
-                        '[itemprop="price"]',
-                        '.price'
-                    ];
-                    for (const selector of priceSelectors) {
-                        const priceEl = document.querySelector(selector);
-                        if (priceEl) {
-                            const priceText = priceEl.textContent.replace(/[^\\d]/g, '');
-                            if (priceText && priceText.length > 0) {
-                                data.price = parseInt(priceText);
-                                break;
-                            }
-                        }
-                    }
-                    
-                    // Старая цена
-                    const oldPriceSelectors = [
-                        '[data-test-id="price-old"]',
-                        '.product-page__price-old',
-                        '[class*="old-price"]',
-                        '[class*="price-old"]'
-                    ];
-                    for (const selector of oldPriceSelectors) {
-                        const oldPriceEl = document.querySelector(selector);
-                        if (oldPriceEl) {
-                            const oldPriceText = oldPriceEl.textContent.replace(/[^\\d]/g, '');
-                            if (oldPriceText && oldPriceText.length > 0) {
-                                data.oldPrice = parseInt(oldPriceText);
-                                break;
-                            }
-                        }
-                    }
-                    
-                    // Описание - пробуем разные селекторы
-                    const descSelectors = [
-                        '[data-widget="webProductDescription"]',
-                        '.product-page__description',
-                        '[data-test-id="productDescription"]',
-                        '[class*="description"]',
-                        '[itemprop="description"]',
-                        '.product-description'
-                    ];
-                    for (const selector of descSelectors) {
-                        const descEl = document.querySelector(selector);
-                        if (descEl) {
-                            const descText = descEl.textContent.trim() || descEl.innerText.trim();
-                            if (descText && descText.length > 10) {
-                                data.description = descText;
-                                break;
-                            }
-                        }
-                    }
-                    
-                    // Изображения - ищем оригинальные URL высокого качества
-                    const imgSelectors = [
-                        '[data-widget="webGallery"] img',
-                        '.product-page__gallery img',
-                        '.product-page__slider img',
-                        '[class*="gallery"] img',
-                        '[class*="slider"] img',
-                        '[class*="image"] img'
-                    ];
-                    const images = [];
-                    for (const selector of imgSelectors) {
-                        const imgEls = document.querySelectorAll(selector);
-                        if (imgEls.length > 0) {
-                            Array.from(imgEls).forEach(img => {
-                                // Пробуем разные атрибуты для получения оригинального URL
-                                let src = img.getAttribute('data-src') || 
-                                         img.getAttribute('data-original') ||
-                                         img.getAttribute('data-lazy') ||
-                                         img.src;
-                                // Убираем параметры размера для получения оригинального изображения
-                                if (src && src.includes('cdn')) {
-                                    src = src.split('?')[0]; // Убираем параметры
-                                    // Пробуем заменить размер на оригинальный
-                                        src = src.replace(/\\/w\\d+\\//g, '/w2000/').replace(/\\/h\\d+\\//g, '/h2000/');
-                                }
-                                if (src && !images.includes(src) && !src.includes('data:image') && src.startsWith('http')) {
-                                    images.push(src);
-                                }
-                            });
-                            if (images.length > 0) break;
-                        }
-                    }
-                    data.images = images.slice(0, 10);
-                    
-                    // Наличие
-                    const stockEl = document.querySelector('[data-test-id="stock-status"]') ||
-                                  document.querySelector('.product-page__stock');
-                    data.isAvailable = stockEl && !stockEl.textContent.toLowerCase().includes('нет в наличии');
-                    
-                    return data;
-                }
-            """)
-            
-            if dom_data and dom_data.get('title'):
-                return dom_data
-        except Exception:
-            pass
-        
         return None
 
     def _extract_price(self, product_data: Dict[str, Any]) -> float:
@@ -766,17 +787,6 @@ class OzonParser(MarketplaceParserInterface):
         
         return characteristics
 
-    def _extract_composition(self, product_data: Dict[str, Any]) -> str:
-        """Извлекает состав из характеристик"""
-        characteristics = self._extract_characteristics(product_data)
-        composition_keys = ["Состав", "Материал", "Composition", "Material", "Материалы"]
-        
-        for key in composition_keys:
-            if key in characteristics:
-                return str(characteristics[key])
-        
-        return ""
-
     def _extract_images(self, product_data: Dict[str, Any], page: Page) -> list[str]:
         """Извлекает изображения товара"""
         images = []
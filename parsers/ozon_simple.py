@@ -7,48 +7,48 @@ import random
 import re
 from typing import Dict, Any
 from .base import MarketplaceParserInterface
+from .errors import ParseTimeoutError, ParserError, StructureChangedError
+from .record import ProductRecord
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
 
 class OzonParserSimple(MarketplaceParserInterface):
     """Упрощенный парсер Ozon с улучшенной надежностью"""
-    
-    def parse(self) -> Dict[str, Any]:
+
+    marketplace = "ozon"
+    marketplace_name = "Ozon"
+
+    def parse(self) -> ProductRecord:
         playwright = None
         browser = None
         try:
             playwright, browser, page = self._get_browser_page()
             
-            # Убираем параметры из URL
-            clean_url = self.url.split('?')[0]
+            # URL уже канонический: без параметров (они провоцируют капчу и не влияют на товар)
+            clean_url = self.url
             
-            # Открываем страницу
-            page.goto(clean_url, wait_until='networkidle', timeout=self.timeout)
+            # Открываем страницу и сразу проверяем на капчу
+            self._open_product_page(page, clean_url)
             self._wait_for_page_load(page)
             
-            # Проверка на капчу
-            page_url = page.url.lower()
-            page_title = page.title().lower()
-            if 'captcha' in page_url or 'challenge' in page_url or ('бот' in page_title and 'подтвердите' in page_title):
-                raise ValueError("Обнаружена капча на Ozon. Попробуйте позже.")
-            
             # Извлекаем данные
             result = self._extract_data(page)
             
             if not result.get("title") or len(result["title"]) < 3:
-                raise ValueError("Не удалось извлечь название товара с Ozon")
+                raise StructureChangedError("Ozon", "Не удалось извлечь название товара с Ozon")
             
-            return result
+            # Состав вычисляется в ProductRecord из характеристик
+            return ProductRecord.from_dict(result)
             
+        except ParserError:
+            # Типизированные ошибки (капча, отмена) отдаем как есть
+            raise
         except PlaywrightTimeoutError:
-            raise ValueError("Превышено время ожидания загрузки страницы Ozon")
+            raise ParseTimeoutError("Ozon")
         except Exception as e:
             raise ValueError(f"Ошибка при парсинге Ozon: {str(e)}")
         finally:
-            if browser:
-                browser.close()
-            if playwright:
-                playwright.stop()
+            self._close_browser(playwright, browser)
     
     def _extract_data(self, page: Page) -> Dict[str, Any]:
         """Извлекает данные товара"""
@@ -258,11 +258,4 @@ class OzonParserSimple(MarketplaceParserInterface):
                 if not result["description"] and dom_data.get("description"):
                     result["description"] = dom_data["description"]
         
-        # Извлекаем состав из характеристик
-        composition_keys = ["Состав", "Материал", "Composition", "Material"]
-        for key in composition_keys:
-            if key in result["characteristics"]:
-                result["composition"] = result["characteristics"][key]
-                break
-        
         return result
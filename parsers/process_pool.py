@@ -0,0 +1,374 @@
+"""
+Пул процессов парсинга: изоляция падений Chromium/драйвера и все ядра CPU.
+
+PARSE_PROCESSES=N - парсинг выполняют N процессов-воркеров (0 - выключено).
+Каждый воркер держит свой прогретый Playwright с закрепленным браузером
+(см. browsers.py) и получает задачи (канонический URL и параметры) по своему
+каналу. Результат возвращается компактной записью: JSON-байты ProductRecord
+(record.dumps), ошибки - типом и аргументами (капча остается капчей).
+С progress задачи группы полей, полученные парсером (base.PROGRESS_GROUPS),
+приходят от воркера по мере извлечения - для /api/parse/stream.
+
+Падение воркера (segfault Chromium, зависший драйвер, OOM killer) не задевает
+сервер: задача воркера завершается ошибкой, воркер заменяется новым. Задача,
+не завершенная за PARSE_PROCESS_TIMEOUT секунд, снимается вместе с воркером:
+кооперативно отменить парсинг в другом процессе нельзя, а сироту-браузер
+уберет сторож браузеров (метка браузера содержит pid завершенного воркера).
+"""
+import atexit
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .errors import ERROR_KINDS, CaptchaDetectedError, ParserError
+from .record import dumps, loads
+
+DEFAULT_TIMEOUT = 120.0
+WARM_TIMEOUT = 120.0
+# Период проверки живости воркеров, когда событий нет
+POLL_INTERVAL = 1.0
+
+
+def pool_processes() -> int:
+    return int(os.environ.get('PARSE_PROCESSES', 0))
+
+
+def pool_timeout() -> float:
+    return float(os.environ.get('PARSE_PROCESS_TIMEOUT', DEFAULT_TIMEOUT))
+
+
+def _error_message(error: BaseException) -> tuple:
+    """Ошибка воркера в виде, который переживает передачу между процессами"""
+    if isinstance(error, CaptchaDetectedError):
+        return ('captcha', error.marketplace, error.signal)
+    if isinstance(error, ParserError) and error.kind in ERROR_KINDS:
+        # Класс отказа сохраняется: по нему API выставляет error_type
+        return ('typed', error.kind, error.marketplace, str(error))
+    if isinstance(error, ValueError):
+        return ('value', str(error))
+    return ('internal', f"{type(error).__name__}: {error}")
+
+
+def _raise_error(payload: tuple) -> None:
+    kind, *args = payload
+    if kind == 'captcha':
+        raise CaptchaDetectedError(*args)
+    if kind == 'typed':
+        error_kind, marketplace, message = args
+        raise ERROR_KINDS[error_kind](marketplace, message)
+    if kind == 'value':
+        raise ValueError(args[0])
+    raise RuntimeError(args[0])
+
+
+def _worker_main(conn, warm_marketplaces: Optional[List[str]]) -> None:
+    """Процесс-воркер: свой Playwright с браузером, задачи по одной из conn"""
+    # Ctrl+C обрабатывает родитель, он же останавливает воркеры
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from . import get_parser
+    from .browsers import browser_watchdog
+    from .profiles import get_profile
+
+    browser_watchdog.pin_thread()
+    # Прогресс может прийти из потоков страховочного запуска (hedging.py) - канал общий
+    send_lock = threading.Lock()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    pages, error = None, None
+    if warm_marketplaces is not None:
+        from .warmup import warm_browser
+        try:
+            pages = warm_browser(warm_marketplaces, keep=True)
+        except Exception as e:
+            error = str(e)
+    send(('ready', pages, error))
+
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            task_id, url, options = message
+            try:
+                parser = get_parser(url, implementation=options.get('implementation'), hedge=options.get('hedge'))
+                if options.get('profile'):
+                    parser.profile = get_profile(options['profile'], parser.marketplace)
+                if options.get('variants') and hasattr(parser, 'include_variants'):
+                    parser.include_variants = True
+                parser.deadline = options.get('deadline')
+                if options.get('progress'):
+                    parser.progress = (lambda group, fields, strategy, task_id=task_id:
+                                       send(('progress', task_id, (group, fields, strategy))))
+                send(('ok', task_id, dumps(parser.parse())))
+            except Exception as e:
+                send(('error', task_id, _error_message(e)))
+    finally:
+        browser_watchdog.close_thread_browser()
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.warm = False
+        # (id задачи, future, начало, progress) - задача, выполняемая сейчас
+        self.task = None
+        self.completed = 0
+
+
+class ProcessParsePool:
+    """Процессы-воркеры парсинга с автоматической заменой упавших"""
+
+    def __init__(self, processes: int = None):
+        self.processes = max(1, processes if processes is not None else pool_processes())
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._pending: deque = deque()
+        self._workers: List[_Worker] = []
+        self._task_ids = itertools.count(1)
+        self._wake_recv, self._wake_send = self._context.Pipe(duplex=False)
+        self._dispatcher = None
+        self._stopping = False
+        self._warm_marketplaces = None
+        self._warm_attempts = 0
+        self._warm_done = threading.Event()
+        self.warm_workers = 0
+        self.warm_pages: Dict[str, Dict[str, Any]] = {}
+        self.completed = 0
+        self.failed = 0
+        self.crashed = 0
+        self.timed_out = 0
+
+    def start(self, warm_marketplaces: Optional[List[str]] = None) -> None:
+        """Запускает воркеры (повторный вызов ничего не делает); warm_marketplaces - прогрев (warmup.py)"""
+        with self._lock:
+            if self._dispatcher is not None:
+                return
+            self._warm_marketplaces = warm_marketplaces
+            if warm_marketplaces is None:
+                self._warm_done.set()
+            self._workers = [self._spawn() for _ in range(self.processes)]
+            self._dispatcher = threading.Thread(target=self._dispatch, name='parse-pool', daemon=True)
+            self._dispatcher.start()
+        atexit.register(self.shutdown)
+        print(f"🧩 Пул процессов парсинга: {self.processes}")
+
+    def wait_warm(self, timeout: float = WARM_TIMEOUT) -> Dict[str, Dict[str, Any]]:
+        self._warm_done.wait(timeout)
+        return self.warm_pages
+
+    def submit(self, url: str, progress: Optional[Callable[[str, dict, Optional[str]], None]] = None,
+               **options: Any) -> Future:
+        """
+        Задача парсинга: URL (лучше канонический) и параметры implementation, hedge, profile, variants.
+        progress(group, fields, strategy) вызывается в потоке диспетчера по мере получения групп полей
+        """
+        self.start()
+        future: Future = Future()
+        if progress is not None:
+            options = dict(options, progress=True)
+        with self._lock:
+            self._pending.append((next(self._task_ids), url, options, future, progress))
+        self._wake()
+        return future
+
+    def parse(self, url: str, timeout: float = None, **options: Any) -> Dict[str, Any]:
+        timeout = pool_timeout() if timeout is None else timeout
+        # Срок задачи передается воркеру: повторы парсинга (retry.py) укладываются в него
+        options.setdefault('deadline', time.time() + timeout)
+        future = self.submit(url, **options)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.abort(future)
+            with self._lock:
+                self.timed_out += 1
+            raise ValueError(f"Парсинг не завершился за {timeout:g}s (пул процессов)")
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self._warm_marketplaces),
+                                        name='parse-worker', daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _wake(self) -> None:
+        with self._lock:
+            self._wake_send.send(None)
+
+    def abort(self, future: Future) -> None:
+        """Снимает задачу: из очереди - отменой, выполняемую - завершением воркера (диспетчер заменит его)"""
+        if future.cancel():
+            return
+        with self._lock:
+            for worker in self._workers:
+                if worker.task and worker.task[1] is future:
+                    worker.process.kill()
+
+    def _dispatch(self) -> None:
+        while not self._stopping:
+            self._assign()
+            with self._lock:
+                workers = list(self._workers)
+            waitables = [self._wake_recv] + [w.conn for w in workers] + [w.process.sentinel for w in workers]
+            for ready in wait(waitables, timeout=POLL_INTERVAL):
+                if ready is self._wake_recv:
+                    self._wake_recv.recv()
+            for worker in workers:
+                self._drain(worker)
+            for worker in workers:
+                if not worker.process.is_alive():
+                    self._replace(worker)
+
+    def _assign(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                while worker.ready and worker.task is None and self._pending:
+                    pending = self._pending.popleft()
+                    task_id, url, options, future, progress = pending
+                    # Задача, возвращенная в очередь после неудачной отправки, уже running
+                    if not future.running() and not future.set_running_or_notify_cancel():
+                        continue
+                    worker.task = (task_id, future, time.time(), progress)
+                    try:
+                        worker.conn.send((task_id, url, options))
+                    except (OSError, ValueError):
+                        # Воркер умер до отправки: задача до него не дошла - возвращаем ее в начало
+                        # очереди, воркер больше не получает задач до замены (_replace)
+                        worker.task = None
+                        worker.ready = False
+                        self._pending.appendleft(pending)
+
+    def _drain(self, worker: _Worker) -> None:
+        """Читает все сообщения воркера"""
+        while True:
+            try:
+                if not worker.conn.poll():
+                    return
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                return
+            kind = message[0]
+            if kind == 'ready':
+                self._on_ready(worker, message[1], message[2])
+                continue
+            _, task_id, payload = message
+            if kind == 'progress':
+                task = worker.task
+                if task is not None and task[0] == task_id and task[3] is not None:
+                    try:
+                        task[3](*payload)
+                    except Exception as e:
+                        print(f"⚠️ Пул процессов: подписчик прогресса упал: {e}")
+                continue
+            with self._lock:
+                task, worker.task = worker.task, None
+            if task is None or task[0] != task_id:
+                continue
+            future = task[1]
+            if kind == 'ok':
+                with self._lock:
+                    self.completed += 1
+                    worker.completed += 1
+                future.set_result(loads(payload))
+            else:
+                with self._lock:
+                    self.failed += 1
+                try:
+                    _raise_error(payload)
+                except Exception as e:
+                    future.set_exception(e)
+
+    def _on_ready(self, worker: _Worker, pages: Optional[dict], error: Optional[str]) -> None:
+        with self._lock:
+            worker.ready = True
+            if self._warm_marketplaces is not None and not self._warm_done.is_set():
+                self._warm_attempts += 1
+                if error is None:
+                    self.warm_workers += 1
+                    self.warm_pages = self.warm_pages or pages or {}
+                else:
+                    print(f"⚠️ Воркер {worker.process.pid}: браузер не прогрелся: {error}")
+                if self._warm_attempts >= self.processes:
+                    self._warm_done.set()
+            worker.warm = error is None and self._warm_marketplaces is not None
+
+    def _replace(self, worker: _Worker) -> None:
+        exitcode = worker.process.exitcode
+        with self._lock:
+            if self._stopping or worker not in self._workers:
+                return
+            task, worker.task = worker.task, None
+            self.crashed += 1
+            self._workers[self._workers.index(worker)] = replacement = self._spawn()
+            if not worker.ready and self._warm_marketplaces is not None and not self._warm_done.is_set():
+                # Воркер упал еще при прогреве: попытка засчитывается, иначе прогрев ждал бы до таймаута
+                self._warm_attempts += 1
+                if self._warm_attempts >= self.processes:
+                    self._warm_done.set()
+        worker.conn.close()
+        print(f"💥 Воркер {worker.process.pid} завершился (код {exitcode}), "
+              f"запущен новый: {replacement.process.pid}")
+        if task is not None and not task[1].done():
+            with self._lock:
+                self.failed += 1
+            task[1].set_exception(RuntimeError(
+                f"Процесс парсинга завершился аварийно (код {exitcode}) во время задачи {task[0]}"))
+
+    def shutdown(self) -> None:
+        """Останавливает воркеры: просьба завершиться, затем terminate"""
+        with self._lock:
+            if self._stopping or self._dispatcher is None:
+                return
+            self._stopping = True
+            workers = list(self._workers)
+            pending, self._pending = list(self._pending), deque()
+        for _, _, _, future, _ in pending:
+            future.cancel()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'alive': sum(1 for w in self._workers if w.process.is_alive()),
+                'ready': sum(1 for w in self._workers if w.ready),
+                'warm': self.warm_workers,
+                'busy': sum(1 for w in self._workers if w.task is not None),
+                'queued': len(self._pending),
+                'completed': self.completed,
+                'failed': self.failed,
+                'crashed': self.crashed,
+                'timed_out': self.timed_out,
+                'workers': [{
+                    'pid': w.process.pid,
+                    'ready': w.ready,
+                    'warm': w.warm,
+                    'completed': w.completed,
+                    'task_s': round(now - w.task[2], 1) if w.task else None,
+                } for w in self._workers],
+            }
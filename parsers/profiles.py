@@ -0,0 +1,163 @@
+"""
+Профили браузерного контекста для парсинга.
+
+desktop - прежний режим (1920x1080, десктопный Chrome).
+mobile  - облегченный режим: мобильный viewport, touch, мобильный UA,
+          мобильный домен там, где он есть, и без загрузки картинок,
+          шрифтов и видео (ссылки на изображения остаются в DOM и данных).
+
+Отпечаток (fingerprint) - вариация профиля: user agent, viewport и язык.
+Повторный парсинг после капчи идет с другим отпечатком (см. retry.py);
+отпечаток 0 - базовый профиль.
+"""
+import os
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+DESKTOP_USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36')
+MOBILE_USER_AGENT = ('Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 '
+                     '(KHTML, like Gecko) Chrome/130.0.0.0 Mobile Safari/537.36')
+
+MOBILE_BLOCKED_RESOURCES = ('image', 'media', 'font')
+
+# Вариации отпечатка: десктопные user agent и разрешения экрана
+DESKTOP_USER_AGENTS = (
+    DESKTOP_USER_AGENT,
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36',
+)
+DESKTOP_VIEWPORTS = (
+    {'width': 1920, 'height': 1080},
+    {'width': 1536, 'height': 864},
+    {'width': 1440, 'height': 900},
+    {'width': 1366, 'height': 768},
+)
+# Мобильные устройства: user agent, viewport и плотность пикселей согласованы
+MOBILE_DEVICES = (
+    (MOBILE_USER_AGENT, {'width': 412, 'height': 915}, 2.625),
+    ('Mozilla/5.0 (Linux; Android 14; SM-S911B) AppleWebKit/537.36 '
+     '(KHTML, like Gecko) Chrome/130.0.0.0 Mobile Safari/537.36', {'width': 360, 'height': 780}, 3),
+    ('Mozilla/5.0 (Linux; Android 13; 23021RAAEG) AppleWebKit/537.36 '
+     '(KHTML, like Gecko) Chrome/129.0.0.0 Mobile Safari/537.36', {'width': 393, 'height': 873}, 2.75),
+)
+# Язык: locale контекста, заголовок Accept-Language и navigator.languages
+LOCALES = (
+    ('ru-RU', 'ru-RU,ru;q=0.9,en;q=0.8', ('ru-RU', 'ru', 'en-US', 'en')),
+    ('ru', 'ru,en-US;q=0.9,en;q=0.8', ('ru', 'en-US', 'en')),
+    ('ru-RU', 'ru-RU,ru;q=0.9', ('ru-RU', 'ru')),
+)
+
+
+class BrowserProfile:
+    """Параметры контекста браузера и правила переписывания URL"""
+
+    def __init__(self, name: str, viewport: Dict[str, int], user_agent: str, is_mobile: bool = False,
+                 has_touch: bool = False, device_scale_factor: float = 1,
+                 hosts: Optional[Dict[str, str]] = None, blocked_resources: Tuple[str, ...] = (),
+                 locale: Tuple[str, str, Tuple[str, ...]] = LOCALES[0], fingerprint: int = 0):
+        self.name = name
+        self.viewport = viewport
+        self.user_agent = user_agent
+        self.is_mobile = is_mobile
+        self.has_touch = has_touch
+        self.device_scale_factor = device_scale_factor
+        # Десктопный хост -> мобильный хост
+        self.hosts = hosts or {}
+        self.blocked_resources = blocked_resources
+        self.locale, self.accept_language, self.languages = locale
+        self.fingerprint = fingerprint
+
+    def context_options(self) -> Dict[str, Any]:
+        """Аргументы browser.new_context() для профиля"""
+        return {
+            'viewport': self.viewport,
+            'user_agent': self.user_agent,
+            'is_mobile': self.is_mobile,
+            'has_touch': self.has_touch,
+            'device_scale_factor': self.device_scale_factor,
+            'locale': self.locale,
+        }
+
+    def with_fingerprint(self, fingerprint: int) -> 'BrowserProfile':
+        """
+        Тот же профиль (имя, хосты, блокировки) с другим отпечатком: user agent, viewport и язык.
+        Имя не меняется - порядок стратегий по-прежнему учится по профилю
+        """
+        if fingerprint == self.fingerprint:
+            return self
+        if self.is_mobile:
+            user_agent, viewport, scale = MOBILE_DEVICES[fingerprint % len(MOBILE_DEVICES)]
+        else:
+            user_agent = DESKTOP_USER_AGENTS[fingerprint % len(DESKTOP_USER_AGENTS)]
+            viewport = DESKTOP_VIEWPORTS[fingerprint % len(DESKTOP_VIEWPORTS)]
+            scale = self.device_scale_factor
+        return BrowserProfile(
+            name=self.name,
+            viewport=viewport,
+            user_agent=user_agent,
+            is_mobile=self.is_mobile,
+            has_touch=self.has_touch,
+            device_scale_factor=scale,
+            hosts=self.hosts,
+            blocked_resources=self.blocked_resources,
+            locale=LOCALES[fingerprint % len(LOCALES)],
+            fingerprint=fingerprint,
+        )
+
+    def rewrite_url(self, url: str) -> str:
+        """Переводит ссылку на мобильный домен маркетплейса, если он есть"""
+        if not self.hosts:
+            return url
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+        mobile_host = self.hosts.get(host) or self.hosts.get(host.replace('www.', '', 1))
+        if not mobile_host:
+            return url
+        return urlunsplit(parts._replace(netloc=mobile_host))
+
+    def __repr__(self) -> str:
+        if self.fingerprint:
+            return f"BrowserProfile({self.name!r}, fingerprint={self.fingerprint})"
+        return f"BrowserProfile({self.name!r})"
+
+
+DESKTOP_PROFILE = BrowserProfile(
+    name='desktop',
+    viewport={'width': 1920, 'height': 1080},
+    user_agent=DESKTOP_USER_AGENT,
+)
+
+
+def _mobile_profile(hosts: Optional[Dict[str, str]] = None) -> BrowserProfile:
+    return BrowserProfile(
+        name='mobile',
+        viewport={'width': 412, 'height': 915},
+        user_agent=MOBILE_USER_AGENT,
+        is_mobile=True,
+        has_touch=True,
+        device_scale_factor=2.625,
+        hosts=hosts,
+        blocked_resources=MOBILE_BLOCKED_RESOURCES,
+    )
+
+
+# Wildberries и Ozon отдают адаптивную верстку на том же домене по мобильному UA,
+# у Яндекс Маркета есть отдельная легкая мобильная версия
+MOBILE_PROFILES = {
+    'wb': _mobile_profile(),
+    'ozon': _mobile_profile(),
+    'ym': _mobile_profile({'market.yandex.ru': 'm.market.yandex.ru'}),
+}
+
+PROFILE_NAMES = ('desktop', 'mobile')
+
+
+def get_profile(name: Optional[str] = None, marketplace: str = '') -> BrowserProfile:
+    """Профиль по имени (по умолчанию из PARSER_PROFILE) для маркетплейса"""
+    name = (name or os.environ.get('PARSER_PROFILE', 'desktop')).lower()
+    if name == 'desktop':
+        return DESKTOP_PROFILE
+    if name == 'mobile':
+        return MOBILE_PROFILES.get(marketplace) or _mobile_profile()
+    raise ValueError(f"Неизвестный профиль парсинга: {name}. Доступны: {', '.join(PROFILE_NAMES)}")
@@ -0,0 +1,149 @@
+"""
+Типизированный результат парсинга товара и быстрая JSON-сериализация.
+"""
+import json
+import sys
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional, Iterator
+
+try:
+    import orjson
+except ImportError:  # orjson опционален, без него используем стандартный json
+    orjson = None
+
+COMPOSITION_KEYS = ("Состав", "Материал", "Composition", "Material", "Материалы")
+
+
+def intern_characteristics(characteristics: Optional[Dict[Any, Any]]) -> Dict[str, str]:
+    """Нормализует характеристики: строковые значения, интернированные ключи (повторяются у всех товаров)"""
+    if not characteristics:
+        return {}
+    return {
+        sys.intern(str(name).strip()): str(value)
+        for name, value in characteristics.items()
+        if name and value not in (None, "")
+    }
+
+
+def derive_composition(characteristics: Dict[str, str]) -> str:
+    """Извлекает состав из уже собранных характеристик"""
+    for key in COMPOSITION_KEYS:
+        if key in characteristics:
+            return str(characteristics[key])
+    return ""
+
+
+class ProductRecord(Mapping):
+    """
+    Результат парсинга товара.
+
+    Mapping (get, [], in, keys, values, items, итерация, len) плюс запись через []
+    для совместимости с кодом, который работает с результатами парсеров как со словарями.
+    """
+
+    FIELDS = ("title", "price", "old_price", "description", "category",
+              "characteristics", "composition", "images", "in_stock")
+
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, title: str = "", price: float = 0, old_price: float = 0, description: str = "",
+                 category: str = "", characteristics: Optional[Dict[str, str]] = None,
+                 composition: Optional[str] = None, images: Optional[List[str]] = None,
+                 in_stock: bool = True, extra: Optional[Dict[str, Any]] = None):
+        self.title = title or ""
+        self.price = price or 0
+        self.old_price = old_price or 0
+        self.description = description or ""
+        self.category = category or ""
+        self.characteristics = intern_characteristics(characteristics)
+        # Состав вычисляется один раз из характеристик, если парсер не передал его явно
+        self.composition = composition if composition else derive_composition(self.characteristics)
+        self.images = list(images) if images else []
+        self.in_stock = bool(in_stock)
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProductRecord":
+        known = {field: data[field] for field in cls.FIELDS if field in data}
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS}
+        return cls(extra=extra, **known)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "title": self.title,
+            "price": self.price,
+            "old_price": self.old_price,
+            "description": self.description,
+            "category": self.category,
+            "characteristics": self.characteristics,
+            "composition": self.composition,
+            "images": self.images,
+            "in_stock": self.in_stock,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    # dict-подобный интерфейс
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self.FIELDS:
+            setattr(self, key, value)
+            return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.FIELDS
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return len(self.FIELDS) + len(self.extra or ())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ProductRecord):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ProductRecord(title={self.title!r}, price={self.price!r}, images={len(self.images)})"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ProductRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Сериализует в JSON (UTF-8 bytes). ProductRecord сериализуется без промежуточных копий в orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
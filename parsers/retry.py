@@ -0,0 +1,165 @@
+"""
+Повторы парсинга по классам отказов: отступ с джиттером и смена отпечатка.
+
+PARSE_RETRIES=N - до N повторов после отказа (0 - выключено). Класс отказа
+берется из типа ошибки (errors.py), у каждого класса своя политика:
+- captcha   - длинный экспоненциальный отступ, новый отпечаток браузера
+              (user agent, viewport, язык - см. profiles.py);
+- timeout   - короткий отступ, отпечаток тот же (медленная сеть или страница);
+- structure - данные не найдены или результат неполный: короткий отступ,
+              новый отпечаток (другой UA - часто другая верстка);
+- not_found - не повторяется: товара нет.
+Отступ растет отдельно по каждому классу: base * 2^n, не больше cap, из
+которых половина случайна (джиттер разносит повторы параллельных запросов).
+
+Повторы укладываются в срок запроса: парсер с deadline (его ставят
+исполнитель, пул процессов и поток SSE - по своему таймауту) или
+PARSE_RETRY_DEADLINE секунд от начала. Повтор не начинается, если отступ
+плюс длительность прошлой попытки выходят за срок - вызывающий получает
+последнюю ошибку (или неполный результат) вовремя.
+
+Подписчику progress перед повтором приходит группа PROGRESS_RESET
+({'attempt': номер следующей попытки, 'reason': класс отказа}): группы
+полей неудавшейся попытки к результату не относятся.
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Dict
+
+from .base import PROGRESS_RESET, MarketplaceParserInterface, ParserWrapper
+from .errors import ParserError
+from .record import ProductRecord
+from .selection import is_complete
+
+DEFAULT_RETRY_DEADLINE = 90.0
+
+
+class RetryPolicy:
+    """Политика класса отказа: сколько повторов и какой отступ"""
+
+    def __init__(self, retries: int, base: float, cap: float, rotate: bool):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        # Повторять с другим отпечатком браузера
+        self.rotate = rotate
+
+    def delay(self, failures: int) -> float:
+        """Отступ перед повтором после failures-го отказа класса (с 1): половина - джиттер"""
+        ceiling = min(self.cap, self.base * 2 ** (failures - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+RETRY_POLICIES = {
+    'captcha': RetryPolicy(retries=2, base=8.0, cap=40.0, rotate=True),
+    'timeout': RetryPolicy(retries=2, base=2.0, cap=10.0, rotate=False),
+    'structure': RetryPolicy(retries=1, base=1.0, cap=5.0, rotate=True),
+    'not_found': RetryPolicy(retries=0, base=0.0, cap=0.0, rotate=False),
+}
+
+
+def retry_attempts() -> int:
+    return int(os.environ.get('PARSE_RETRIES', 0))
+
+
+def retry_deadline() -> float:
+    return float(os.environ.get('PARSE_RETRY_DEADLINE', DEFAULT_RETRY_DEADLINE))
+
+
+def failure_kind(error: BaseException) -> str:
+    """Класс отказа ошибки ('' - не повторяется: отмена, неподдерживаемый URL, внутренняя ошибка)"""
+    return error.kind if isinstance(error, ParserError) else ''
+
+
+class RetryStats:
+    """Повторы по маркетплейсам: по классам отказов, спасенные парсинги и остановки по сроку"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, marketplace: str, retries: Dict[str, int], recovered: bool, out_of_budget: bool) -> None:
+        """retries - число повторов по классам отказов в одном парсинге"""
+        with self._lock:
+            counters = self._counters.setdefault(
+                marketplace, {'parses': 0, 'retried': 0, 'recovered': 0, 'out_of_budget': 0, 'retries': {}})
+            counters['parses'] += 1
+            if sum(retries.values()):
+                counters['retried'] += 1
+            if recovered:
+                counters['recovered'] += 1
+            if out_of_budget:
+                counters['out_of_budget'] += 1
+            for kind, count in retries.items():
+                counters['retries'][kind] = counters['retries'].get(kind, 0) + count
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {marketplace: dict(counters, retries=dict(counters['retries']))
+                    for marketplace, counters in self._counters.items()}
+
+
+retry_stats = RetryStats()
+
+
+class RetryingParser(ParserWrapper):
+    """Повторяет парсинг по политике класса отказа в пределах срока запроса"""
+
+    def __init__(self, parser: MarketplaceParserInterface, retries: int = None):
+        super().__init__(parser)
+        self.retries = retry_attempts() if retries is None else retries
+
+    def parse(self) -> ProductRecord:
+        deadline = self.deadline or time.time() + retry_deadline()
+        profile = self.profile
+        failures: Dict[str, int] = {}
+        fingerprint = 0
+        recovered = out_of_budget = False
+        try:
+            for attempt in range(self.retries + 1):
+                attempt_start = time.time()
+                try:
+                    result = self.parser.parse()
+                except ParserError as e:
+                    error, kind = e, failure_kind(e)
+                else:
+                    if is_complete(result):
+                        recovered = bool(failures)
+                        return result
+                    error, kind = None, 'structure'
+
+                policy = RETRY_POLICIES.get(kind)
+                if attempt == self.retries or policy is None or failures.get(kind, 0) >= policy.retries:
+                    break
+                delay = policy.delay(failures.get(kind, 0) + 1)
+                # Следующая попытка займет примерно столько же, сколько прошлая
+                if time.time() + delay + (time.time() - attempt_start) > deadline:
+                    out_of_budget = True
+                    print(f"⏳ {self.marketplace_name}: Повтор после отказа '{kind}' не уложится в срок запроса")
+                    break
+                failures[kind] = failures.get(kind, 0) + 1
+                if policy.rotate:
+                    fingerprint += 1
+                    self.profile = profile.with_fingerprint(fingerprint)
+                print(f"🔁 {self.marketplace_name}: Отказ '{kind}', повтор {attempt + 1}/{self.retries} "
+                      f"через {delay:.1f}с (отпечаток {fingerprint})")
+                self._reset_progress(attempt + 2, kind)
+                self._sleep(delay)
+
+            if error is not None:
+                raise error
+            return result
+        finally:
+            self.profile = profile
+            retry_stats.record(self.marketplace, failures, recovered, out_of_budget)
+
+    def _reset_progress(self, attempt: int, kind: str) -> None:
+        """Сообщает подписчику прогресса, что группы прошлой попытки недействительны"""
+        if self.progress is None:
+            return
+        try:
+            self.progress(PROGRESS_RESET, {"attempt": attempt, "reason": kind}, None)
+        except Exception as e:
+            print(f"⚠️ {self.marketplace_name}: Подписчик прогресса упал: {e}")
@@ -0,0 +1,123 @@
+"""
+Выбор реализации парсера (полная или упрощенная) по живой статистике.
+
+Для каждого маркетплейса учитывается, как часто и как быстро каждая
+реализация дает полный результат (название и цена). Статистика и порядок
+ведутся в той же скользящей StrategyStats, что и стратегии извлечения
+(этап 'parser'), поэтому видны в GET /api/strategies.
+
+Ручное закрепление по маркетплейсу: PARSER_OVERRIDE=wb:simple,ozon:full.
+USE_SIMPLE_PARSERS=true закрепляет упрощенные парсеры для всех маркетплейсов.
+
+Модули реализаций импортируются при первом использовании (parser_class):
+импорт любого из них тянет Playwright, а серверу нужны не все сразу.
+"""
+import importlib
+import os
+import time
+from typing import Dict, Any, Iterable, List, Optional, Type
+
+from .base import MarketplaceParserInterface, ParserWrapper
+from .errors import CaptchaDetectedError, ParseCancelledError
+from .record import ProductRecord
+from .strategies import strategy_stats
+from .urls import ProductIdentity
+
+SELECTION_STAGE = 'parser'
+IMPLEMENTATION_FULL = 'full'
+IMPLEMENTATION_SIMPLE = 'simple'
+
+# Маркетплейс -> реализация -> '<модуль пакета>:<класс>'
+IMPLEMENTATIONS: Dict[str, Dict[str, str]] = {
+    'wb': {IMPLEMENTATION_FULL: 'wildberries:WildberriesParser',
+           IMPLEMENTATION_SIMPLE: 'wildberries_simple:WildberriesParserSimple'},
+    'ozon': {IMPLEMENTATION_FULL: 'ozon:OzonParser',
+             IMPLEMENTATION_SIMPLE: 'ozon_simple:OzonParserSimple'},
+    'ym': {IMPLEMENTATION_FULL: 'yandex_market:YandexMarketParser',
+           IMPLEMENTATION_SIMPLE: 'yandex_market_simple:YandexMarketParserSimple'},
+}
+
+_loaded_classes: Dict[str, Type[MarketplaceParserInterface]] = {}
+
+
+def parser_class(marketplace: str, implementation: str) -> Type[MarketplaceParserInterface]:
+    """Класс реализации; модуль импортируется при первом обращении"""
+    path = IMPLEMENTATIONS[marketplace][implementation]
+    cls = _loaded_classes.get(path)
+    if cls is None:
+        module_name, _, class_name = path.partition(':')
+        cls = getattr(importlib.import_module(f".{module_name}", __package__), class_name)
+        _loaded_classes[path] = cls
+    return cls
+
+
+def load_implementations(marketplaces: Optional[Iterable[str]] = None) -> List[str]:
+    """Заранее импортирует реализации маркетплейсов (прогрев); возвращает загруженные пути"""
+    for marketplace in marketplaces or IMPLEMENTATIONS:
+        for implementation in IMPLEMENTATIONS.get(marketplace, {}):
+            parser_class(marketplace, implementation)
+    return sorted(_loaded_classes)
+
+
+def is_complete(result: Any) -> bool:
+    """Полный результат: есть название и цена"""
+    return bool(result) and bool(result.get('title')) and bool(result.get('price'))
+
+
+def parser_overrides() -> Dict[str, str]:
+    """Ручной выбор реализации по маркетплейсам"""
+    overrides = {}
+    if os.environ.get('USE_SIMPLE_PARSERS', 'false').lower() == 'true':
+        overrides = {marketplace: IMPLEMENTATION_SIMPLE for marketplace in IMPLEMENTATIONS}
+    for item in os.environ.get('PARSER_OVERRIDE', '').split(','):
+        marketplace, _, implementation = item.strip().partition(':')
+        if marketplace and implementation:
+            overrides[marketplace.strip()] = implementation.strip()
+    return overrides
+
+
+def implementation_names(marketplace: str) -> List[str]:
+    return list(IMPLEMENTATIONS.get(marketplace, {}))
+
+
+def alternate_implementation(marketplace: str, implementation: str) -> str:
+    """Другая реализация маркетплейса (для хеджирования) или None"""
+    return next((name for name in implementation_names(marketplace) if name != implementation), None)
+
+
+def choose_implementation(marketplace: str) -> str:
+    """Закрепленная вручную реализация или текущая лучшая по статистике"""
+    available = implementation_names(marketplace)
+    override = parser_overrides().get(marketplace)
+    if override in available:
+        return override
+    return strategy_stats.order(marketplace, SELECTION_STAGE, available)[0]
+
+
+class TrackedParser(ParserWrapper):
+    """Замеряет время и полноту результата реализации и пишет их в статистику выбора"""
+
+    def __init__(self, parser: MarketplaceParserInterface, implementation: str):
+        super().__init__(parser)
+        self.implementation = implementation
+
+    def parse(self) -> ProductRecord:
+        start = time.time()
+        try:
+            result = self.parser.parse()
+        except (CaptchaDetectedError, ParseCancelledError):
+            # Капча говорит о состоянии маркетплейса, а отмена - о хеджировании, а не о качестве реализации
+            raise
+        except Exception:
+            strategy_stats.record(self.marketplace, SELECTION_STAGE, self.implementation, False, time.time() - start)
+            raise
+        strategy_stats.record(self.marketplace, SELECTION_STAGE, self.implementation,
+                              is_complete(result), time.time() - start)
+        return result
+
+
+def create_parser(marketplace: str, url: str, implementation: str = None,
+                  identity: ProductIdentity = None) -> MarketplaceParserInterface:
+    """Парсер выбранной (или указанной) реализации с учетом статистики"""
+    implementation = implementation or choose_implementation(marketplace)
+    return TrackedParser(parser_class(marketplace, implementation)(url, identity), implementation)
@@ -0,0 +1,246 @@
+"""
+Статический режим парсинга: страница без JavaScript.
+
+Страница загружается в контексте с отключенным JavaScript (без картинок,
+шрифтов и стилей), данные берутся из серверной разметки: JSON-LD Product,
+microdata (itemprop) и meta-теги (Open Graph). Если обязательных полей нет,
+парсинг эскалируется в обычный парсер с полным рендером. Доля эскалаций
+считается по каждому маркетплейсу.
+"""
+import json
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional
+
+from .base import ParserWrapper
+from .errors import ParserError
+from .record import ProductRecord
+
+# Без JS страница не нуждается ни в каких подресурсах, кроме документа
+STATIC_BLOCKED_RESOURCES = ('image', 'media', 'font', 'stylesheet', 'script')
+REQUIRED_FIELDS = ('title', 'price')
+
+_JSON_LD_RE = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S | re.I)
+_PRICE_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def _parse_price(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return 0
+    text = str(value).replace('\xa0', '').replace('\u2009', '').replace('\u202f', '').replace(' ', '')
+    match = _PRICE_RE.search(text)
+    return float(match.group(0).replace(',', '.')) if match else 0
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _image_urls(value: Any) -> List[str]:
+    urls = []
+    for item in _as_list(value):
+        if isinstance(item, dict):
+            item = item.get('url') or item.get('contentUrl')
+        if isinstance(item, str) and item:
+            urls.append('https:' + item if item.startswith('//') else item)
+    return urls
+
+
+def _json_ld_nodes(html: str) -> List[Dict[str, Any]]:
+    nodes = []
+    for block in _JSON_LD_RE.findall(html):
+        try:
+            data = json.loads(block.strip())
+        except ValueError:
+            continue
+        for item in _as_list(data):
+            if isinstance(item, dict):
+                nodes.extend(_as_list(item.get('@graph')) if '@graph' in item else [item])
+    return [node for node in nodes if isinstance(node, dict)]
+
+
+def _type_is(node: Dict[str, Any], name: str) -> bool:
+    return any(str(t).rsplit('/', 1)[-1] == name for t in _as_list(node.get('@type')))
+
+
+def _from_json_ld(html: str) -> Dict[str, Any]:
+    nodes = _json_ld_nodes(html)
+    result = {}
+    product = next((node for node in nodes if _type_is(node, 'Product')), None)
+    if product:
+        offers = _as_list(product.get('offers'))
+        offer = offers[0] if offers and isinstance(offers[0], dict) else {}
+        if _type_is(offer, 'AggregateOffer') and not offer.get('price'):
+            offer = dict(offer, price=offer.get('lowPrice'))
+        characteristics = {}
+        for prop in _as_list(product.get('additionalProperty')):
+            if isinstance(prop, dict) and prop.get('name') and prop.get('value') not in (None, ''):
+                characteristics[prop['name']] = str(prop['value'])
+        result = {
+            'title': product.get('name', ''),
+            'description': product.get('description', ''),
+            'price': _parse_price(offer.get('price')),
+            'images': _image_urls(product.get('image')),
+            'characteristics': characteristics,
+        }
+        if offer.get('availability'):
+            result['in_stock'] = 'InStock' in str(offer['availability'])
+        if isinstance(product.get('category'), str):
+            result['category'] = product['category']
+    breadcrumbs = next((node for node in nodes if _type_is(node, 'BreadcrumbList')), None)
+    if breadcrumbs and not result.get('category'):
+        names = [item.get('name') or (item.get('item') or {}).get('name')
+                 for item in _as_list(breadcrumbs.get('itemListElement')) if isinstance(item, dict)]
+        names = [name for name in names if name]
+        if names:
+            result['category'] = names[-1]
+    return result
+
+
+class _MarkupCollector(HTMLParser):
+    """Собирает itemprop-значения и meta-теги за один проход по HTML"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.itemprops: Dict[str, List[str]] = {}
+        self.meta: Dict[str, str] = {}
+        self._text_prop: Optional[str] = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'meta':
+            key = attrs.get('property') or attrs.get('name')
+            if key and attrs.get('content') and key not in self.meta:
+                self.meta[key] = attrs['content']
+        prop = attrs.get('itemprop')
+        if not prop:
+            return
+        value = attrs.get('content') or attrs.get('src') or attrs.get('href')
+        if value:
+            self.itemprops.setdefault(prop, []).append(value)
+        elif tag not in ('div', 'section', 'article') and self._text_prop is None:
+            self._text_prop = prop
+            self._text = []
+
+    def handle_data(self, data):
+        if self._text_prop is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if self._text_prop is not None:
+            text = ' '.join(''.join(self._text).split())
+            if text:
+                self.itemprops.setdefault(self._text_prop, []).append(text)
+            self._text_prop = None
+
+
+def _from_markup(html: str) -> Dict[str, Any]:
+    collector = _MarkupCollector()
+    try:
+        collector.feed(html)
+    except Exception:
+        pass
+    props, meta = collector.itemprops, collector.meta
+
+    def first(key: str) -> str:
+        return (props.get(key) or [''])[0]
+
+    result = {
+        'title': first('name') or meta.get('og:title', ''),
+        'description': first('description') or meta.get('og:description') or meta.get('description', ''),
+        'price': _parse_price(first('price') or meta.get('product:price:amount') or meta.get('og:price:amount')),
+        'images': _image_urls(props.get('image') or _as_list(meta.get('og:image'))),
+    }
+    availability = first('availability') or meta.get('product:availability', '')
+    if availability:
+        result['in_stock'] = 'instock' in availability.lower().replace(' ', '').replace('_', '')
+    return result
+
+
+def extract_static(html: str) -> Dict[str, Any]:
+    """Данные товара из серверной разметки: JSON-LD, затем microdata и meta дополняют пустые поля"""
+    data = _from_json_ld(html)
+    for key, value in _from_markup(html).items():
+        if value and not data.get(key):
+            data[key] = value
+    return data
+
+
+class EscalationStats:
+    """Сколько парсингов закончилось в статическом режиме, а сколько ушло в полный рендер"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def record(self, marketplace: str, escalated: bool, reason: str = '') -> None:
+        with self._lock:
+            counters = self._counters.setdefault(marketplace, {'static': 0, 'escalated': 0})
+            counters['escalated' if escalated else 'static'] += 1
+            if reason:
+                counters[f"missing:{reason}"] = counters.get(f"missing:{reason}", 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for marketplace, counters in self._counters.items():
+                total = counters['static'] + counters['escalated']
+                result[marketplace] = dict(counters, escalation_rate=round(counters['escalated'] / total, 3) if total else 0)
+            return result
+
+
+escalation_stats = EscalationStats()
+
+
+class StaticFirstParser(ParserWrapper):
+    """Сначала пробует страницу без JavaScript, при нехватке полей - полный парсер"""
+
+    def parse(self) -> ProductRecord:
+        if self.include_variants:
+            # Варианты есть только в данных полного рендера
+            return self.parser.parse()
+        missing = 'error'
+        try:
+            data = self._parse_static()
+            missing = ','.join(field for field in REQUIRED_FIELDS if not data.get(field))
+            if not missing:
+                escalation_stats.record(self.marketplace, escalated=False)
+                print(f"⚡ {self.marketplace_name}: Данные получены без JavaScript")
+                self._report_progress('static_html', **data)
+                return ProductRecord.from_dict(data)
+        except ParserError:
+            raise
+        except Exception as e:
+            print(f"⚠️ {self.marketplace_name}: Статический режим не сработал: {e}")
+        escalation_stats.record(self.marketplace, escalated=True, reason=missing)
+        print(f"🔁 {self.marketplace_name}: Эскалация в полный рендер (нет: {missing})")
+        return self.parser.parse()
+
+    def _parse_static(self) -> Dict[str, Any]:
+        playwright = None
+        browser = None
+        try:
+            playwright, browser, page = self._get_browser_page(java_script_enabled=False,
+                                                               blocked_resources=STATIC_BLOCKED_RESOURCES)
+            self._open_product_page(page, self.url, wait_until='domcontentloaded')
+            return extract_static(page.content())
+        finally:
+            self._close_browser(playwright, browser)
+
+
+def static_first_marketplaces() -> tuple:
+    """STATIC_FIRST=true - для всех маркетплейсов, либо список: STATIC_FIRST=wb,ym"""
+    value = os.environ.get('STATIC_FIRST', 'false').lower().strip()
+    if value in ('', 'false', '0', 'no'):
+        return ()
+    if value in ('true', '1', 'yes', 'all'):
+        return ('wb', 'ozon', 'ym')
+    return tuple(item.strip() for item in value.split(',') if item.strip())
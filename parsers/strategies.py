@@ -0,0 +1,170 @@
+"""
+Самообучающийся порядок стратегий извлечения данных.
+
+Для каждого маркетплейса и этапа (например, 'product_data') хранится
+скользящее окно последних попыток каждой стратегии: успех и время.
+Стратегии упорядочиваются по ожидаемой выгоде p / t (вероятность успеха
+на среднее время попытки), поэтому мертвые после смены фронтенда
+стратегии уходят в конец. С небольшой вероятностью порядок меняется
+случайно (exploration), чтобы заметить, что стратегия снова заработала.
+Разбор DOM в рейтинге не участвует: парсер пробует его после выученных
+стратегий в фиксированном порядке (fallbacks в base._run_strategies).
+
+Дополнительно по каждой стратегии считается, какие поля товара она дала.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterable
+
+DEFAULT_WINDOW = 50
+DEFAULT_EXPLORATION = 0.1
+# Минимальная "стоимость" попытки, чтобы мгновенные промахи не получали бесконечный приоритет
+MIN_COST = 0.05
+SAVE_INTERVAL = 10
+
+
+class StrategyStats:
+    """Скользящая статистика стратегий извлечения (потокобезопасная, с сохранением в JSON)"""
+
+    def __init__(self, path: Optional[str] = None, window: Optional[int] = None,
+                 exploration: Optional[float] = None):
+        self.path = path if path is not None else os.environ.get('STRATEGY_STATS_PATH', 'data/strategy_stats.json')
+        self.window = window or int(os.environ.get('STRATEGY_WINDOW', DEFAULT_WINDOW))
+        self.exploration = (exploration if exploration is not None
+                            else float(os.environ.get('STRATEGY_EXPLORATION', DEFAULT_EXPLORATION)))
+        self._lock = threading.Lock()
+        # (marketplace, stage) -> strategy -> deque[(ok, elapsed)]
+        self._attempts: Dict[tuple, Dict[str, deque]] = {}
+        # (marketplace, stage) -> strategy -> field -> count
+        self._fields: Dict[tuple, Dict[str, Dict[str, int]]] = {}
+        self._last_order: Dict[tuple, List[str]] = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, strategies in data.get('attempts', {}).items():
+            marketplace, _, stage = key.partition('/')
+            self._attempts[(marketplace, stage)] = {
+                name: deque((tuple(item) for item in items), maxlen=self.window)
+                for name, items in strategies.items()
+            }
+        for key, strategies in data.get('fields', {}).items():
+            marketplace, _, stage = key.partition('/')
+            self._fields[(marketplace, stage)] = strategies
+
+    def _save_locked(self, force: bool = False) -> None:
+        if not self.path or not self._dirty:
+            return
+        now = time.time()
+        if not force and now - self._saved_at < SAVE_INTERVAL:
+            return
+        data = {
+            'attempts': {f"{mp}/{stage}": {name: list(items) for name, items in strategies.items()}
+                         for (mp, stage), strategies in self._attempts.items()},
+            'fields': {f"{mp}/{stage}": strategies for (mp, stage), strategies in self._fields.items()},
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = now
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить статистику стратегий: {e}")
+
+    def flush(self) -> None:
+        with self._lock:
+            self._save_locked(force=True)
+
+    def _score(self, items: Iterable[tuple], default_cost: float) -> float:
+        items = list(items)
+        successes = sum(1 for ok, _ in items if ok)
+        # Сглаживание Лапласа: новая стратегия стартует с вероятностью 0.5
+        probability = (successes + 1) / (len(items) + 2)
+        cost = sum(elapsed for _, elapsed in items) / len(items) if items else default_cost
+        return probability / max(cost, MIN_COST)
+
+    def order(self, marketplace: str, stage: str, names: List[str]) -> List[str]:
+        """Текущий порядок стратегий. Без статистики сохраняется исходный порядок"""
+        key = (marketplace, stage)
+        with self._lock:
+            attempts = self._attempts.get(key, {})
+            known = [elapsed for items in attempts.values() for _, elapsed in items]
+            default_cost = sum(known) / len(known) if known else 1.0
+            scores = {name: self._score(attempts.get(name, ()), default_cost) for name in names}
+            # sorted стабилен: при равных оценках остается исходный порядок
+            ordered = sorted(names, key=lambda name: -scores[name]) if attempts else list(names)
+            if len(ordered) > 1 and random.random() < self.exploration:
+                explored = ordered.pop(random.randrange(1, len(ordered)))
+                ordered.insert(0, explored)
+            self._last_order[key] = ordered
+            return ordered
+
+    def record(self, marketplace: str, stage: str, name: str, ok: bool, elapsed: float) -> None:
+        """Записывает попытку стратегии"""
+        key = (marketplace, stage)
+        with self._lock:
+            strategies = self._attempts.setdefault(key, {})
+            strategies.setdefault(name, deque(maxlen=self.window)).append((bool(ok), round(elapsed, 3)))
+            self._dirty = True
+            self._save_locked()
+
+    def record_fields(self, marketplace: str, stage: str, name: str, fields: Dict[str, Any]) -> None:
+        """Отмечает, какие поля товара дала стратегия-победитель"""
+        key = (marketplace, stage)
+        with self._lock:
+            counters = self._fields.setdefault(key, {}).setdefault(name, {})
+            for field, value in fields.items():
+                if value:
+                    counters[field] = counters.get(field, 0) + 1
+            self._dirty = True
+            self._save_locked()
+
+    def latency_percentile(self, marketplace: str, stage: str, name: str, quantile: float) -> Optional[float]:
+        """Перцентиль времени успешных попыток стратегии (None - пока нет данных)"""
+        with self._lock:
+            items = self._attempts.get((marketplace, stage), {}).get(name, ())
+            durations = sorted(elapsed for ok, elapsed in items if ok)
+        if not durations:
+            return None
+        index = min(len(durations) - 1, max(0, int(round(quantile * (len(durations) - 1)))))
+        return durations[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние для инспекции: порядок, успешность и время каждой стратегии"""
+        with self._lock:
+            result = {}
+            for (marketplace, stage), strategies in sorted(self._attempts.items()):
+                entry = {
+                    'order': self._last_order.get((marketplace, stage), []),
+                    'strategies': {},
+                }
+                fields = self._fields.get((marketplace, stage), {})
+                for name, items in strategies.items():
+                    successes = sum(1 for ok, _ in items if ok)
+                    entry['strategies'][name] = {
+                        'attempts': len(items),
+                        'success_rate': round(successes / len(items), 3) if items else 0,
+                        'avg_ms': round(sum(e for _, e in items) / len(items) * 1000) if items else 0,
+                        'fields': fields.get(name, {}),
+                    }
+                result.setdefault(marketplace, {})[stage] = entry
+            return result
+
+
+# Общая статистика процесса (используется всеми парсерами)
+strategy_stats = StrategyStats()
@@ -0,0 +1,232 @@
+"""
+Канонизация ссылок на товары и идентичность товара.
+
+canonicalize(url) -> ProductIdentity(marketplace, product_id, canonical_url):
+- маркетплейс определяется только по хосту (не по подстроке во всей ссылке),
+  с учетом www./m. поддоменов, wb.ru и региональных доменов ozon.by/ozon.kz;
+- короткие ссылки без артикула (ozon.ru/t/..., market.yandex.ru/cc/..., wb.ru/...)
+  раскрываются одним HTTP-запросом, результат кэшируется; неудача тоже кэшируется
+  на SHORT_LINK_FAILURE_TTL секунд, чтобы недоступная ссылка не стоила таймаута
+  на каждом запросе;
+- канонический URL - основной домен маркетплейса без query и fragment;
+  региональная витрина (ozon.kz, ozon.by, wildberries.kz, wildberries.by)
+  сохраняет свой домен: цены и валюта там другие. Ключ товара - по артикулу.
+
+Все кэши, дедупликация и объединение запросов ключуются по идентичности товара.
+Идентичность вычисляется один раз (get_parser) и передается дальше: парсеру
+и ленте изменений, без повторной канонизации.
+
+PARSER_HOST_MAP перенаправляет запросы парсеров (страницы и API) на другой
+сервер, например на локальный mock_marketplace.py:
+    PARSER_HOST_MAP=wildberries.ru=http://127.0.0.1:8099/wb,wb.ru=http://127.0.0.1:8099/wb
+Домен сопоставляется вместе с поддоменами (wb.ru покрывает card.wb.ru),
+путь и параметры ссылки дописываются к адресу сервера.
+"""
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+# Домен -> маркетплейс (поддомены вроде www. и m. снимаются при нормализации)
+MARKETPLACE_HOSTS = {
+    'wildberries.ru': 'wb',
+    'wildberries.by': 'wb',
+    'wildberries.kz': 'wb',
+    'wb.ru': 'wb',
+    'ozon.ru': 'ozon',
+    'ozon.by': 'ozon',
+    'ozon.kz': 'ozon',
+    'market.yandex.ru': 'ym',
+}
+
+CANONICAL_HOSTS = {
+    'wb': 'www.wildberries.ru',
+    'ozon': 'www.ozon.ru',
+    'ym': 'market.yandex.ru',
+}
+
+# Региональные витрины: свой домен в каноническом URL вместо основного
+REGIONAL_HOSTS = {
+    'wildberries.by': 'www.wildberries.by',
+    'wildberries.kz': 'www.wildberries.kz',
+    'ozon.by': 'ozon.by',
+    'ozon.kz': 'ozon.kz',
+}
+
+PRODUCT_ID_PATTERNS = {
+    'wb': re.compile(r'/catalog/(\d+)'),
+    'ozon': re.compile(r'/(?:product|context/detail/id)/(?:[^/?#]*-)?(\d+)/?'),
+    'ym': re.compile(r'/(?:product--[^/?#]*|product|card/[^/?#]*)/(\d+)'),
+}
+
+SHORT_LINK_TIMEOUT = 10
+SHORT_LINK_CACHE_SIZE = int(os.environ.get('SHORT_LINK_CACHE_SIZE', 10000))
+SHORT_LINK_FAILURE_TTL = float(os.environ.get('SHORT_LINK_FAILURE_TTL', 300))
+USER_AGENT = os.environ.get(
+    'USER_AGENT',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36'
+)
+
+_SUBDOMAIN_PREFIXES = ('www.', 'm.')
+
+
+class ProductIdentity(NamedTuple):
+    marketplace: Optional[str]
+    product_id: Optional[str]
+    canonical_url: str
+
+    @property
+    def key(self) -> str:
+        """Ключ товара: <маркетплейс>:<id>; если id не найден - канонический URL"""
+        return f"{self.marketplace or 'unknown'}:{self.product_id or self.canonical_url.rstrip('/')}"
+
+
+def _split(url: str):
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url.lstrip('/')
+    return urlsplit(url)
+
+
+def normalize_host(host: str) -> str:
+    """Хост без порта, регистра и служебных поддоменов (www., m.)"""
+    host = (host or '').lower().split(':')[0].rstrip('.')
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in _SUBDOMAIN_PREFIXES:
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+                stripped = True
+    return host
+
+
+def marketplace_for_url(url: str) -> Optional[str]:
+    """Маркетплейс по хосту ссылки (без сетевых запросов)"""
+    host = normalize_host(_split(url).hostname)
+    for domain, marketplace in MARKETPLACE_HOSTS.items():
+        if host == domain or host.endswith('.' + domain):
+            return marketplace
+    return None
+
+
+class _ShortLinkCache:
+    """Раскрытые короткие ссылки (LRU, потокобезопасно); у записи может быть срок жизни"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # url -> (раскрытый адрес, time.time() истечения или None - бессрочно)
+        self._items: 'OrderedDict[str, Tuple[str, Optional[float]]]' = OrderedDict()
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(url)
+            if item is None:
+                return None
+            resolved, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._items[url]
+                return None
+            self._items.move_to_end(url)
+            return resolved
+
+    def put(self, url: str, resolved: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._items[url] = (resolved, time.time() + ttl if ttl is not None else None)
+            self._items.move_to_end(url)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+_short_links = _ShortLinkCache(SHORT_LINK_CACHE_SIZE)
+
+
+def _has_product_id(url: str) -> bool:
+    marketplace = marketplace_for_url(url)
+    return bool(marketplace) and PRODUCT_ID_PATTERNS[marketplace].search(_split(url).path) is not None
+
+
+def resolve_short_link(url: str) -> str:
+    """
+    Конечный адрес после редиректов; при ошибке - исходная ссылка.
+    Бессрочно кэшируется только адрес с артикулом товара, остальное (ошибка сети,
+    403/429 на самой короткой ссылке, редирект не на товар) - на SHORT_LINK_FAILURE_TTL
+    """
+    cached = _short_links.get(url)
+    if cached is not None:
+        return cached
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=SHORT_LINK_TIMEOUT) as response:
+            resolved = response.geturl()
+    except urllib.error.HTTPError as e:
+        # Антибот может ответить 403 уже на конечном адресе - редиректы к этому моменту пройдены
+        resolved = e.geturl()
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"⚠️ Не удалось раскрыть короткую ссылку {url}: {e}")
+        _short_links.put(url, url, ttl=SHORT_LINK_FAILURE_TTL)
+        return url
+    _short_links.put(url, resolved, ttl=None if _has_product_id(resolved) else SHORT_LINK_FAILURE_TTL)
+    return resolved
+
+
+def canonicalize(url: str, resolve: bool = True) -> ProductIdentity:
+    """(маркетплейс, артикул, канонический URL) для ссылки на товар"""
+    marketplace = marketplace_for_url(url)
+    parts = _split(url)
+    if marketplace is None:
+        return ProductIdentity(None, None, urlunsplit(parts._replace(query='', fragment='')))
+
+    match = PRODUCT_ID_PATTERNS[marketplace].search(parts.path)
+    if match is None and resolve:
+        resolved = resolve_short_link(urlunsplit(parts._replace(fragment='')))
+        if resolved != url and marketplace_for_url(resolved) == marketplace:
+            return canonicalize(resolved, resolve=False)
+
+    product_id = match.group(1) if match else None
+    if marketplace == 'wb' and product_id:
+        # Вариант товара WB - это отдельный артикул, параметры ссылки на страницу не влияют
+        path = f"/catalog/{product_id}/detail.aspx"
+    else:
+        path = parts.path or '/'
+    host = REGIONAL_HOSTS.get(normalize_host(parts.hostname), CANONICAL_HOSTS[marketplace])
+    canonical_url = urlunsplit(('https', host, path, '', ''))
+    return ProductIdentity(marketplace, product_id, canonical_url)
+
+
+def host_map() -> Dict[str, str]:
+    """Домен -> базовый URL подмены из PARSER_HOST_MAP"""
+    mapping = {}
+    for item in os.environ.get('PARSER_HOST_MAP', '').split(','):
+        host, _, base = item.strip().partition('=')
+        if host and base:
+            mapping[normalize_host(host.strip())] = base.strip().rstrip('/')
+    return mapping
+
+
+def map_host(url: str) -> str:
+    """Ссылка с хостом, подмененным по PARSER_HOST_MAP (без подмены - как есть)"""
+    mapping = host_map()
+    if not mapping:
+        return url
+    parts = urlsplit(url)
+    host = normalize_host(parts.hostname)
+    # Более длинный (точный) домен имеет приоритет над общим
+    for domain in sorted(mapping, key=len, reverse=True):
+        if host == domain or host.endswith('.' + domain):
+            return mapping[domain] + urlunsplit(('', '', parts.path or '/', parts.query, parts.fragment))
+    return url
+
+
+def canonical_url(url: str) -> str:
+    return canonicalize(url).canonical_url
+
+
+def product_key(url: str) -> str:
+    return canonicalize(url).key
@@ -0,0 +1,158 @@
+"""
+Прогрев парсеров при старте сервера и готовность к приему трафика.
+
+PARSER_WARMUP=true - при старте в фоне:
+1. импортируются реализации парсеров маркетплейсов WARMUP_MARKETPLACES
+   (по умолчанию всех) - вместе с ними Playwright;
+2. запускается Chromium и открываются главные страницы маркетплейсов
+   (с учетом PARSER_HOST_MAP): запуск браузера, кэши шрифтов, DNS и TLS
+   оплачиваются до первого /api/parse. В PARSER_HAR_MODE=replay сеть
+   не трогаем - только запуск браузера. С BROWSER_EXECUTOR_THREADS так
+   прогревается браузер каждого потока исполнителя и остается ему (executor.py).
+Сервер готов (GET /api/ready), когда прогрев завершен и браузер запустился;
+без PARSER_WARMUP готов сразу. Ошибка открытия главной страницы не мешает
+готовности (маркетплейс может отвечать капчей), ошибка запуска браузера - мешает.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .browsers import browser_watchdog
+from .har import har_mode
+from .selection import IMPLEMENTATIONS, load_implementations
+from .urls import CANONICAL_HOSTS, map_host
+
+WARMUP_PAGE_TIMEOUT = 15000
+
+
+def warmup_enabled() -> bool:
+    return os.environ.get('PARSER_WARMUP', 'false').lower() == 'true'
+
+
+def warmup_marketplaces() -> List[str]:
+    value = os.environ.get('WARMUP_MARKETPLACES', '')
+    marketplaces = [m.strip() for m in value.split(',') if m.strip()]
+    return [m for m in marketplaces if m in IMPLEMENTATIONS] or list(IMPLEMENTATIONS)
+
+
+def open_home(context: Any, marketplace: str) -> Dict[str, Any]:
+    """Открывает главную страницу маркетплейса: статус и время (ошибка не выбрасывается)"""
+    url = map_host(f"https://{CANONICAL_HOSTS[marketplace]}/")
+    start = time.time()
+    page = context.new_page()
+    try:
+        response = page.goto(url, wait_until='domcontentloaded', timeout=WARMUP_PAGE_TIMEOUT)
+        status = response.status if response else None
+        print(f"🔥 Прогрев: {url} -> {status} за {time.time() - start:.2f}s")
+        return {'url': url, 'status': status, 'seconds': round(time.time() - start, 2)}
+    except Exception as e:
+        print(f"⚠️ Прогрев: {url} не открылась: {e}")
+        return {'url': url, 'error': str(e), 'seconds': round(time.time() - start, 2)}
+    finally:
+        try:
+            page.close()
+        except Exception:
+            pass
+
+
+def warm_browser(marketplaces: List[str], keep: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Запускает браузер текущего потока и открывает главные страницы маркетплейсов.
+    keep - оставить браузер потоку (для потоков с закрепленным браузером), иначе закрыть
+    """
+    from .base import launch_browser
+
+    lease = browser_watchdog.acquire(launch_browser)
+    try:
+        if har_mode() == 'replay':
+            return {}
+        context = lease.browser.new_context(locale='ru-RU', timezone_id='Europe/Moscow')
+        try:
+            return {marketplace: open_home(context, marketplace) for marketplace in marketplaces}
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+    finally:
+        browser_watchdog.release(lease.playwright, lease.browser, keep=keep)
+
+
+class Warmup:
+    """Состояние прогрева: фаза, загруженные реализации, открытые главные страницы"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.enabled = False
+        self.phase = 'idle'
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.browser_ready = False
+        self.loaded: List[str] = []
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        if not self.enabled:
+            return True
+        return self.finished is not None and self.browser_ready
+
+    def start(self, marketplaces: Optional[List[str]] = None, executor: Any = None) -> None:
+        """Прогрев в фоновом потоке (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.enabled = True
+            self._thread = threading.Thread(target=self.run, args=(marketplaces, executor),
+                                            name='parser-warmup', daemon=True)
+            self._thread.start()
+
+    def run(self, marketplaces: Optional[List[str]] = None, executor: Any = None) -> bool:
+        """
+        Прогрев в текущем потоке; True - браузер запущен и сервер готов.
+        С executor (см. executor.py) прогреваются его потоки-владельцы браузеров и их браузеры остаются
+        """
+        marketplaces = marketplaces or warmup_marketplaces()
+        self.enabled = True
+        self.started = time.time()
+        try:
+            self.phase = 'imports'
+            self.loaded = load_implementations(marketplaces)
+            print(f"🔥 Прогрев: загружено реализаций: {len(self.loaded)} за {time.time() - self.started:.2f}s")
+            self.phase = 'browser'
+            if executor is None:
+                self.pages = warm_browser(marketplaces)
+                self.browser_ready = True
+            else:
+                executor.start(warm_marketplaces=marketplaces)
+                self.pages = executor.wait_warm()
+                self.browser_ready = executor.warm_workers > 0
+                if not self.browser_ready:
+                    self.error = "Ни один поток браузеров не прогрелся"
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Прогрев не удался: {e}")
+        finally:
+            self.phase = 'done'
+            self.finished = time.time()
+        if self.ready:
+            print(f"✅ Прогрев завершен за {self.finished - self.started:.2f}s, сервер готов")
+        return self.ready
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'enabled': self.enabled,
+            'phase': self.phase,
+            'seconds': round((self.finished or time.time()) - self.started, 2) if self.started else None,
+            'browser_ready': self.browser_ready,
+            'loaded': self.loaded,
+            'pages': self.pages,
+            'error': self.error,
+        }
+
+
+warmup = Warmup()
@@ -1,30 +1,66 @@
 import json
+import os
 import re
 import time
 import random
-from typing import Dict, Any
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from .base import MarketplaceParserInterface
+from .errors import ParseTimeoutError, ParserError, StructureChangedError
+from .record import ProductRecord
+from .urls import ProductIdentity
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
+# Публичный API карточек: один запрос отдает цены и остатки сразу для нескольких nm
+WB_CARD_API_URL = "https://card.wb.ru/cards/v2/detail?appType=1&curr=rub&dest={dest}&nm={ids}"
+WB_CARD_API_BATCH = 50
+WB_PRODUCT_URL = "https://www.wildberries.ru/catalog/{nm_id}/detail.aspx"
+WB_PRODUCT_ID_RE = re.compile(r'/catalog/(\d+)')
+# Изображения лежат на basket-NN.wbbasket.ru, NN - по диапазону vol (артикул // 100000):
+# верхние границы vol для basket-01, basket-02, ... (как в скриптах сайта); новые артикулы - на следующем
+WB_BASKET_VOL_LIMITS = (
+    143, 287, 431, 719, 1007, 1061, 1115, 1169, 1313, 1601,
+    1655, 1919, 2045, 2189, 2405, 2621, 2837, 3053, 3269, 3485,
+    3701, 3917, 4133, 4349, 4565, 4877, 5189, 5501, 5813, 6125,
+    6437, 6749, 7061, 7373, 7685, 7997, 8309, 8741, 9173, 9605,
+)
+WB_IMAGE_URL = "https://basket-{basket:02d}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/images/big/{index}.webp"
+
+
+def wb_image_urls(nm_id: Any, count: int) -> List[str]:
+    """URL изображений товара на CDN Wildberries по артикулу и числу фото (pics в card API)"""
+    nm_id = int(nm_id)
+    vol = nm_id // 100000
+    basket = bisect_left(WB_BASKET_VOL_LIMITS, vol) + 1
+    return [WB_IMAGE_URL.format(basket=basket, vol=vol, part=nm_id // 1000, nm_id=nm_id, index=index)
+            for index in range(1, count + 1)]
+
 
 class WildberriesParser(MarketplaceParserInterface):
-    def parse(self) -> Dict[str, Any]:
+    marketplace = "wb"
+    marketplace_name = "Wildberries"
+
+    def __init__(self, url: str, identity: ProductIdentity = None):
+        super().__init__(url, identity)
+        # Варианты (другие цвета) товара в ответе: WB_INCLUDE_VARIANTS=true или parser.include_variants = True
+        self.include_variants = os.environ.get('WB_INCLUDE_VARIANTS', 'false').lower() == 'true'
+        self.card_api_dest = os.environ.get('WB_DEST', '-1257786')
+        self.product_data_strategy = None
+
+    def parse(self) -> ProductRecord:
         playwright = None
         browser = None
         try:
             playwright, browser, page = self._get_browser_page()
             
-            # Для Wildberries параметры могут быть важны для вариантов товара
+            # URL уже канонический: без параметров (они провоцируют капчу и не влияют на товар)
             clean_url = self.url
             
-            # Открываем страницу товара с ожиданием networkidle
-            page.goto(clean_url, wait_until='networkidle', timeout=self.timeout)
+            # Открываем страницу товара с ожиданием networkidle (капча проверяется сразу после навигации)
+            self._open_product_page(page, clean_url)
             self._wait_for_page_load(page)
             
-            # ОТЛАДКА: Проверяем что на странице
-            page_content = page.content()
             print(f"🔍 WB: URL после загрузки: {page.url}")
-            print(f"🔍 WB: Размер страницы: {len(page_content)} символов")
             
             # Проверяем наличие ключевых элементов
             has_h1 = page.evaluate("() => !!document.querySelector('h1')")
@@ -32,91 +68,30 @@ class WildberriesParser(MarketplaceParserInterface):
             has_product = page.evaluate("() => !!document.querySelector('[data-product-id]')")
             print(f"🔍 WB: Есть h1: {has_h1}, Есть __WBLB_INITIAL_DATA__: {has_wb_data}, Есть data-product-id: {has_product}")
             
-            # Проверяем на капчу или блокировку
-            page_url = page.url.lower()
-            
-            # Проверяем только URL - не содержимое страницы (может быть ложное срабатывание)
-            if 'captcha' in page_url or 'challenge' in page_url:
-                raise ValueError("Обнаружена капча на Wildberries. Попробуйте позже.")
-            
             # Дополнительная задержка для загрузки JS
-            time.sleep(random.uniform(3, 5))
+            self._sleep(random.uniform(3, 5))
             
-            # Извлекаем данные из window.__WBLB_INITIAL_DATA__ или других JS объектов
+            # Стратегии (JS объекты и DOM) пробуются в порядке, выученном по прошлым попыткам
             product_data = self._extract_product_data(page)
             
-            # Проверяем наличие данных - Wildberries может использовать imt_name вместо name
-            def has_valid_product_data(data):
-                if not data:
-                    return False
-                # Проверяем все возможные поля для названия
-                return bool(
-                    data.get("name") or 
-                    data.get("title") or 
-                    data.get("imt_name") or
-                    data.get("productName")
-                )
-            
-            # Если JS данные не найдены, пробуем еще раз с перезагрузкой
-            if not has_valid_product_data(product_data):
-                print("⚠️ Wildberries: JS данные не найдены, пробуем перезагрузку...")
-                time.sleep(3)
-                page.reload(wait_until='networkidle', timeout=self.timeout)
+            # Если ни одна стратегия не сработала, пробуем еще раз с перезагрузкой
+            if not self._has_valid_product_data(product_data):
+                print("⚠️ Wildberries: Данные не найдены, пробуем перезагрузку...")
+                self._sleep(3)
+                response = page.reload(wait_until='networkidle', timeout=self.timeout)
+                self._check_challenge(page, response)
                 self._wait_for_page_load(page)
                 product_data = self._extract_product_data(page)
             
-            # Если JS данные все еще не найдены, используем DOM fallback
-            if not has_valid_product_data(product_data):
-                print("⚠️ Wildberries: JS данные не найдены после перезагрузки, используем DOM fallback")
-                # Пробуем стандартный DOM fallback
-                dom_data = self._extract_from_dom_only(page)
-                if has_valid_product_data(dom_data):
-                    print("✅ Wildberries: Данные извлечены из DOM")
-                    product_data = dom_data
+            # Последняя попытка - извлечь хотя бы базовые данные из DOM
+            if not self._has_valid_product_data(product_data):
+                print("⚠️ Wildberries: Последняя попытка извлечения базовых данных...")
+                fallback_data = self._extract_basic_fallback(page)
+                if fallback_data and (fallback_data.get('name') or fallback_data.get('salePriceU')):
+                    print("✅ Wildberries: Базовые данные извлечены из fallback")
+                    product_data = fallback_data
                 else:
-                    # Пробуем агрессивный поиск
-                    print("⚠️ Wildberries: Стандартный DOM fallback не сработал, пробуем агрессивный поиск")
-                    aggressive_dom = self._extract_from_dom_aggressive(page)
-                    if has_valid_product_data(aggressive_dom):
-                        print("✅ Wildberries: Данные извлечены агрессивным поиском в DOM")
-                        product_data = aggressive_dom
-                    else:
-                        # Последняя попытка - извлечь хотя бы базовые данные из DOM
-                        print("⚠️ Wildberries: Последняя попытка извлечения базовых данных...")
-                        fallback_data = page.evaluate("""
-                            () => {
-                                const data = {};
-
-                                // Название
-                                const h1 = document.querySelector('h1');
-                                if (h1) data.name = h1.textContent.trim();
-
-                                // Цена
-                                const priceEl = document.querySelector('[class*="price"]');
-                                if (priceEl) {
-                                    const priceText = priceEl.textContent.replace(/[^\\d]/g, '');
-                                    if (priceText) data.salePriceU = parseInt(priceText) * 100;
-                                }
-
-                                // Изображения
-                                const imgEls = document.querySelectorAll('img');
-                                const images = [];
-                                for (const img of imgEls) {
-                                    const src = img.src || img.getAttribute('data-src');
-                                    if (src && src.startsWith('http') && !src.includes('data:image') && src.includes('wb') && images.length < 3) {
-                                        images.push(src);
-                                    }
-                                }
-                                data.photos = images.map(src => ({fullSize: src.replace('https://', '')}));
-
-                                return data;
-                            }
-                        """)
-                        if fallback_data and (fallback_data.get('name') or fallback_data.get('salePriceU')):
-                            print("✅ Wildberries: Базовые данные извлечены из fallback")
-                            product_data = fallback_data
-                        else:
-                            raise ValueError("Не удалось извлечь данные товара с Wildberries. Возможно, товар недоступен или страница изменилась.")
+                    raise StructureChangedError("Wildberries")
             
             # Формируем результат
             # Название может быть в разных полях - imt_name основное для WB
@@ -164,7 +139,7 @@ class WildberriesParser(MarketplaceParserInterface):
                     if product_data:
                         title = product_data.get("imt_name") or product_data.get("name") or ""
             
-            # Извлекаем цену
+            # Забираем из payload страницы все нужные поля за один проход
             price = 0
             # Пробуем разные форматы цен WB (в копейках)
             if product_data.get("salePriceU"):
@@ -176,6 +151,25 @@ class WildberriesParser(MarketplaceParserInterface):
             elif product_data.get("price"):
                 price = float(product_data.get("price", 0))
                 print(f"✅ Wildberries: Цена из price: {price}")
+            old_price = product_data.get("priceU", 0) / 100 if product_data.get("priceU") and product_data.get("priceU") != product_data.get("salePriceU") else 0
+            description = product_data.get("description", "") or product_data.get("text", "")
+            category = product_data.get("subjectName", "") or product_data.get("category", "")
+            characteristics = self._extract_characteristics(product_data)
+            in_stock = product_data.get("stocks", [{}])[0].get("inStock", False) if product_data.get("stocks") else True
+            images = self._extract_images(product_data, page)
+            self._record_strategy_fields("product_data", self.product_data_strategy, title=title, price=price,
+                                         description=description, characteristics=characteristics, images=images)
+            self._report_progress(self.product_data_strategy, title=title, category=category, price=price,
+                                  old_price=old_price, in_stock=in_stock, images=images,
+                                  description=description, characteristics=characteristics)
+            # Из payload берем только то, что нужно для вариантов: свой nm, соседние nm и размеры
+            if self.include_variants:
+                nm_id = self._product_nm_id(product_data)
+                sibling_ids = self._extract_variant_ids(product_data, page, nm_id)
+                sizes = self._extract_sizes(product_data)
+            
+            # Сырой payload (__WBLB_INITIAL_DATA__ бывает очень большим) больше не нужен
+            del product_data
             
             # Если цена не найдена или невалидна, пробуем из DOM
             if price == 0 or price > 1000000:
@@ -205,7 +199,6 @@ class WildberriesParser(MarketplaceParserInterface):
                     print(f"⚠️ Wildberries: Цена не найдена")
             
             # Извлекаем описание
-            description = product_data.get("description", "") or product_data.get("text", "")
             if not description or len(description) < 10:
                 print("⚠️ Wildberries: Описание не найдено в JS данных, пробуем DOM...")
                 dom_desc = page.evaluate("""
@@ -227,9 +220,6 @@ class WildberriesParser(MarketplaceParserInterface):
                     print(f"✅ Wildberries: Описание найдено ({len(description)} символов)")
                 else:
                     print("⚠️ Wildberries: Описание не найдено")
-                
-                # Извлекаем изображения
-            images = self._extract_images(product_data, page)
             
             if not images or len(images) == 0:
                 print("⚠️ Wildberries: Изображения не найдены в данных продукта, пробуем DOM...")
@@ -261,36 +251,88 @@ class WildberriesParser(MarketplaceParserInterface):
                 else:
                     print("⚠️ Wildberries: Изображения не найдены")
 
-            result = {
-                "title": title if title and len(title) > 3 else "",
-                "price": price,
-                "old_price": product_data.get("priceU", 0) / 100 if product_data.get("priceU") and product_data.get("priceU") != product_data.get("salePriceU") else 0,
-                "description": description,
-                "category": product_data.get("subjectName", "") or product_data.get("category", ""),
-                "characteristics": self._extract_characteristics(product_data),
-                "composition": self._extract_composition(product_data),
-                    "images": images,
-                "in_stock": product_data.get("stocks", [{}])[0].get("inStock", False) if product_data.get("stocks") else True
-            }
+            result = ProductRecord(
+                title=title if title and len(title) > 3 else "",
+                price=price,
+                old_price=old_price,
+                description=description,
+                category=category,
+                characteristics=characteristics,
+                images=images,
+                in_stock=in_stock,
+            )
+            # Группы, которых не было в данных стратегии, дозаполнены из DOM
+            self._report_progress('dom', **result)
+            
+            if self.include_variants:
+                current = {
+                    "nm_id": nm_id,
+                    "url": self.url,
+                    "title": result.title,
+                    "price": result.price,
+                    "old_price": result.old_price,
+                    "in_stock": result.in_stock,
+                    "images": result.images,
+                    "sizes": sizes,
+                }
+                result["variants"] = [current] + self._fetch_variants(page, sibling_ids)
+                print(f"🎨 Wildberries: Вариантов товара: {len(result['variants'])}")
             
             print(f"📦 Wildberries: Результат - название: '{result['title']}', цена: {result['price']}, изображений: {len(result['images'])}, описание: {len(result['description'])} символов")
             
             return result
 
+        except ParserError:
+            # Типизированные ошибки (капча, отмена) отдаем как есть
+            raise
         except PlaywrightTimeoutError:
-            raise ValueError("Превышено время ожидания загрузки страницы Wildberries")
+            raise ParseTimeoutError("Wildberries")
         except Exception as e:
             raise ValueError(f"Ошибка при парсинге Wildberries: {str(e)}")
         finally:
-            if browser:
-                browser.close()
-            if playwright:
-                playwright.stop()
+            self._close_browser(playwright, browser)
 
     def _extract_product_data(self, page: Page) -> Dict[str, Any]:
-        """Извлекает данные товара из JS объектов на странице - улучшенная версия для Wildberries"""
-        
-        # Способ 1: JSON-LD данные (наиболее надежный способ)
+        """Извлекает данные товара, пробуя стратегии в выученном порядке (см. strategies.py)"""
+        product_data, self.product_data_strategy = self._run_strategies(
+            page, "product_data", self._product_data_strategies(), self._has_valid_product_data,
+            fallbacks=self._product_data_fallbacks())
+        return product_data
+
+    def _product_data_strategies(self) -> List[Tuple[str, Callable[[Page], Any]]]:
+        """Стратегии извлечения данных товара (JSON страницы) в исходном порядке"""
+        return [
+            ("json_ld", self._from_json_ld),
+            ("wblb_initial_data", self._from_wblb_initial_data),
+            ("wb_initial_data", self._from_wb_initial_data),
+            ("wbl1_data", self._from_wbl1_data),
+            ("window_scan", self._from_window_scan),
+            ("inline_scripts", self._from_inline_scripts),
+        ]
+
+    def _product_data_fallbacks(self) -> List[Tuple[str, Callable[[Page], Any]]]:
+        """Разбор DOM после выученных стратегий, в фиксированном порядке (см. _run_strategies)"""
+        return [
+            ("dom_basic", self._from_dom_basic),
+            ("dom_only", self._extract_from_dom_only),
+            ("dom_aggressive", self._extract_from_dom_aggressive),
+        ]
+
+    @staticmethod
+    def _has_valid_product_data(data: Any) -> bool:
+        """Wildberries может использовать imt_name вместо name"""
+        if not data or not isinstance(data, dict):
+            return False
+        # Проверяем все возможные поля для названия
+        return bool(
+            data.get("name") or
+            data.get("title") or
+            data.get("imt_name") or
+            data.get("productName")
+        )
+
+    def _from_json_ld(self, page: Page) -> Optional[Dict[str, Any]]:
+        """JSON-LD данные (наиболее надежный способ)"""
         try:
             json_ld = page.evaluate("""
                 () => {
@@ -329,8 +371,10 @@ class WildberriesParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Wildberries: Ошибка извлечения JSON-LD: {e}")
             pass
-        
-        # Способ 2: window.__WBLB_INITIAL_DATA__ (основной формат Wildberries)
+        return None
+
+    def _from_wblb_initial_data(self, page: Page) -> Optional[Dict[str, Any]]:
+        """window.__WBLB_INITIAL_DATA__ (основной формат Wildberries)"""
         try:
             wblb_data = page.evaluate("""
                 () => {
@@ -362,8 +406,10 @@ class WildberriesParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Wildberries: Ошибка извлечения __WBLB_INITIAL_DATA__: {e}")
             pass
-        
-        # Способ 3: window.__WB_INITIAL_DATA__ (старый формат)
+        return None
+
+    def _from_wb_initial_data(self, page: Page) -> Optional[Dict[str, Any]]:
+        """window.__WB_INITIAL_DATA__ (старый формат)"""
         try:
             wb_data = page.evaluate("""
                 () => {
@@ -391,8 +437,10 @@ class WildberriesParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Wildberries: Ошибка извлечения __WB_INITIAL_DATA__: {e}")
             pass
-        
-        # Способ 4: Ищем данные в __WBL1_DATA__ (альтернативный формат)
+        return None
+
+    def _from_wbl1_data(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Ищем данные в __WBL1_DATA__ (альтернативный формат)"""
         try:
             wbl1_data = page.evaluate("""
                 () => {
@@ -410,8 +458,10 @@ class WildberriesParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Wildberries: Ошибка поиска __WBL1_DATA__: {e}")
             pass
-        
-        # Способ 5: Глобальный поиск в window
+        return None
+
+    def _from_window_scan(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Глобальный поиск в window"""
         try:
             any_product = page.evaluate("""
                 () => {
@@ -445,8 +495,10 @@ class WildberriesParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Wildberries: Ошибка поиска в window: {e}")
             pass
-        
-        # Способ 6: Поиск в скриптах с данными
+        return None
+
+    def _from_inline_scripts(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Поиск в скриптах с данными"""
         try:
             script_data = page.evaluate("""
                 () => {
@@ -487,11 +539,10 @@ class WildberriesParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Wildberries: Ошибка поиска в скриптах: {e}")
             pass
-        
-        print("⚠️ Wildberries: Не удалось найти данные в JS объектах")
-        
-        # Прямой fallback: извлекаем из DOM напрямую
-        print("🔄 Wildberries: Пробуем прямой DOM fallback...")
+        return None
+
+    def _from_dom_basic(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Прямой fallback: базовые поля из DOM"""
         dom_data = page.evaluate("""
             () => {
                 const data = {};
@@ -694,6 +745,160 @@ class WildberriesParser(MarketplaceParserInterface):
         
         return None
 
+    def _extract_basic_fallback(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Последний fallback после перезагрузки: название, цена и изображения из DOM"""
+        return self._safe_evaluate(page, """
+                () => {
+                    const data = {};
+
+                    // Название
+                    const h1 = document.querySelector('h1');
+                    if (h1) data.name = h1.textContent.trim();
+
+                    // Цена
+                    const priceEl = document.querySelector('[class*="price"]');
+                    if (priceEl) {
+                        const priceText = priceEl.textContent.replace(/[^\\d]/g, '');
+                        if (priceText) data.salePriceU = parseInt(priceText) * 100;
+                    }
+
+                    // Изображения
+                    const imgEls = document.querySelectorAll('img');
+                    const images = [];
+                    for (const img of imgEls) {
+                        const src = img.src || img.getAttribute('data-src');
+                        if (src && src.startsWith('http') && !src.includes('data:image') && src.includes('wb') && images.length < 3) {
+                            images.push(src);
+                        }
+                    }
+                    data.photos = images.map(src => ({fullSize: src.replace('https://', '')}));
+
+                    return data;
+                }
+            """)
+
+    def _product_nm_id(self, product_data: Dict[str, Any]) -> Optional[int]:
+        """Артикул (nm) открытого товара: из данных страницы или из URL"""
+        for key in ("nm_id", "nmId", "id"):
+            value = product_data.get(key)
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                return int(value)
+        match = WB_PRODUCT_ID_RE.search(self.url)
+        return int(match.group(1)) if match else None
+
+    def _extract_variant_ids(self, product_data: Dict[str, Any], page: Page, nm_id: Optional[int]) -> List[int]:
+        """Артикулы других цветов товара из уже загруженных данных страницы (без новых запросов)"""
+        ids = []
+        for key in ("full_colors", "colors", "nmColors"):
+            for item in product_data.get(key) or []:
+                if isinstance(item, dict):
+                    item = item.get("nm_id") or item.get("nmId") or item.get("nm")
+                if isinstance(item, int) or (isinstance(item, str) and item.isdigit()):
+                    ids.append(int(item))
+        if not ids:
+            # JSON-LD не содержит цветов - смотрим в __WBLB_INITIAL_DATA__ и ссылки палитры цветов
+            found = self._safe_evaluate(page, """
+                () => {
+                    const ids = [];
+                    const push = (v) => {
+                        const id = typeof v === 'object' && v ? (v.nm_id || v.nmId || v.nm) : v;
+                        if (id && /^\\d+$/.test(String(id))) ids.push(Number(id));
+                    };
+                    const roots = [window.__WBLB_INITIAL_DATA__, window.__WB_INITIAL_DATA__];
+                    for (const root of roots) {
+                        if (!root) continue;
+                        const product = root.product || (root.data && root.data.product) ||
+                                        (root.state && root.state.product) || (root.cards && root.cards[0]) || root;
+                        for (const key of ['full_colors', 'colors', 'nmColors']) {
+                            if (Array.isArray(product[key])) product[key].forEach(push);
+                        }
+                    }
+                    if (!ids.length) {
+                        document.querySelectorAll('[class*="color"] a[href*="/catalog/"]').forEach(a => {
+                            const match = a.getAttribute('href').match(/\\/catalog\\/(\\d+)/);
+                            if (match) ids.push(Number(match[1]));
+                        });
+                    }
+                    return ids;
+                }
+            """, [])
+            ids.extend(found or [])
+        unique = []
+        for item in ids:
+            if item != nm_id and item not in unique:
+                unique.append(item)
+        return unique
+
+    def _extract_sizes(self, product_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Размеры открытого товара с наличием"""
+        sizes = []
+        for size in product_data.get("sizes") or []:
+            if not isinstance(size, dict):
+                continue
+            name = size.get("origName") or size.get("name") or ""
+            if not name or name == "0":
+                continue
+            stocks = size.get("stocks")
+            sizes.append({
+                "name": name,
+                "in_stock": bool(stocks) if stocks is not None else True,
+            })
+        return sizes
+
+    def _card_api_variant(self, product: Dict[str, Any]) -> Dict[str, Any]:
+        """Вариант товара из ответа card API (цены в копейках)"""
+        nm_id = product.get("id")
+        price = old_price = 0
+        sizes = []
+        in_stock = bool(product.get("totalQuantity"))
+        for size in product.get("sizes") or []:
+            size_price = size.get("price") or {}
+            if not price and size_price.get("product"):
+                price = size_price["product"] / 100
+                old_price = size_price.get("basic", 0) / 100
+            stocks = size.get("stocks") or []
+            in_stock = in_stock or bool(stocks)
+            name = size.get("origName") or size.get("name") or ""
+            if name and name != "0":
+                sizes.append({"name": name, "in_stock": bool(stocks)})
+        if not price and product.get("salePriceU"):
+            price = product["salePriceU"] / 100
+            old_price = product.get("priceU", 0) / 100
+        return {
+            "nm_id": nm_id,
+            "url": WB_PRODUCT_URL.format(nm_id=nm_id),
+            "title": product.get("name", ""),
+            "color": ", ".join(c.get("name", "") for c in product.get("colors") or [] if c.get("name")),
+            "price": price,
+            "old_price": old_price if old_price != price else 0,
+            "in_stock": in_stock,
+            # card API не отдает ссылок на фото, только их число
+            "images": wb_image_urls(nm_id, min(product.get("pics") or 1, 10)),
+            "sizes": sizes,
+        }
+
+    def _fetch_variants(self, page: Page, nm_ids: List[int]) -> List[Dict[str, Any]]:
+        """Данные вариантов пачками через card API (request-клиент контекста, без рендера страниц)"""
+        variants = {}
+        for start in range(0, len(nm_ids), WB_CARD_API_BATCH):
+            batch = nm_ids[start:start + WB_CARD_API_BATCH]
+            api_url = WB_CARD_API_URL.format(dest=self.card_api_dest, ids=";".join(str(i) for i in batch))
+            try:
+                response = self._api_get(page, api_url)
+                if not response.ok:
+                    print(f"⚠️ Wildberries card API: статус {response.status}")
+                    continue
+                data = response.json()
+            except Exception as e:
+                print(f"⚠️ Wildberries card API: Ошибка запроса: {e}")
+                continue
+            for product in (data.get("data") or {}).get("products") or []:
+                if product.get("id"):
+                    variants[product["id"]] = self._card_api_variant(product)
+        # Варианты, которых нет в ответе API, отдаем хотя бы ссылкой
+        return [variants.get(nm_id) or {"nm_id": nm_id, "url": WB_PRODUCT_URL.format(nm_id=nm_id)}
+                for nm_id in nm_ids]
+
     def _extract_characteristics(self, product_data: Dict[str, Any]) -> Dict[str, str]:
         """Извлекает характеристики товара"""
         characteristics = {}
@@ -708,17 +913,6 @@ class WildberriesParser(MarketplaceParserInterface):
         
         return characteristics
 
-    def _extract_composition(self, product_data: Dict[str, Any]) -> str:
-        """Извлекает состав из характеристик"""
-        characteristics = self._extract_characteristics(product_data)
-        composition_keys = ["Состав", "Материал", "Composition", "Material", "Материалы"]
-        
-        for key in composition_keys:
-            if key in characteristics:
-                return str(characteristics[key])
-        
-        return ""
-
     def _extract_images(self, product_data: Dict[str, Any], page: Page) -> list[str]:
         """Извлекает изображения товара"""
         images = []
@@ -750,10 +944,6 @@ class WildberriesParser(MarketplaceParserInterface):
         
         # Способ 3: Генерируем URL по ID товара (если есть)
         if not images and product_data.get("id"):
-            product_id = str(product_data["id"])
-            vol = int(product_id) // 100000
-            part = int(product_id) // 1000
-            for i in range(1, 6):
-                images.append(f"https://basket-{vol:02d}.wbbasket.ru/vol{vol}/part{part}/{product_id}/images/big/{i}.webp")
+            images.extend(wb_image_urls(product_data["id"], 5))
         
         return images[:10]  # Максимум 10 изображений
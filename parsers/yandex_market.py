@@ -1,56 +1,70 @@
 import json
+import os
 import re
 import time
 import random
-from typing import Dict, Any
-from .base import MarketplaceParserInterface
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from .base import MarketplaceParserInterface, blocking_route_handler
+from .errors import CaptchaDetectedError, ParseTimeoutError, ParserError, StructureChangedError
+from .record import ProductRecord
+from .urls import ProductIdentity
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
+# Ресурсы, не нужные для чтения характеристик на странице /spec
+SPEC_BLOCKED_RESOURCES = ('image', 'media', 'font', 'stylesheet')
+
 
 class YandexMarketParser(MarketplaceParserInterface):
-    def parse(self) -> Dict[str, Any]:
+    marketplace = "ym"
+    marketplace_name = "Яндекс Маркет"
+
+    def __init__(self, url: str, identity: ProductIdentity = None):
+        super().__init__(url, identity)
+        # Загрузку полной страницы характеристик можно отключить: YM_FETCH_SPECS=false
+        self.fetch_specs = os.environ.get('YM_FETCH_SPECS', 'true').lower() == 'true'
+        self.product_data_strategy = None
+
+    def parse(self) -> ProductRecord:
         playwright = None
         browser = None
         try:
             playwright, browser, page = self._get_browser_page()
             
-            # Убираем параметры из URL для избежания капчи
-            clean_url = self.url.split('?')[0]
+            # URL уже канонический: без параметров (они провоцируют капчу и не влияют на товар)
+            clean_url = self.url
             
-            # Открываем страницу товара с ожиданием networkidle
-            page.goto(clean_url, wait_until='networkidle', timeout=self.timeout)
+            # Открываем страницу товара с ожиданием networkidle (капча проверяется сразу после навигации)
+            self._open_product_page(page, clean_url)
             
-            # Проверяем на капчу
-            if 'captcha' in page.url.lower() or 'smartcaptcha' in page.content().lower():
-                raise ValueError("Обнаружена капча на Яндекс Маркет. Попробуйте позже.")
+            # Страница /spec грузится во второй вкладке того же контекста, пока ждем основную
+            spec_page = self._start_spec_page(page, clean_url) if self.fetch_specs else None
             
             self._wait_for_page_load(page)
             
-            # Извлекаем данные из JS объектов
+            # Стратегии (JS объекты и DOM) пробуются в порядке, выученном по прошлым попыткам
             product_data = self._extract_product_data(page)
+            if not self._has_valid_product_data(product_data):
+                raise StructureChangedError("Яндекс Маркет", "Не удалось извлечь данные товара с Яндекс Маркет")
             
-            # Если JS данные не найдены или неполные, используем DOM fallback
-            if not product_data or not product_data.get("title"):
-                print("⚠️ Яндекс Маркет: JS данные не найдены, используем DOM fallback")
-                dom_data = self._extract_from_dom_only(page)
-                if dom_data and dom_data.get("title"):
-                    print("✅ Яндекс Маркет: Данные извлечены из DOM")
-                    product_data = dom_data
-                else:
-                    # Последняя попытка - агрессивный поиск
-                    print("⚠️ Яндекс Маркет: Стандартный DOM fallback не сработал, пробуем агрессивный поиск")
-                    aggressive_dom = self._extract_from_dom_aggressive(page)
-                    if aggressive_dom and aggressive_dom.get("title"):
-                        print("✅ Яндекс Маркет: Данные извлечены агрессивным поиском в DOM")
-                        product_data = aggressive_dom
-                    else:
-                        raise ValueError("Не удалось извлечь данные товара с Яндекс Маркет")
-            
-            # Формируем результат
+            # Забираем из payload страницы все нужные поля за один проход
             title = product_data.get("title", product_data.get("name", ""))
-            
-            # Извлекаем цену
             price = self._extract_price(product_data)
+            old_price = self._extract_old_price(product_data)
+            description = product_data.get("description", "")
+            category = product_data.get("category", "")
+            characteristics = self._extract_characteristics(product_data)
+            in_stock = product_data.get("available", product_data.get("isAvailable", True))
+            images = self._extract_images(product_data, page)
+            self._record_strategy_fields("product_data", self.product_data_strategy, title=title, price=price,
+                                         description=description, characteristics=characteristics, images=images)
+            self._report_progress(self.product_data_strategy, title=title, category=category, price=price,
+                                  old_price=old_price, in_stock=in_stock, images=images,
+                                  description=description, characteristics=characteristics)
+            
+            # Сырой payload страницы больше не нужен
+            del product_data
+            
+            # Если цена не найдена в данных, пробуем DOM
             if price == 0:
                 # Пробуем из DOM
                 dom_price = page.evaluate("""
@@ -79,8 +93,7 @@ class YandexMarketParser(MarketplaceParserInterface):
                 if dom_price and dom_price > 0:
                     price = dom_price
             
-            # Извлекаем описание
-            description = product_data.get("description", "")
+            # Если описание не найдено в данных, пробуем DOM
             if not description or len(description) < 10:
                 dom_desc = page.evaluate("""
                     () => {
@@ -101,8 +114,6 @@ class YandexMarketParser(MarketplaceParserInterface):
                 if dom_desc:
                     description = dom_desc
 
-            # Извлекаем изображения
-            images = self._extract_images(product_data, page)
             # Убеждаемся, что images - это список
             if images is None:
                 images = []
@@ -155,8 +166,14 @@ class YandexMarketParser(MarketplaceParserInterface):
             # Ограничиваем до 3 изображений для Яндекс Маркета
             images = images[:3] if images else []
 
-            # Извлекаем характеристики
-            characteristics = self._extract_characteristics(product_data)
+            # Полные характеристики со страницы /spec дополняют данные карточки
+            if spec_page is not None:
+                spec_characteristics = self._collect_spec_page(spec_page)
+                if spec_characteristics:
+                    characteristics = {**spec_characteristics, **(characteristics or {})}
+                    self._report_progress('spec_page', characteristics=characteristics)
+            
+            # Если характеристики не найдены в данных, пробуем DOM
             if not characteristics or len(characteristics) == 0:
                 # Пробуем из DOM
                 dom_specs = page.evaluate("""
@@ -188,36 +205,62 @@ class YandexMarketParser(MarketplaceParserInterface):
             if description is None:
                 description = ""
             
-            result = {
-                "title": title if title and len(title) > 3 else "",
-                "price": price,
-                "old_price": self._extract_old_price(product_data) if product_data else 0,
-                "description": description,
-                "category": product_data.get("category", "") if product_data else "",
-                "characteristics": characteristics,
-                "composition": self._extract_composition(product_data) if product_data else "",
-                "images": images,
-                "in_stock": product_data.get("available", product_data.get("isAvailable", True)) if product_data else True
-            }
+            result = ProductRecord(
+                title=title if title and len(title) > 3 else "",
+                price=price,
+                old_price=old_price,
+                description=description,
+                category=category,
+                characteristics=characteristics,
+                images=images,
+                in_stock=in_stock,
+            )
+            # Группы, которых не было в данных стратегии, дозаполнены из DOM
+            self._report_progress('dom', **result)
             
             print(f"📦 Яндекс Маркет: Результат - название: '{result['title']}', цена: {result['price']}, изображений: {len(result['images'])}, описание: {len(result['description'])} символов, характеристик: {len(result['characteristics'])}")
             
             return result
 
+        except ParserError:
+            # Типизированные ошибки (капча, отмена) отдаем как есть
+            raise
         except PlaywrightTimeoutError:
-            raise ValueError("Превышено время ожидания загрузки страницы Яндекс Маркет")
+            raise ParseTimeoutError("Яндекс Маркет")
         except Exception as e:
             raise ValueError(f"Ошибка при парсинге Яндекс Маркет: {str(e)}")
         finally:
-            if browser:
-                browser.close()
-            if playwright:
-                playwright.stop()
+            self._close_browser(playwright, browser)
 
     def _extract_product_data(self, page: Page) -> Dict[str, Any]:
-        """Извлекает данные товара из JS объектов на странице - улучшенная версия"""
-        
-        # Способ 1: JSON-LD данные (наиболее надежный способ)
+        """Извлекает данные товара, пробуя стратегии в выученном порядке (см. strategies.py)"""
+        product_data, self.product_data_strategy = self._run_strategies(
+            page, "product_data", self._product_data_strategies(), self._has_valid_product_data,
+            fallbacks=self._product_data_fallbacks())
+        return product_data
+
+    def _product_data_strategies(self) -> List[Tuple[str, Callable[[Page], Any]]]:
+        """Стратегии извлечения данных товара (JSON страницы) в исходном порядке"""
+        return [
+            ("json_ld", self._from_json_ld),
+            ("initial_data", self._from_initial_data),
+            ("initial_state", self._from_initial_state),
+            ("window_scan", self._from_window_scan),
+        ]
+
+    def _product_data_fallbacks(self) -> List[Tuple[str, Callable[[Page], Any]]]:
+        """Разбор DOM после выученных стратегий, в фиксированном порядке (см. _run_strategies)"""
+        return [
+            ("dom_only", self._extract_from_dom_only),
+            ("dom_aggressive", self._extract_from_dom_aggressive),
+        ]
+
+    @staticmethod
+    def _has_valid_product_data(data: Any) -> bool:
+        return bool(data) and isinstance(data, dict) and bool(data.get("title"))
+
+    def _from_json_ld(self, page: Page) -> Optional[Dict[str, Any]]:
+        """JSON-LD данные (наиболее надежный способ)"""
         try:
             json_ld = page.evaluate("""
                 () => {
@@ -262,8 +305,10 @@ class YandexMarketParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Яндекс Маркет: Ошибка извлечения JSON-LD: {e}")
             pass
-        
-        # Способ 2: window.__INITIAL_DATA__ (новый формат)
+        return None
+
+    def _from_initial_data(self, page: Page) -> Optional[Dict[str, Any]]:
+        """window.__INITIAL_DATA__ (новый формат)"""
         try:
             initial_data = page.evaluate("""
                 () => {
@@ -293,8 +338,10 @@ class YandexMarketParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Яндекс Маркет: Ошибка извлечения __INITIAL_DATA__: {e}")
             pass
-        
-        # Способ 3: window.__INITIAL_STATE__
+        return None
+
+    def _from_initial_state(self, page: Page) -> Optional[Dict[str, Any]]:
+        """window.__INITIAL_STATE__"""
         try:
             initial_state = page.evaluate("""
                 () => {
@@ -322,8 +369,10 @@ class YandexMarketParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Яндекс Маркет: Ошибка извлечения __INITIAL_STATE__: {e}")
             pass
-        
-        # Способ 4: Ищем в window любые объекты с product
+        return None
+
+    def _from_window_scan(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Ищем в window любые объекты с product"""
         try:
             any_product = page.evaluate("""
                 () => {
@@ -367,58 +416,10 @@ class YandexMarketParser(MarketplaceParserInterface):
         except Exception as e:
             print(f"⚠️ Яндекс Маркет: Ошибка поиска product в window: {e}")
             pass
-        
-        print("⚠️ Яндекс Маркет: Не удалось найти данные в JS объектах, будет использован DOM fallback")
         return None
-        
-        # Способ 3: Ищем JSON-LD данные
-        try:
-            json_ld_data = page.evaluate("""
-                () => {
-                    const scripts = document.querySelectorAll('script[type="application/ld+json"]');
-                    for (const script of scripts) {
-                        try {
-                            const data = JSON.parse(script.textContent);
-                            if (data['@type'] === 'Product') {
-                                return data;
-                            }
-                        } catch (e) {}
-                    }
-                    return null;
-                }
-            """)
-            
-            if json_ld_data:
-                return json_ld_data
-        except Exception:
-            pass
-        
-        # Способ 4: Ищем данные в скриптах
-        try:
-            script_data = page.evaluate("""
-                () => {
-                    const scripts = document.querySelectorAll('script');
-                    for (const script of scripts) {
-                        if (script.textContent) {
-                            // Ищем __INITIAL_DATA__
-                            const match = script.textContent.match(/window\\.__INITIAL_DATA__\\s*=\\s*({.+?});/s);
-                            if (match) {
-                                try {
-                                    return JSON.parse(match[1]);
-                                } catch (e) {}
-                            }
-                        }
-                    }
-                    return null;
-                }
-            """)
-            
-            if script_data and 'product' in script_data:
-                return script_data['product']
-        except Exception:
-            pass
-        
-        # Способ 5: Из DOM элементов (улучшенная версия)
+
+    def _extract_from_dom_aggressive(self, page: Page) -> Optional[Dict[str, Any]]:
+        """Агрессивный поиск данных в DOM (расширенные наборы селекторов)"""
         try:
             dom_data = page.evaluate("""
                 () => {
@@ -707,6 +708,76 @@ class YandexMarketParser(MarketplaceParserInterface):
         
         return 0
 
+    def _spec_url(self, clean_url: str) -> str:
+        """URL страницы характеристик: /product--slug/123 -> /product--slug/123/spec"""
+        base = clean_url.split('#')[0].rstrip('/')
+        return base if base.endswith('/spec') else f"{base}/spec"
+
+    def _start_spec_page(self, page: Page, clean_url: str) -> Optional[Page]:
+        """Открывает /spec во второй вкладке без ожидания загрузки (картинки, шрифты и стили заблокированы)"""
+        try:
+            spec_page = page.context.new_page()
+            # Остальные запросы - дальше по цепочке (при воспроизведении - в HAR-архив)
+            spec_page.route("**/*", blocking_route_handler(SPEC_BLOCKED_RESOURCES))
+            # wait_until='commit' возвращает управление сразу после ответа сервера,
+            # дальше страница грузится параллельно с ожиданием основной вкладки
+            spec_page.goto(self._page_url(self._spec_url(clean_url)), wait_until='commit', timeout=self.timeout)
+            return spec_page
+        except Exception as e:
+            print(f"⚠️ Яндекс Маркет: Не удалось открыть страницу характеристик: {e}")
+            return None
+
+    def _collect_spec_page(self, spec_page: Page) -> Dict[str, str]:
+        """Дожидается страницы /spec, читает характеристики и закрывает вкладку"""
+        try:
+            spec_page.wait_for_load_state('domcontentloaded', timeout=min(self.timeout, 15000))
+            if self._detect_spec_challenge(spec_page):
+                return {}
+            try:
+                spec_page.wait_for_selector('dl, [data-auto*="spec"]', timeout=5000)
+            except PlaywrightTimeoutError:
+                pass
+            specs = spec_page.evaluate("""
+                () => {
+                    const specs = {};
+                    const roots = document.querySelectorAll(
+                        '[data-auto="product-full-specs"], [data-zone-name="productSpecifications"], [data-auto*="specs"]'
+                    );
+                    const scope = roots.length ? Array.from(roots) : [document];
+                    for (const root of scope) {
+                        root.querySelectorAll('dl').forEach(dl => {
+                            const name = dl.querySelector('dt');
+                            const value = dl.querySelector('dd');
+                            if (name && value) {
+                                const key = name.textContent.replace(/\\s+/g, ' ').trim();
+                                const text = value.textContent.replace(/\\s+/g, ' ').trim();
+                                if (key && text && !(key in specs)) specs[key] = text;
+                            }
+                        });
+                    }
+                    return specs;
+                }
+            """)
+            if specs:
+                print(f"✅ Яндекс Маркет: Со страницы /spec получено характеристик: {len(specs)}")
+            return specs or {}
+        except Exception as e:
+            print(f"⚠️ Яндекс Маркет: Не удалось прочитать страницу характеристик: {e}")
+            return {}
+        finally:
+            try:
+                spec_page.close()
+            except Exception:
+                pass
+
+    def _detect_spec_challenge(self, spec_page: Page) -> bool:
+        """Капча на /spec не прерывает парсинг - просто остаемся с характеристиками карточки"""
+        try:
+            self._check_challenge(spec_page)
+            return False
+        except CaptchaDetectedError:
+            return True
+
     def _extract_characteristics(self, product_data: Dict[str, Any]) -> Dict[str, str]:
         """Извлекает характеристики товара"""
         characteristics = {}
@@ -736,17 +807,6 @@ class YandexMarketParser(MarketplaceParserInterface):
         
         return characteristics
 
-    def _extract_composition(self, product_data: Dict[str, Any]) -> str:
-        """Извлекает состав из характеристик"""
-        characteristics = self._extract_characteristics(product_data)
-        composition_keys = ["Состав", "Материал", "Composition", "Material", "Материалы"]
-        
-        for key in composition_keys:
-            if key in characteristics:
-                return str(characteristics[key])
-        
-        return ""
-
     def _extract_images(self, product_data: Dict[str, Any], page: Page) -> list[str]:
         """Извлекает изображения товара"""
         images = []
@@ -6,27 +6,28 @@ import time
 import random
 from typing import Dict, Any
 from .base import MarketplaceParserInterface
+from .errors import ParseTimeoutError, ParserError, StructureChangedError
+from .record import ProductRecord
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
 
 class YandexMarketParserSimple(MarketplaceParserInterface):
     """Упрощенный парсер Яндекс Маркет с улучшенной надежностью"""
-    
-    def parse(self) -> Dict[str, Any]:
+
+    marketplace = "ym"
+    marketplace_name = "Яндекс Маркет"
+
+    def parse(self) -> ProductRecord:
         playwright = None
         browser = None
         try:
             playwright, browser, page = self._get_browser_page()
             
-            # Убираем параметры из URL для избежания капчи
-            clean_url = self.url.split('?')[0]
+            # URL уже канонический: без параметров (они провоцируют капчу и не влияют на товар)
+            clean_url = self.url
             
-            # Открываем страницу
-            page.goto(clean_url, wait_until='networkidle', timeout=self.timeout)
-            
-            # Проверка на капчу
-            if 'captcha' in page.url.lower() or 'smartcaptcha' in page.content().lower():
-                raise ValueError("Обнаружена капча на Яндекс Маркет. Попробуйте позже.")
+            # Открываем страницу и сразу проверяем на капчу
+            self._open_product_page(page, clean_url)
             
             self._wait_for_page_load(page)
             
@@ -34,19 +35,20 @@ class YandexMarketParserSimple(MarketplaceParserInterface):
             result = self._extract_data(page)
             
             if not result.get("title") or len(result["title"]) < 3:
-                raise ValueError("Не удалось извлечь название товара с Яндекс Маркет")
+                raise StructureChangedError("Яндекс Маркет", "Не удалось извлечь название товара с Яндекс Маркет")
             
-            return result
+            # Состав вычисляется в ProductRecord из характеристик
+            return ProductRecord.from_dict(result)
             
+        except ParserError:
+            # Типизированные ошибки (капча, отмена) отдаем как есть
+            raise
         except PlaywrightTimeoutError:
-            raise ValueError("Превышено время ожидания загрузки страницы Яндекс Маркет")
+            raise ParseTimeoutError("Яндекс Маркет")
         except Exception as e:
             raise ValueError(f"Ошибка при парсинге Яндекс Маркет: {str(e)}")
         finally:
-            if browser:
-                browser.close()
-            if playwright:
-                playwright.stop()
+            self._close_browser(playwright, browser)
     
     def _extract_data(self, page: Page) -> Dict[str, Any]:
         """Извлекает данные товара"""
@@ -262,11 +264,4 @@ class YandexMarketParserSimple(MarketplaceParserInterface):
                 if not result["characteristics"] and dom_data.get("characteristics"):
                     result["characteristics"] = dom_data["characteristics"]
         
-        # Извлекаем состав из характеристик
-        composition_keys = ["Состав", "Материал", "Composition", "Material"]
-        for key in composition_keys:
-            if key in result["characteristics"]:
-                result["composition"] = result["characteristics"][key]
-                break
-        
         return result
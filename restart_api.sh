@@ -12,5 +12,14 @@ sleep 1
 echo "🚀 Запуск нового процесса..."
 python3 api_server.py &
 
+# Ждем готовности: при PARSER_WARMUP=true /api/ready отвечает 503, пока идет прогрев
+PORT=${FLASK_PORT:-5001}
+for i in $(seq 1 60); do
+    if curl -sf "http://127.0.0.1:${PORT}/api/ready" > /dev/null 2>&1; then
+        break
+    fi
+    sleep 1
+done
+
 echo "✅ API сервер перезапущен!"
 echo "📝 Проверьте логи: tail -f /tmp/api_server.log"
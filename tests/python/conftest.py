@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Статистика стратегий в тестах не пишется на диск (синглтон создается при импорте parsers)
+os.environ.setdefault('STRATEGY_STATS_PATH', '')
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from parsers.changes import ChangeFeed
+
+URL = 'https://www.wildberries.ru/catalog/1/detail.aspx'
+PRODUCT = {'title': 'Товар', 'price': 100, 'images': []}
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    monkeypatch.setenv('CHANGE_FEED_DIR', str(tmp_path))
+    return ChangeFeed()
+
+
+def test_unchanged_result_is_not_persisted(feed):
+    feed.observe(URL, PRODUCT)
+    size = os.path.getsize(feed.snapshots_path)
+    feed.observe(URL, PRODUCT)
+    assert os.path.getsize(feed.snapshots_path) == size
+
+    feed.observe(URL, dict(PRODUCT, price=120))
+    assert ChangeFeed().last_known('wb:1')['price'] == 120
+
+
+def test_offset_inside_line_moves_to_next_line(feed):
+    feed.observe(URL, PRODUCT)
+    feed.observe(URL, dict(PRODUCT, price=120))
+    events, next_offset = feed.read(0)
+    assert [event['type'] for event in events] == ['product_added', 'price_changed']
+
+    tail, tail_offset = feed.read(3)
+    assert [event['offset'] for event in tail] == [events[1]['offset']]
+    assert tail_offset == next_offset
+
+
+def test_malformed_line_is_skipped(feed):
+    feed.observe(URL, PRODUCT)
+    with open(feed.log_path, 'ab') as log:
+        log.write(b'{broken\n')
+    feed.observe(URL, dict(PRODUCT, price=120))
+
+    events, next_offset = feed.read(0)
+    assert [event['type'] for event in events] == ['product_added', 'price_changed']
+    assert next_offset == os.path.getsize(feed.log_path)
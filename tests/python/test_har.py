@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from parsers.base import MarketplaceParserInterface, blocking_route_handler
+
+
+class FakeRoute:
+    def __init__(self, resource_type):
+        self.request = SimpleNamespace(resource_type=resource_type)
+        self.calls = []
+
+    def abort(self):
+        self.calls.append('abort')
+
+    def fallback(self):
+        self.calls.append('fallback')
+
+    def continue_(self):
+        self.calls.append('continue')
+
+
+def test_allowed_requests_fall_back_to_har_route():
+    handle = blocking_route_handler(('image', 'font'))
+    routes = [FakeRoute(resource_type) for resource_type in ('document', 'image', 'xhr', 'font', 'script')]
+    for route in routes:
+        handle(route)
+    assert [route.calls for route in routes] == [['fallback'], ['abort'], ['fallback'], ['abort'], ['fallback']]
+
+
+class Parser(MarketplaceParserInterface):
+    marketplace = 'wb'
+    marketplace_name = 'Wildberries'
+
+    def parse(self):
+        return None
+
+
+def test_network_response_during_replay_is_recorded():
+    parser = Parser('https://www.wildberries.ru/catalog/1/detail.aspx')
+    parser.replay_leaks = []
+    archived = SimpleNamespace(url='https://www.wildberries.ru/catalog/1/detail.aspx', server_addr=lambda: None)
+    live = SimpleNamespace(url='https://static.wbstatic.net/app.js',
+                           server_addr=lambda: {'ipAddress': '185.62.200.1', 'port': 443})
+    parser._check_replay_response(archived)
+    parser._check_replay_response(live)
+    assert parser.replay_leaks == ['https://static.wbstatic.net/app.js']
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from parsers import hedging
+from parsers.base import MarketplaceParserInterface
+from parsers.errors import ParseCancelledError
+from parsers.hedging import HedgedParser
+from parsers.record import ProductRecord
+
+URL = 'https://www.wildberries.ru/catalog/1/detail.aspx'
+
+
+class FakeParser(MarketplaceParserInterface):
+    marketplace = 'wb'
+    marketplace_name = 'Wildberries'
+
+    def __init__(self, result=None, duration=0.0):
+        super().__init__(URL)
+        self.result = result
+        self.duration = duration
+        self.finished = threading.Event()
+
+    def parse(self):
+        try:
+            deadline = time.time() + self.duration
+            while time.time() < deadline:
+                self._sleep(0.01)
+            return self.result
+        finally:
+            self.finished.set()
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(hedging, 'hedge_delay', lambda marketplace, implementation: 0.05)
+
+
+def test_best_partial_picks_fuller_record():
+    primary = FakeParser(ProductRecord(title='Кружка'), duration=0.1)
+    alternate = FakeParser(ProductRecord(title='Кружка', images=['https://a/1.jpg'], description='Белая'))
+
+    result = HedgedParser(primary, alternate).parse()
+
+    assert result.description == 'Белая'
+
+
+def test_best_partial_single_result():
+    primary = FakeParser(ProductRecord(title='Кружка'), duration=0.1)
+    alternate = FakeParser(None)
+
+    assert HedgedParser(primary, alternate).parse().title == 'Кружка'
+
+
+def test_loser_keeps_cancel_event_until_done():
+    primary = FakeParser(ProductRecord(title='Кружка'), duration=5)
+    alternate = FakeParser(ProductRecord(title='Кружка', price=100))
+
+    result = HedgedParser(primary, alternate).parse()
+
+    assert result.price == 100
+    # Отмена проигравшей стороны не сброшена - она останавливается на ближайшей паузе
+    assert primary.finished.wait(1)
+    assert primary.cancel_event is None
+
+
+def test_outer_cancel_stops_both_sides():
+    primary = FakeParser(ProductRecord(title='Кружка'), duration=5)
+    alternate = FakeParser(ProductRecord(title='Кружка'), duration=5)
+    parser = HedgedParser(primary, alternate)
+    outer = threading.Event()
+    parser.cancel_event = outer
+    threading.Timer(0.2, outer.set).start()
+
+    start = time.time()
+    with pytest.raises(ParseCancelledError):
+        parser.parse()
+
+    assert time.time() - start < 2
+    assert primary.finished.wait(1) and alternate.finished.wait(1)
+    assert parser.cancel_event is outer
@@ -0,0 +1,53 @@
+import socket
+
+import pytest
+
+from parsers import images
+from parsers.images import ImageStore, is_allowed_image_url
+
+
+@pytest.fixture
+def resolve(monkeypatch):
+    addresses = {}
+
+    def getaddrinfo(host, port, proto=0):
+        return [(socket.AF_INET, socket.SOCK_STREAM, proto, '', (addresses.get(host, '93.158.134.3'), 443))]
+
+    monkeypatch.setattr(images.socket, 'getaddrinfo', getaddrinfo)
+    return addresses
+
+
+def test_allows_marketplace_cdn(resolve):
+    assert is_allowed_image_url('https://basket-12.wbbasket.ru/vol1/part1/1/images/big/1.webp')
+    assert is_allowed_image_url('https://ir.ozone.ru/s3/multimedia-1/wc1000/1.jpg')
+    assert is_allowed_image_url('https://avatars.mds.yandex.net/get-mpic/1/img/orig')
+
+
+@pytest.mark.parametrize('url', [
+    'http://localhost:5001/api/health',
+    'http://127.0.0.1/',
+    'http://169.254.169.254/latest/meta-data/',
+    'https://evil.example.com/wbbasket.ru.jpg',
+    'https://wbbasket.ru.evil.example.com/1.jpg',
+    'file:///etc/passwd',
+])
+def test_rejects_foreign_hosts(resolve, url):
+    assert not is_allowed_image_url(url)
+
+
+def test_rejects_cdn_name_resolving_to_private_address(resolve):
+    resolve['basket-01.wbbasket.ru'] = '10.0.0.5'
+    assert not is_allowed_image_url('https://basket-01.wbbasket.ru/1.webp')
+
+
+def test_index_is_appended_not_rewritten(tmp_path):
+    store = ImageStore(str(tmp_path))
+    store.put('https://a/1.jpg', b'one')
+    store.flush()
+    store.put('https://a/2.jpg', b'two')
+    store.put('https://a/1.jpg', b'one')
+    store.flush()
+
+    lines = (tmp_path / 'index.jsonl').read_text().splitlines()
+    assert len(lines) == 2
+    assert ImageStore(str(tmp_path)).lookup('https://a/2.jpg')
@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from import_products import BulkImporter, ImportStats, load_checkpoint
+
+
+def write_checkpoint(path, *lines):
+    path.write_text(''.join(f"{key}\t{status}\n" for key, status in lines), encoding='utf-8')
+
+
+def test_resume_skips_every_processed_key(tmp_path):
+    path = tmp_path / 'products.jsonl.checkpoint'
+    write_checkpoint(path, ('wb:1', 'ok'), ('wb:2', 'error'), ('ozon:3', 'error'), ('ozon:3', 'ok'))
+    assert load_checkpoint(str(path), retry_failed=False) == {'wb:1', 'wb:2', 'ozon:3'}
+
+
+@pytest.mark.parametrize('lines', [
+    (('ozon:3', 'error'), ('ozon:3', 'ok')),
+    (('ozon:3', 'ok'), ('ozon:3', 'error')),
+])
+def test_retry_failed_keeps_keys_with_ok_line(tmp_path, lines):
+    path = tmp_path / 'products.jsonl.checkpoint'
+    write_checkpoint(path, ('wb:1', 'ok'), ('wb:2', 'error'), *lines)
+    assert load_checkpoint(str(path), retry_failed=True) == {'wb:1', 'ozon:3'}
+
+
+def test_missing_checkpoint(tmp_path):
+    assert load_checkpoint(str(tmp_path / 'missing'), retry_failed=True) == set()
+
+
+class RecordingImporter(BulkImporter):
+    """_process без парсинга: запоминает порядок запуска и пиковую параллельность"""
+
+    def __init__(self, per_marketplace, workers, duration=0.02):
+        super().__init__('unused', 'unused', per_marketplace, workers)
+        self.duration = duration
+        self.started = []
+        self.running = {}
+        self.peak = {}
+        self.peak_total = 0
+        self._stats_lock = threading.Lock()
+
+    def _process(self, url, key, marketplace, stats):
+        with self._stats_lock:
+            self.started.append(key)
+            self.running[marketplace] = self.running.get(marketplace, 0) + 1
+            self.peak[marketplace] = max(self.peak.get(marketplace, 0), self.running[marketplace])
+            self.peak_total = max(self.peak_total, sum(self.running.values()))
+        time.sleep(self.duration)
+        with self._stats_lock:
+            self.running[marketplace] -= 1
+
+    def dispatch(self, pending):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for future in self._dispatch(pool, pending, ImportStats(len(pending))):
+                future.result()
+
+
+def tasks(marketplace, count):
+    return [(f"https://{marketplace}/{i}", f"{marketplace}:{i}", marketplace) for i in range(count)]
+
+
+def test_per_marketplace_cap_on_sorted_input():
+    importer = RecordingImporter(per_marketplace=2, workers=6)
+    importer.dispatch(tasks('wb', 6) + tasks('ozon', 6))
+    assert importer.peak == {'wb': 2, 'ozon': 2}
+    assert importer.peak_total == 4
+    # Отсортированный список не ждет окончания всех wb: ozon стартует в первом же круге
+    assert importer.started.index('ozon:0') < 2 + 2
+
+
+def test_marketplaces_are_picked_round_robin():
+    importer = RecordingImporter(per_marketplace=1, workers=1, duration=0)
+    importer.dispatch(tasks('wb', 3) + tasks('ozon', 2) + tasks('ym', 1))
+    assert importer.started == ['wb:0', 'ozon:0', 'ym:0', 'wb:1', 'ozon:1', 'wb:2']
+
+
+def test_short_links_are_not_resolved_before_parsing(tmp_path, monkeypatch):
+    def resolve_short_link(url):
+        raise AssertionError('short link resolved on the main thread')
+
+    monkeypatch.setattr('parsers.urls.resolve_short_link', resolve_short_link)
+    importer = RecordingImporter(per_marketplace=1, workers=1, duration=0)
+    importer.checkpoint_path = str(tmp_path / 'checkpoint')
+    importer.run(['https://ozon.ru/t/AbCd', 'https://ozon.ru/t/AbCd', 'https://example.com/x'])
+    assert importer.started == ['ozon:https://www.ozon.ru/t/AbCd']
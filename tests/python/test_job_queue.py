@@ -0,0 +1,22 @@
+from parsers.job_queue import JobQueue
+
+
+def test_options_are_stored_with_job(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'))
+    job_id = queue.enqueue('https://www.wildberries.ru/catalog/1/detail.aspx', dedupe_key='wb:1',
+                           options={'profile': 'mobile', 'variants': True})
+    job = queue.lease('worker')
+    assert job['id'] == job_id
+    assert job['options'] == {'profile': 'mobile', 'variants': True}
+
+
+def test_dedupe_respects_options(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'))
+    url = 'https://www.wildberries.ru/catalog/1/detail.aspx'
+    plain = queue.enqueue(url, dedupe_key='wb:1')
+    assert queue.enqueue(url, dedupe_key='wb:1') == plain
+    mobile = queue.enqueue(url, dedupe_key='wb:1', options={'profile': 'mobile'})
+    assert mobile != plain
+    assert queue.enqueue(url, dedupe_key='wb:1', options={'profile': 'mobile'}) == mobile
+    assert queue.get(plain)['options'] == {}
+
@@ -0,0 +1,54 @@
+import pytest
+
+from parsers.errors import ParserError
+from parsers.ozon import OzonParser
+
+
+class FakePage:
+    # Адрес переписан хостом mock-сервера (PARSER_HOST_MAP) - с self.url не совпадает
+    url = 'http://127.0.0.1:8099/ozon/product/item-1/'
+
+    def __init__(self):
+        self.load_states = []
+
+    def wait_for_load_state(self, state, timeout=None):
+        self.load_states.append(state)
+
+
+class Rendered(ParserError):
+    """Рендер начался - дальше тест не идет"""
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    parser = OzonParser('https://www.ozon.ru/product/item-1/')
+    page = FakePage()
+    opened = []
+    monkeypatch.setattr(parser, '_get_browser_page', lambda: (None, None, page))
+    monkeypatch.setattr(parser, '_close_browser', lambda playwright, browser: None)
+    monkeypatch.setattr(parser, '_open_product_page', lambda page, url, wait_until='networkidle': opened.append(url))
+    monkeypatch.setattr(parser, '_wait_for_page_load', lambda page: None)
+    monkeypatch.setattr(parser, '_sleep', lambda seconds: None)
+
+    def extract(page):
+        raise Rendered()
+
+    monkeypatch.setattr(parser, '_extract_product_data', extract)
+    parser.page, parser.opened = page, opened
+    return parser
+
+
+def test_render_reuses_page_opened_by_api_path(parser, monkeypatch):
+    monkeypatch.setattr(parser, '_fetch_api_page', lambda page, path, extra='': None)
+    with pytest.raises(Rendered):
+        parser.parse()
+    assert parser.opened == ['https://www.ozon.ru/product/item-1/']
+    assert parser.page.load_states == ['networkidle']
+
+
+def test_render_opens_page_when_api_path_did_not(parser, monkeypatch):
+    parser.use_api = False
+    with pytest.raises(Rendered):
+        parser.parse()
+    assert parser.opened == ['https://www.ozon.ru/product/item-1/']
+    assert parser.page.load_states == []
@@ -0,0 +1,62 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from parsers.process_pool import ProcessParsePool, _Worker
+
+URL = 'https://www.wildberries.ru/catalog/1/detail.aspx'
+
+
+class FakeConn:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.sent = []
+
+    def send(self, message):
+        if self.broken:
+            raise OSError('broken pipe')
+        self.sent.append(message)
+
+
+def ready_worker(conn):
+    worker = _Worker(SimpleNamespace(pid=1), conn)
+    worker.ready = True
+    return worker
+
+
+def pool_with(*workers):
+    # Процессы не запускаются: задачи кладутся в очередь напрямую, как это делает submit
+    pool = ProcessParsePool(processes=len(workers))
+    pool._workers = list(workers)
+    return pool
+
+
+def test_task_is_requeued_when_send_fails():
+    dead = ready_worker(FakeConn(broken=True))
+    pool = pool_with(dead)
+    future = Future()
+    pool._pending.append((1, URL, {}, future, None))
+
+    pool._assign()
+    assert dead.task is None and not dead.ready
+    assert len(pool._pending) == 1
+    assert future.running() and not future.done()
+
+    # Замена воркера: задача уходит новому, а не падает ошибкой аварийного завершения
+    alive = ready_worker(FakeConn())
+    pool._workers = [alive]
+    pool._assign()
+    assert not pool._pending
+    assert alive.conn.sent == [(1, URL, {})]
+    assert alive.task[1] is future
+
+
+def test_requeued_task_goes_to_next_ready_worker():
+    dead, alive = ready_worker(FakeConn(broken=True)), ready_worker(FakeConn())
+    pool = pool_with(dead, alive)
+    first, second = Future(), Future()
+    pool._pending.extend([(1, URL, {}, first, None), (2, URL, {}, second, None)])
+
+    pool._assign()
+    assert alive.conn.sent == [(1, URL, {})]
+    assert [task[0] for task in pool._pending] == [2]
+    assert not second.running()
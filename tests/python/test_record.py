@@ -0,0 +1,54 @@
+import json
+
+from parsers.record import ProductRecord, dumps, loads
+
+DATA = {
+    "title": "Платье",
+    "price": 1990,
+    "old_price": 2990,
+    "description": "Летнее платье",
+    "category": "Одежда",
+    "characteristics": {"Состав": "хлопок 100%", "Цвет": "синий"},
+    "composition": "хлопок 100%",
+    "images": ["https://basket-01.wbbasket.ru/vol1/part1/1/images/big/1.webp"],
+    "in_stock": True,
+    "variants": [{"id": "2"}],
+}
+
+
+def test_from_dict_keeps_unknown_keys_in_extra():
+    record = ProductRecord.from_dict(DATA)
+    assert record.title == "Платье"
+    assert record.extra == {"variants": [{"id": "2"}]}
+    assert record["variants"] == [{"id": "2"}]
+    assert record.to_dict() == DATA
+
+
+def test_composition_is_derived_from_characteristics():
+    record = ProductRecord.from_dict({"title": "x", "characteristics": {"Материал": "шерсть", "Пусто": ""}})
+    assert record.composition == "шерсть"
+    assert record.characteristics == {"Материал": "шерсть"}
+
+
+def test_mapping_interface():
+    record = ProductRecord.from_dict(DATA)
+    assert list(record) == list(DATA)
+    assert len(record) == len(DATA)
+    assert list(record.keys()) == list(DATA)
+    assert list(record.values()) == list(DATA.values())
+    assert dict(record.items()) == DATA
+    assert dict(record) == DATA
+    assert "variants" in record and "missing" not in record
+    assert record.get("missing", 1) == 1
+
+    record["sku"] = "42"
+    assert len(record) == len(DATA) + 1
+    assert record == dict(DATA, sku="42")
+
+
+def test_dumps_loads_round_trip():
+    record = ProductRecord.from_dict(DATA)
+    payload = dumps({"data": record})
+    assert isinstance(payload, bytes)
+    assert json.loads(payload.decode("utf-8")) == {"data": DATA}
+    assert ProductRecord.from_dict(loads(payload)["data"]) == record
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from parsers.base import PROGRESS_RESET, MarketplaceParserInterface
+from parsers.errors import CaptchaDetectedError, ParseTimeoutError, ProductNotFoundError
+from parsers.record import ProductRecord
+from parsers.retry import RetryingParser, retry_stats
+
+URL = 'https://www.wildberries.ru/catalog/1/detail.aspx'
+COMPLETE = ProductRecord(title='Платье', price=1990)
+
+
+class ScriptedParser(MarketplaceParserInterface):
+    """Отдает исходы по очереди: исключение бросается, запись возвращается"""
+
+    marketplace = 'wb'
+    marketplace_name = 'Wildberries'
+
+    def __init__(self, *outcomes):
+        super().__init__(URL)
+        self.outcomes = list(outcomes)
+        self.fingerprints = []
+
+    def parse(self):
+        self.fingerprints.append(self.profile.fingerprint)
+        if self.progress is not None:
+            self.progress('identity', {'title': f"attempt {len(self.fingerprints)}"}, 'json_ld')
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(RetryingParser, '_sleep', lambda self, seconds: delays.append(seconds))
+    return delays
+
+
+def retrying(*outcomes, retries=3):
+    inner = ScriptedParser(*outcomes)
+    return RetryingParser(inner, retries=retries), inner
+
+
+def test_captcha_retries_with_new_fingerprint(sleeps):
+    parser, inner = retrying(CaptchaDetectedError('Wildberries', 'title'), COMPLETE)
+    assert parser.parse() == COMPLETE
+    assert inner.fingerprints == [0, 1]
+    # Длинный отступ класса captcha: base 8с, половина - джиттер
+    assert 4.0 <= sleeps[0] <= 8.0
+    # Отпечаток восстанавливается после парсинга
+    assert inner.profile.fingerprint == 0
+
+
+def test_timeout_retries_with_same_fingerprint(sleeps):
+    parser, inner = retrying(ParseTimeoutError('Wildberries'), ParseTimeoutError('Wildberries'), COMPLETE)
+    assert parser.parse() == COMPLETE
+    assert inner.fingerprints == [0, 0, 0]
+    assert 1.0 <= sleeps[0] <= 2.0 and 2.0 <= sleeps[1] <= 4.0
+
+
+def test_not_found_is_not_retried(sleeps):
+    parser, inner = retrying(ProductNotFoundError('Wildberries'), COMPLETE)
+    with pytest.raises(ProductNotFoundError):
+        parser.parse()
+    assert len(inner.fingerprints) == 1
+    assert sleeps == []
+
+
+def test_class_limit_stops_retries(sleeps):
+    parser, inner = retrying(*[CaptchaDetectedError('Wildberries', 'title')] * 4, retries=5)
+    with pytest.raises(CaptchaDetectedError):
+        parser.parse()
+    # Политика captcha: не больше 2 повторов, каждый - с новым отпечатком
+    assert inner.fingerprints == [0, 1, 2]
+
+
+def test_incomplete_result_is_retried_as_structure(sleeps):
+    partial = ProductRecord(title='Платье')
+    parser, inner = retrying(partial, partial)
+    assert parser.parse() is partial
+    assert inner.fingerprints == [0, 1]
+
+
+def test_retry_beyond_deadline_is_skipped(sleeps):
+    before = retry_stats.snapshot().get('wb', {}).get('out_of_budget', 0)
+    parser, inner = retrying(CaptchaDetectedError('Wildberries', 'title'), COMPLETE)
+    # Отступ captcha не меньше 4с - в оставшуюся секунду не укладывается
+    parser.deadline = time.time() + 1
+    with pytest.raises(CaptchaDetectedError):
+        parser.parse()
+    assert len(inner.fingerprints) == 1
+    assert sleeps == []
+    assert retry_stats.snapshot()['wb']['out_of_budget'] == before + 1
+
+
+def test_progress_is_reset_before_retry(sleeps):
+    events = []
+    parser, inner = retrying(ParseTimeoutError('Wildberries'), COMPLETE)
+    parser.progress = lambda group, fields, strategy: events.append((group, fields))
+    parser.parse()
+    assert events == [
+        ('identity', {'title': 'attempt 1'}),
+        (PROGRESS_RESET, {'attempt': 2, 'reason': 'timeout'}),
+        ('identity', {'title': 'attempt 2'}),
+    ]
@@ -0,0 +1,52 @@
+from parsers.base import MarketplaceParserInterface
+from parsers.strategies import strategy_stats
+
+URL = 'https://www.wildberries.ru/catalog/1/detail.aspx'
+
+
+class FakeParser(MarketplaceParserInterface):
+    marketplace = 'test-strategies'
+    marketplace_name = 'Test'
+
+    def parse(self):
+        raise NotImplementedError
+
+
+def test_dom_fallbacks_never_outrank_learned_strategies(monkeypatch):
+    monkeypatch.setattr(strategy_stats, 'exploration', 0)
+    # DOM-стратегия мгновенная и всегда успешная, JSON - медленнее
+    for _ in range(20):
+        strategy_stats.record('test-strategies', 'product_data', 'dom_basic', True, 0.01)
+        strategy_stats.record('test-strategies', 'product_data', 'initial_state', True, 2.0)
+    calls = []
+
+    def strategy(name, data):
+        def run(page):
+            calls.append(name)
+            return data
+        return run
+
+    data, name = FakeParser(URL)._run_strategies(
+        None, 'product_data', [('initial_state', strategy('initial_state', {'title': 'json'}))],
+        lambda data: bool(data.get('title')),
+        fallbacks=[('dom_basic', strategy('dom_basic', {'title': 'dom'}))])
+
+    assert (data['title'], name) == ('json', 'initial_state')
+    assert calls == ['initial_state']
+
+
+def test_fallbacks_run_in_fixed_order_after_learned():
+    calls = []
+
+    def strategy(name, data=None):
+        def run(page):
+            calls.append(name)
+            return data
+        return run
+
+    data, name = FakeParser(URL)._run_strategies(
+        None, 'product_data', [('json_ld', strategy('json_ld'))], lambda data: True,
+        fallbacks=[('dom_only', strategy('dom_only')), ('dom_aggressive', strategy('dom_aggressive', {'title': 'x'}))])
+
+    assert name == 'dom_aggressive'
+    assert calls == ['json_ld', 'dom_only', 'dom_aggressive']
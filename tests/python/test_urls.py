@@ -0,0 +1,127 @@
+import urllib.error
+
+import pytest
+
+from parsers import urls
+from parsers.base import MarketplaceParserInterface
+
+
+@pytest.mark.parametrize('url, marketplace, product_id, canonical_url', [
+    ('https://www.wildberries.ru/catalog/123456/detail.aspx?targetUrl=GP&size=1', 'wb', '123456',
+     'https://www.wildberries.ru/catalog/123456/detail.aspx'),
+    ('https://m.wildberries.ru/catalog/123456/feedbacks#top', 'wb', '123456',
+     'https://www.wildberries.ru/catalog/123456/detail.aspx'),
+    ('wildberries.ru/catalog/123456/detail.aspx', 'wb', '123456',
+     'https://www.wildberries.ru/catalog/123456/detail.aspx'),
+    ('https://wb.ru/catalog/123456/detail.aspx', 'wb', '123456',
+     'https://www.wildberries.ru/catalog/123456/detail.aspx'),
+    ('https://www.wildberries.kz/catalog/123456/detail.aspx', 'wb', '123456',
+     'https://www.wildberries.kz/catalog/123456/detail.aspx'),
+    ('https://m.ozon.ru/product/krossovki-987654/?from=share', 'ozon', '987654',
+     'https://www.ozon.ru/product/krossovki-987654/'),
+    ('https://ozon.by/product/krossovki-987654/', 'ozon', '987654', 'https://ozon.by/product/krossovki-987654/'),
+    ('https://www.ozon.kz/context/detail/id/987654/', 'ozon', '987654',
+     'https://ozon.kz/context/detail/id/987654/'),
+    ('https://market.yandex.ru/product--chainik/42?sku=1', 'ym', '42', 'https://market.yandex.ru/product--chainik/42'),
+])
+def test_canonicalize(url, marketplace, product_id, canonical_url):
+    identity = urls.canonicalize(url, resolve=False)
+    assert identity == (marketplace, product_id, canonical_url)
+    assert identity.key == f"{marketplace}:{product_id}"
+
+
+@pytest.mark.parametrize('url', [
+    'https://example.com/?q=wildberries.ru',
+    'https://wildberries.ru.example.com/catalog/1/detail.aspx',
+    'https://notozon.ru/product/x-1/',
+])
+def test_marketplace_is_detected_by_host_only(url):
+    identity = urls.canonicalize(url, resolve=False)
+    assert identity.marketplace is None
+    assert identity.key.startswith('unknown:')
+
+
+def test_regional_storefront_shares_key():
+    assert urls.canonicalize('https://ozon.kz/product/x-5/', resolve=False).key == \
+        urls.canonicalize('https://www.ozon.ru/product/x-5/', resolve=False).key
+
+
+def test_short_link_is_resolved_once(monkeypatch):
+    calls = []
+
+    class Response:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def geturl(self):
+            return 'https://www.ozon.ru/product/x-77/?utm=share'
+
+    def urlopen(request, timeout):
+        calls.append(request.full_url)
+        return Response()
+
+    monkeypatch.setattr(urls.urllib.request, 'urlopen', urlopen)
+    monkeypatch.setattr(urls, '_short_links', urls._ShortLinkCache(10))
+    for _ in range(2):
+        identity = urls.canonicalize('https://ozon.ru/t/Abc')
+    assert identity == ('ozon', '77', 'https://www.ozon.ru/product/x-77/')
+    assert len(calls) == 1
+
+
+def test_http_error_on_short_link_expires(monkeypatch):
+    calls = []
+
+    def urlopen(request, timeout):
+        calls.append(request.full_url)
+        raise urllib.error.HTTPError(request.full_url, 429, 'Too Many Requests', {}, None)
+
+    monkeypatch.setattr(urls.urllib.request, 'urlopen', urlopen)
+    monkeypatch.setattr(urls, '_short_links', urls._ShortLinkCache(10))
+    urls.canonicalize('https://ozon.ru/t/Limited')
+    urls.canonicalize('https://ozon.ru/t/Limited')
+    assert len(calls) == 1
+
+    monkeypatch.setattr(urls, 'SHORT_LINK_FAILURE_TTL', 0)
+    urls.canonicalize('https://ozon.ru/t/Again')
+    urls.canonicalize('https://ozon.ru/t/Again')
+    assert len(calls) == 3
+
+
+def test_failed_short_link_is_cached(monkeypatch):
+    calls = []
+
+    def urlopen(request, timeout):
+        calls.append(request.full_url)
+        raise urllib.error.URLError('timed out')
+
+    monkeypatch.setattr(urls.urllib.request, 'urlopen', urlopen)
+    monkeypatch.setattr(urls, '_short_links', urls._ShortLinkCache(10))
+    for _ in range(3):
+        identity = urls.canonicalize('https://www.ozon.ru/t/AbCdEf')
+    assert identity.product_id is None
+    assert len(calls) == 1
+
+    monkeypatch.setattr(urls, 'SHORT_LINK_FAILURE_TTL', 0)
+    urls.canonicalize('https://ozon.ru/t/Other')
+    urls.canonicalize('https://ozon.ru/t/Other')
+    assert len(calls) == 3
+
+
+def test_parser_keeps_passed_identity(monkeypatch):
+    class Parser(MarketplaceParserInterface):
+        marketplace = 'ozon'
+
+        def parse(self):
+            return None
+
+    def canonicalize(url, resolve=True):
+        raise AssertionError('identity is canonicalized again')
+
+    identity = urls.ProductIdentity('ozon', '42', 'https://www.ozon.ru/product/x-42/')
+    monkeypatch.setattr('parsers.base.canonicalize', canonicalize)
+    parser = Parser(identity.canonical_url, identity)
+    assert parser.identity is identity
+    assert parser.url == identity.canonical_url
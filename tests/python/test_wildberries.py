@@ -0,0 +1,24 @@
+import pytest
+
+from parsers.wildberries import wb_image_urls
+
+
+@pytest.mark.parametrize('nm_id, basket', [
+    (14300000, 1),
+    (14400000, 2),
+    (100000000, 5),
+    (170000000, 12),
+    (250000000, 16),
+    (456000000, 25),
+    (960000000, 40),
+    (990000000, 41),
+])
+def test_basket_by_volume(nm_id, basket):
+    assert wb_image_urls(nm_id, 1)[0].startswith(f"https://basket-{basket:02d}.wbbasket.ru/")
+
+
+def test_image_url_layout():
+    assert wb_image_urls('123456789', 2) == [
+        "https://basket-09.wbbasket.ru/vol1234/part123456/123456789/images/big/1.webp",
+        "https://basket-09.wbbasket.ru/vol1234/part123456/123456789/images/big/2.webp",
+    ]